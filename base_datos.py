@@ -0,0 +1,994 @@
+import os
+import sqlite3
+import threading
+import time
+
+import instrumentacion
+
+DB_PATH = "contabilidad.db"
+
+# Ajustes aplicados una sola vez a cada conexión nueva
+TAMANO_CACHE_KIB = 20000            # ~20 MB de caché de páginas por conexión
+TAMANO_MMAP = 256 * 1024 * 1024     # lectura con memoria mapeada hasta 256 MB
+ESPERA_BLOQUEO = 10                 # segundos a esperar si otra conexión escribe
+
+_ruta_actual = DB_PATH
+_conexiones = threading.local()
+
+
+def _migracion_esquema_inicial(cursor):
+    """
+    Crea las tablas originales del sistema.
+    Usa IF NOT EXISTS porque las bases de datos anteriores a las migraciones
+    ya tienen estas tablas aunque su versión sea 0.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS transacciones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha TEXT NOT NULL,
+            descripcion TEXT
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS detalles_transacciones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaccion_id INTEGER NOT NULL,
+            cuenta TEXT NOT NULL,
+            monto REAL NOT NULL,
+            tipo TEXT CHECK(tipo IN ('Debe', 'Haber')) NOT NULL,
+            FOREIGN KEY (transaccion_id) REFERENCES transacciones(id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS referencias_cuentas (
+            cuenta TEXT PRIMARY KEY,
+            numero_referencia INTEGER NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS libro_mayor (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cuenta TEXT UNIQUE NOT NULL,
+            saldo REAL NOT NULL DEFAULT 0,
+            fecha TEXT NOT NULL
+        )
+    """)
+
+
+def _migracion_indices(cursor):
+    """
+    Agrega los índices usados por los filtros de fecha, el libro diario y
+    los totales por cuenta.
+    """
+    # Filtros por rango de fechas
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_transacciones_fecha
+        ON transacciones (fecha)
+    """)
+
+    # Líneas de cada transacción en orden Debe/Haber (cubre el JOIN del libro diario)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_detalles_transaccion
+        ON detalles_transacciones (transaccion_id, tipo, id, cuenta, monto)
+    """)
+
+    # Totales por cuenta sin leer la tabla (balance de sumas y saldos, libro mayor)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_detalles_cuenta
+        ON detalles_transacciones (cuenta, tipo, monto)
+    """)
+
+
+def _migracion_secuencia_referencias(cursor):
+    """
+    Reconstruye referencias_cuentas con numero_referencia como clave AUTOINCREMENT,
+    para que SQLite asigne los números nuevos sin un MAX() y sin carreras entre
+    dos procesos que registran a la vez.
+    """
+    cursor.execute("""
+        CREATE TABLE referencias_cuentas_nueva (
+            numero_referencia INTEGER PRIMARY KEY AUTOINCREMENT,
+            cuenta TEXT UNIQUE NOT NULL
+        )
+    """)
+    # Se conservan los números existentes; si alguno quedó repetido, las
+    # cuentas sobrantes reciben un número nuevo al final de la secuencia.
+    cursor.execute("""
+        INSERT INTO referencias_cuentas_nueva (numero_referencia, cuenta)
+        SELECT numero_referencia, MIN(cuenta)
+        FROM referencias_cuentas
+        GROUP BY numero_referencia
+    """)
+    cursor.execute("""
+        INSERT INTO referencias_cuentas_nueva (cuenta)
+        SELECT cuenta FROM referencias_cuentas
+        WHERE cuenta NOT IN (SELECT cuenta FROM referencias_cuentas_nueva)
+        ORDER BY numero_referencia, cuenta
+    """)
+    cursor.execute("DROP TABLE referencias_cuentas")
+    cursor.execute("ALTER TABLE referencias_cuentas_nueva RENAME TO referencias_cuentas")
+
+
+def _migracion_montos_en_centimos(cursor):
+    """
+    Pasa monto y saldo de REAL a INTEGER en céntimos, para que las sumas y
+    comparaciones sean exactas. Las tablas se reconstruyen porque SQLite no
+    permite cambiar el tipo de una columna.
+    """
+    cursor.execute("""
+        CREATE TABLE detalles_transacciones_nueva (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaccion_id INTEGER NOT NULL,
+            cuenta TEXT NOT NULL,
+            monto INTEGER NOT NULL,  -- céntimos de Bs
+            tipo TEXT CHECK(tipo IN ('Debe', 'Haber')) NOT NULL,
+            FOREIGN KEY (transaccion_id) REFERENCES transacciones(id)
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO detalles_transacciones_nueva (id, transaccion_id, cuenta, monto, tipo)
+        SELECT id, transaccion_id, cuenta, CAST(ROUND(monto * 100) AS INTEGER), tipo
+        FROM detalles_transacciones
+    """)
+    cursor.execute("DROP TABLE detalles_transacciones")
+    cursor.execute("ALTER TABLE detalles_transacciones_nueva RENAME TO detalles_transacciones")
+    cursor.execute("""
+        CREATE INDEX idx_detalles_transaccion
+        ON detalles_transacciones (transaccion_id, tipo, id, cuenta, monto)
+    """)
+    cursor.execute("""
+        CREATE INDEX idx_detalles_cuenta
+        ON detalles_transacciones (cuenta, tipo, monto)
+    """)
+
+    cursor.execute("""
+        CREATE TABLE libro_mayor_nueva (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cuenta TEXT UNIQUE NOT NULL,
+            saldo INTEGER NOT NULL DEFAULT 0,  -- céntimos de Bs
+            fecha TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO libro_mayor_nueva (id, cuenta, saldo, fecha)
+        SELECT id, cuenta, CAST(ROUND(saldo * 100) AS INTEGER), fecha
+        FROM libro_mayor
+    """)
+    cursor.execute("DROP TABLE libro_mayor")
+    cursor.execute("ALTER TABLE libro_mayor_nueva RENAME TO libro_mayor")
+
+
+def _migracion_cierres_periodo(cursor):
+    """
+    Agrega las tablas de cierres mensuales: los meses cerrados y el saldo de
+    cada cuenta al final de cada uno.
+    """
+    cursor.execute("""
+        CREATE TABLE periodos_cerrados (
+            periodo TEXT PRIMARY KEY,      -- 'AAAA-MM'
+            fecha_cierre TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE cierres_periodo (
+            periodo TEXT NOT NULL,
+            cuenta TEXT NOT NULL,
+            saldo INTEGER NOT NULL,        -- céntimos de Bs al final del período
+            PRIMARY KEY (periodo, cuenta)
+        ) WITHOUT ROWID
+    """)
+
+
+def _migracion_importaciones(cursor):
+    """
+    Agrega la tabla de puntos de control de las importaciones de CSV, para
+    poder retomar una importación interrumpida donde quedó.
+    """
+    cursor.execute("""
+        CREATE TABLE importaciones (
+            huella TEXT PRIMARY KEY,       -- tamaño y hash del inicio del archivo
+            archivo TEXT NOT NULL,
+            lineas INTEGER NOT NULL,       -- filas de datos ya procesadas
+            asientos INTEGER NOT NULL,     -- asientos registrados
+            rechazadas INTEGER NOT NULL,   -- filas rechazadas
+            completa INTEGER NOT NULL DEFAULT 0,
+            actualizada TEXT NOT NULL
+        )
+    """)
+
+
+def _migracion_totales_cuentas(cursor):
+    """
+    Agrega la tabla con el total Debe y Haber de cada cuenta, para que el
+    balance sin fechas y la verificación no sumen todas las líneas. Los
+    disparadores la mantienen al día con cada línea que se inserta, borra o
+    corrige, aunque el cambio se haga fuera del programa.
+    """
+    cursor.execute("""
+        CREATE TABLE totales_cuentas (
+            cuenta TEXT PRIMARY KEY,
+            debe INTEGER NOT NULL DEFAULT 0,    -- céntimos de Bs
+            haber INTEGER NOT NULL DEFAULT 0,   -- céntimos de Bs
+            lineas INTEGER NOT NULL DEFAULT 0   -- líneas de detalle de la cuenta
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        INSERT INTO totales_cuentas (cuenta, debe, haber, lineas)
+        SELECT cuenta,
+               SUM(CASE WHEN tipo = 'Debe' THEN monto ELSE 0 END),
+               SUM(CASE WHEN tipo = 'Haber' THEN monto ELSE 0 END),
+               COUNT(*)
+        FROM detalles_transacciones
+        GROUP BY cuenta
+    """)
+
+    cursor.execute("""
+        CREATE TRIGGER totales_cuentas_insertar
+        AFTER INSERT ON detalles_transacciones
+        BEGIN
+            INSERT INTO totales_cuentas (cuenta, debe, haber, lineas)
+            VALUES (NEW.cuenta,
+                    CASE WHEN NEW.tipo = 'Debe' THEN NEW.monto ELSE 0 END,
+                    CASE WHEN NEW.tipo = 'Haber' THEN NEW.monto ELSE 0 END,
+                    1)
+            ON CONFLICT(cuenta) DO UPDATE SET
+                debe = debe + excluded.debe,
+                haber = haber + excluded.haber,
+                lineas = lineas + 1;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER totales_cuentas_borrar
+        AFTER DELETE ON detalles_transacciones
+        BEGIN
+            UPDATE totales_cuentas SET
+                debe = debe - CASE WHEN OLD.tipo = 'Debe' THEN OLD.monto ELSE 0 END,
+                haber = haber - CASE WHEN OLD.tipo = 'Haber' THEN OLD.monto ELSE 0 END,
+                lineas = lineas - 1
+            WHERE cuenta = OLD.cuenta;
+        END
+    """)
+    # Una corrección se trata como borrar la línea anterior e insertar la nueva
+    cursor.execute("""
+        CREATE TRIGGER totales_cuentas_corregir
+        AFTER UPDATE OF cuenta, monto, tipo ON detalles_transacciones
+        BEGIN
+            UPDATE totales_cuentas SET
+                debe = debe - CASE WHEN OLD.tipo = 'Debe' THEN OLD.monto ELSE 0 END,
+                haber = haber - CASE WHEN OLD.tipo = 'Haber' THEN OLD.monto ELSE 0 END,
+                lineas = lineas - 1
+            WHERE cuenta = OLD.cuenta;
+            INSERT INTO totales_cuentas (cuenta, debe, haber, lineas)
+            VALUES (NEW.cuenta,
+                    CASE WHEN NEW.tipo = 'Debe' THEN NEW.monto ELSE 0 END,
+                    CASE WHEN NEW.tipo = 'Haber' THEN NEW.monto ELSE 0 END,
+                    1)
+            ON CONFLICT(cuenta) DO UPDATE SET
+                debe = debe + excluded.debe,
+                haber = haber + excluded.haber,
+                lineas = lineas + 1;
+        END
+    """)
+
+
+def _migracion_saldos_movimientos(cursor):
+    """
+    Guarda en cada línea de detalle la fecha de su transacción y el saldo de
+    la cuenta después del movimiento, en el orden del Libro Mayor (fecha e
+    id). Así cualquier tramo de los movimientos de una cuenta se lee con su
+    saldo sin recorrer los anteriores.
+
+    Una línea insertada sin saldo (registrar_transaccion o un INSERT hecho
+    fuera del programa) lo recibe del disparador, que además corrige el de
+    las líneas posteriores de la cuenta si el asiento tiene fecha atrasada.
+    registrar_transacciones_lote inserta con saldo 0 y anota en
+    saldos_pendientes desde qué fecha hay que recalcular cada cuenta; el
+    recálculo se hace una sola vez, al confirmar el lote o, si el lote es
+    parte de una transacción mayor (la importación de CSV), al terminar o
+    antes de leer los saldos. Los borrados y las correcciones de cuenta,
+    monto, tipo o fecha ajustan solo las líneas posteriores de las cuentas
+    afectadas.
+    """
+    cursor.execute("ALTER TABLE detalles_transacciones ADD COLUMN fecha TEXT")
+    cursor.execute("ALTER TABLE detalles_transacciones ADD COLUMN saldo INTEGER")  # céntimos de Bs
+    cursor.execute("""
+        UPDATE detalles_transacciones
+        SET fecha = (SELECT t.fecha FROM transacciones t WHERE t.id = detalles_transacciones.transaccion_id)
+    """)
+    # Movimientos de cada cuenta en orden (el id va implícito al final del índice)
+    cursor.execute("""
+        CREATE INDEX idx_detalles_cuenta_fecha
+        ON detalles_transacciones (cuenta, fecha)
+    """)
+    # Las sumas por cuenta que cubría idx_detalles_cuenta ahora salen de
+    # totales_cuentas, y los recorridos por cuenta usan el índice nuevo
+    cursor.execute("DROP INDEX IF EXISTS idx_detalles_cuenta")
+    cursor.execute("""
+        UPDATE detalles_transacciones SET saldo = acumulados.saldo
+        FROM (
+            SELECT id, SUM(CASE WHEN tipo = 'Debe' THEN monto ELSE -monto END)
+                       OVER (PARTITION BY cuenta ORDER BY fecha, id ROWS UNBOUNDED PRECEDING) AS saldo
+            FROM detalles_transacciones
+        ) AS acumulados
+        WHERE detalles_transacciones.id = acumulados.id
+    """)
+
+    cursor.execute("""
+        CREATE TRIGGER saldos_insertar
+        AFTER INSERT ON detalles_transacciones
+        WHEN NEW.saldo IS NULL
+        BEGIN
+            UPDATE detalles_transacciones
+            SET fecha = (SELECT t.fecha FROM transacciones t WHERE t.id = NEW.transaccion_id)
+            WHERE id = NEW.id AND fecha IS NULL;
+
+            UPDATE detalles_transacciones
+            SET saldo = saldo + CASE WHEN NEW.tipo = 'Debe' THEN NEW.monto ELSE -NEW.monto END
+            WHERE cuenta = NEW.cuenta
+              AND (fecha, id) > ((SELECT fecha FROM detalles_transacciones WHERE id = NEW.id), NEW.id);
+
+            UPDATE detalles_transacciones
+            SET saldo = COALESCE((
+                    SELECT p.saldo FROM detalles_transacciones p
+                    WHERE p.cuenta = detalles_transacciones.cuenta
+                      AND (p.fecha, p.id) < (detalles_transacciones.fecha, detalles_transacciones.id)
+                    ORDER BY p.fecha DESC, p.id DESC
+                    LIMIT 1
+                ), 0) + CASE WHEN NEW.tipo = 'Debe' THEN NEW.monto ELSE -NEW.monto END
+            WHERE id = NEW.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER saldos_borrar
+        AFTER DELETE ON detalles_transacciones
+        WHEN OLD.saldo IS NOT NULL
+        BEGIN
+            UPDATE detalles_transacciones
+            SET saldo = saldo - CASE WHEN OLD.tipo = 'Debe' THEN OLD.monto ELSE -OLD.monto END
+            WHERE cuenta = OLD.cuenta AND (fecha, id) > (OLD.fecha, OLD.id);
+        END
+    """)
+    # Una corrección se trata como quitar la línea de su lugar anterior y ponerla en el nuevo
+    cursor.execute("""
+        CREATE TRIGGER saldos_corregir
+        AFTER UPDATE OF cuenta, monto, tipo, fecha ON detalles_transacciones
+        WHEN OLD.saldo IS NOT NULL
+        BEGIN
+            UPDATE detalles_transacciones
+            SET saldo = saldo - CASE WHEN OLD.tipo = 'Debe' THEN OLD.monto ELSE -OLD.monto END
+            WHERE cuenta = OLD.cuenta AND (fecha, id) > (OLD.fecha, OLD.id) AND id <> NEW.id;
+
+            UPDATE detalles_transacciones
+            SET saldo = saldo + CASE WHEN NEW.tipo = 'Debe' THEN NEW.monto ELSE -NEW.monto END
+            WHERE cuenta = NEW.cuenta AND (fecha, id) > (NEW.fecha, NEW.id) AND id <> NEW.id;
+
+            UPDATE detalles_transacciones
+            SET saldo = COALESCE((
+                    SELECT p.saldo FROM detalles_transacciones p
+                    WHERE p.cuenta = detalles_transacciones.cuenta
+                      AND (p.fecha, p.id) < (detalles_transacciones.fecha, detalles_transacciones.id)
+                    ORDER BY p.fecha DESC, p.id DESC
+                    LIMIT 1
+                ), 0) + CASE WHEN NEW.tipo = 'Debe' THEN NEW.monto ELSE -NEW.monto END
+            WHERE id = NEW.id;
+        END
+    """)
+    # Cambiar la fecha de una transacción mueve sus líneas (y dispara saldos_corregir)
+    cursor.execute("""
+        CREATE TRIGGER saldos_fecha_transaccion
+        AFTER UPDATE OF fecha ON transacciones
+        BEGIN
+            UPDATE detalles_transacciones SET fecha = NEW.fecha WHERE transaccion_id = NEW.id;
+        END
+    """)
+
+    cursor.execute("""
+        CREATE TABLE saldos_pendientes (
+            cuenta TEXT PRIMARY KEY,
+            desde TEXT NOT NULL            -- primera fecha con saldos por recalcular
+        ) WITHOUT ROWID
+    """)
+
+
+def _migracion_cuentas(cursor):
+    """
+    Reemplaza el nombre de la cuenta, repetido en cada línea, saldo y cierre,
+    por el id entero de la nueva tabla cuentas. El id es el número de
+    referencia de la cuenta, así que cuentas sustituye a referencias_cuentas.
+    Las tablas se reconstruyen porque SQLite no permite cambiar una columna,
+    y los disparadores de totales y saldos se vuelven a crear sobre cuenta_id.
+    """
+    cursor.execute("""
+        CREATE TABLE cuentas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,   -- número de referencia
+            nombre TEXT UNIQUE NOT NULL
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO cuentas (id, nombre)
+        SELECT numero_referencia, cuenta FROM referencias_cuentas
+        ORDER BY numero_referencia
+    """)
+    # Las cuentas usadas que no tenían número reciben uno nuevo al final de la secuencia
+    cursor.execute("""
+        INSERT INTO cuentas (nombre)
+        SELECT cuenta FROM (
+            SELECT cuenta FROM detalles_transacciones
+            UNION SELECT cuenta FROM libro_mayor
+            UNION SELECT cuenta FROM cierres_periodo
+        )
+        WHERE cuenta NOT IN (SELECT nombre FROM cuentas)
+        ORDER BY cuenta
+    """)
+    cursor.execute("DROP TABLE referencias_cuentas")
+
+    # El disparador de la fecha de las transacciones apunta a la tabla que se reemplaza
+    cursor.execute("DROP TRIGGER saldos_fecha_transaccion")
+    cursor.execute("""
+        CREATE TABLE detalles_transacciones_nueva (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaccion_id INTEGER NOT NULL,
+            cuenta_id INTEGER NOT NULL,
+            monto INTEGER NOT NULL,  -- céntimos de Bs
+            tipo TEXT CHECK(tipo IN ('Debe', 'Haber')) NOT NULL,
+            fecha TEXT,              -- fecha de la transacción
+            saldo INTEGER,           -- céntimos de Bs, saldo de la cuenta después de la línea
+            FOREIGN KEY (transaccion_id) REFERENCES transacciones(id),
+            FOREIGN KEY (cuenta_id) REFERENCES cuentas(id)
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO detalles_transacciones_nueva (id, transaccion_id, cuenta_id, monto, tipo, fecha, saldo)
+        SELECT dt.id, dt.transaccion_id, c.id, dt.monto, dt.tipo, dt.fecha, dt.saldo
+        FROM detalles_transacciones dt
+        JOIN cuentas c ON c.nombre = dt.cuenta
+        ORDER BY dt.id
+    """)
+    cursor.execute("DROP TABLE detalles_transacciones")
+    cursor.execute("ALTER TABLE detalles_transacciones_nueva RENAME TO detalles_transacciones")
+    cursor.execute("""
+        CREATE INDEX idx_detalles_transaccion
+        ON detalles_transacciones (transaccion_id, tipo, id, cuenta_id, monto)
+    """)
+    cursor.execute("""
+        CREATE INDEX idx_detalles_cuenta_fecha
+        ON detalles_transacciones (cuenta_id, fecha)
+    """)
+
+    cursor.execute("""
+        CREATE TABLE libro_mayor_nueva (
+            cuenta_id INTEGER PRIMARY KEY REFERENCES cuentas(id),
+            saldo INTEGER NOT NULL DEFAULT 0,  -- céntimos de Bs
+            fecha TEXT NOT NULL                -- fecha del primer movimiento
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO libro_mayor_nueva (cuenta_id, saldo, fecha)
+        SELECT c.id, lm.saldo, lm.fecha
+        FROM libro_mayor lm
+        JOIN cuentas c ON c.nombre = lm.cuenta
+    """)
+    cursor.execute("DROP TABLE libro_mayor")
+    cursor.execute("ALTER TABLE libro_mayor_nueva RENAME TO libro_mayor")
+
+    cursor.execute("""
+        CREATE TABLE cierres_periodo_nueva (
+            periodo TEXT NOT NULL,
+            cuenta_id INTEGER NOT NULL REFERENCES cuentas(id),
+            saldo INTEGER NOT NULL,        -- céntimos de Bs al final del período
+            PRIMARY KEY (periodo, cuenta_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        INSERT INTO cierres_periodo_nueva (periodo, cuenta_id, saldo)
+        SELECT cp.periodo, c.id, cp.saldo
+        FROM cierres_periodo cp
+        JOIN cuentas c ON c.nombre = cp.cuenta
+    """)
+    cursor.execute("DROP TABLE cierres_periodo")
+    cursor.execute("ALTER TABLE cierres_periodo_nueva RENAME TO cierres_periodo")
+
+    cursor.execute("""
+        CREATE TABLE saldos_pendientes_nueva (
+            cuenta_id INTEGER PRIMARY KEY,
+            desde TEXT NOT NULL            -- primera fecha con saldos por recalcular
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO saldos_pendientes_nueva (cuenta_id, desde)
+        SELECT c.id, sp.desde
+        FROM saldos_pendientes sp
+        JOIN cuentas c ON c.nombre = sp.cuenta
+    """)
+    cursor.execute("DROP TABLE saldos_pendientes")
+    cursor.execute("ALTER TABLE saldos_pendientes_nueva RENAME TO saldos_pendientes")
+
+    # Los totales se vuelven a sumar desde las líneas ya migradas
+    cursor.execute("DROP TABLE totales_cuentas")
+    cursor.execute("""
+        CREATE TABLE totales_cuentas (
+            cuenta_id INTEGER PRIMARY KEY,
+            debe INTEGER NOT NULL DEFAULT 0,    -- céntimos de Bs
+            haber INTEGER NOT NULL DEFAULT 0,   -- céntimos de Bs
+            lineas INTEGER NOT NULL DEFAULT 0   -- líneas de detalle de la cuenta
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO totales_cuentas (cuenta_id, debe, haber, lineas)
+        SELECT cuenta_id,
+               SUM(CASE WHEN tipo = 'Debe' THEN monto ELSE 0 END),
+               SUM(CASE WHEN tipo = 'Haber' THEN monto ELSE 0 END),
+               COUNT(*)
+        FROM detalles_transacciones
+        GROUP BY cuenta_id
+    """)
+
+    cursor.execute("""
+        CREATE TRIGGER totales_cuentas_insertar
+        AFTER INSERT ON detalles_transacciones
+        BEGIN
+            INSERT INTO totales_cuentas (cuenta_id, debe, haber, lineas)
+            VALUES (NEW.cuenta_id,
+                    CASE WHEN NEW.tipo = 'Debe' THEN NEW.monto ELSE 0 END,
+                    CASE WHEN NEW.tipo = 'Haber' THEN NEW.monto ELSE 0 END,
+                    1)
+            ON CONFLICT(cuenta_id) DO UPDATE SET
+                debe = debe + excluded.debe,
+                haber = haber + excluded.haber,
+                lineas = lineas + 1;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER totales_cuentas_borrar
+        AFTER DELETE ON detalles_transacciones
+        BEGIN
+            UPDATE totales_cuentas SET
+                debe = debe - CASE WHEN OLD.tipo = 'Debe' THEN OLD.monto ELSE 0 END,
+                haber = haber - CASE WHEN OLD.tipo = 'Haber' THEN OLD.monto ELSE 0 END,
+                lineas = lineas - 1
+            WHERE cuenta_id = OLD.cuenta_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER totales_cuentas_corregir
+        AFTER UPDATE OF cuenta_id, monto, tipo ON detalles_transacciones
+        BEGIN
+            UPDATE totales_cuentas SET
+                debe = debe - CASE WHEN OLD.tipo = 'Debe' THEN OLD.monto ELSE 0 END,
+                haber = haber - CASE WHEN OLD.tipo = 'Haber' THEN OLD.monto ELSE 0 END,
+                lineas = lineas - 1
+            WHERE cuenta_id = OLD.cuenta_id;
+            INSERT INTO totales_cuentas (cuenta_id, debe, haber, lineas)
+            VALUES (NEW.cuenta_id,
+                    CASE WHEN NEW.tipo = 'Debe' THEN NEW.monto ELSE 0 END,
+                    CASE WHEN NEW.tipo = 'Haber' THEN NEW.monto ELSE 0 END,
+                    1)
+            ON CONFLICT(cuenta_id) DO UPDATE SET
+                debe = debe + excluded.debe,
+                haber = haber + excluded.haber,
+                lineas = lineas + 1;
+        END
+    """)
+
+    cursor.execute("""
+        CREATE TRIGGER saldos_insertar
+        AFTER INSERT ON detalles_transacciones
+        WHEN NEW.saldo IS NULL
+        BEGIN
+            UPDATE detalles_transacciones
+            SET fecha = (SELECT t.fecha FROM transacciones t WHERE t.id = NEW.transaccion_id)
+            WHERE id = NEW.id AND fecha IS NULL;
+
+            UPDATE detalles_transacciones
+            SET saldo = saldo + CASE WHEN NEW.tipo = 'Debe' THEN NEW.monto ELSE -NEW.monto END
+            WHERE cuenta_id = NEW.cuenta_id
+              AND (fecha, id) > ((SELECT fecha FROM detalles_transacciones WHERE id = NEW.id), NEW.id);
+
+            UPDATE detalles_transacciones
+            SET saldo = COALESCE((
+                    SELECT p.saldo FROM detalles_transacciones p
+                    WHERE p.cuenta_id = detalles_transacciones.cuenta_id
+                      AND (p.fecha, p.id) < (detalles_transacciones.fecha, detalles_transacciones.id)
+                    ORDER BY p.fecha DESC, p.id DESC
+                    LIMIT 1
+                ), 0) + CASE WHEN NEW.tipo = 'Debe' THEN NEW.monto ELSE -NEW.monto END
+            WHERE id = NEW.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER saldos_borrar
+        AFTER DELETE ON detalles_transacciones
+        WHEN OLD.saldo IS NOT NULL
+        BEGIN
+            UPDATE detalles_transacciones
+            SET saldo = saldo - CASE WHEN OLD.tipo = 'Debe' THEN OLD.monto ELSE -OLD.monto END
+            WHERE cuenta_id = OLD.cuenta_id AND (fecha, id) > (OLD.fecha, OLD.id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER saldos_corregir
+        AFTER UPDATE OF cuenta_id, monto, tipo, fecha ON detalles_transacciones
+        WHEN OLD.saldo IS NOT NULL
+        BEGIN
+            UPDATE detalles_transacciones
+            SET saldo = saldo - CASE WHEN OLD.tipo = 'Debe' THEN OLD.monto ELSE -OLD.monto END
+            WHERE cuenta_id = OLD.cuenta_id AND (fecha, id) > (OLD.fecha, OLD.id) AND id <> NEW.id;
+
+            UPDATE detalles_transacciones
+            SET saldo = saldo + CASE WHEN NEW.tipo = 'Debe' THEN NEW.monto ELSE -NEW.monto END
+            WHERE cuenta_id = NEW.cuenta_id AND (fecha, id) > (NEW.fecha, NEW.id) AND id <> NEW.id;
+
+            UPDATE detalles_transacciones
+            SET saldo = COALESCE((
+                    SELECT p.saldo FROM detalles_transacciones p
+                    WHERE p.cuenta_id = detalles_transacciones.cuenta_id
+                      AND (p.fecha, p.id) < (detalles_transacciones.fecha, detalles_transacciones.id)
+                    ORDER BY p.fecha DESC, p.id DESC
+                    LIMIT 1
+                ), 0) + CASE WHEN NEW.tipo = 'Debe' THEN NEW.monto ELSE -NEW.monto END
+            WHERE id = NEW.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER saldos_fecha_transaccion
+        AFTER UPDATE OF fecha ON transacciones
+        BEGIN
+            UPDATE detalles_transacciones SET fecha = NEW.fecha WHERE transaccion_id = NEW.id;
+        END
+    """)
+
+
+def _migracion_busqueda(cursor):
+    """
+    Agrega el índice de texto completo (FTS5) de las descripciones de las
+    transacciones. Es de contenido externo: guarda solo el índice y lee el
+    texto de transacciones, y los disparadores lo mantienen al día con cada
+    transacción que se inserta, borra o cambia de descripción. Las búsquedas
+    ignoran mayúsculas y acentos.
+
+    Indexar fila por fila desde un disparador es varias veces más lento que
+    hacerlo en bloque, porque FTS5 vuelca su índice en memoria en cada
+    sentencia con disparadores. registrar_transacciones_lote pone una fila
+    en busqueda_en_lote mientras inserta, para que el disparador no actúe, e
+    indexa el lote completo al final; la fila nunca sale de su transacción.
+    """
+    cursor.execute("""
+        CREATE VIRTUAL TABLE transacciones_fts USING fts5(
+            descripcion,
+            content = 'transacciones',
+            content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    cursor.execute("INSERT INTO transacciones_fts (transacciones_fts) VALUES ('rebuild')")
+
+    cursor.execute("""
+        CREATE TABLE busqueda_en_lote (
+            activo INTEGER PRIMARY KEY
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER busqueda_insertar
+        AFTER INSERT ON transacciones
+        WHEN NOT EXISTS (SELECT 1 FROM busqueda_en_lote)
+        BEGIN
+            INSERT INTO transacciones_fts (rowid, descripcion) VALUES (NEW.id, NEW.descripcion);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER busqueda_borrar
+        AFTER DELETE ON transacciones
+        BEGIN
+            INSERT INTO transacciones_fts (transacciones_fts, rowid, descripcion)
+            VALUES ('delete', OLD.id, OLD.descripcion);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER busqueda_corregir
+        AFTER UPDATE OF descripcion ON transacciones
+        BEGIN
+            INSERT INTO transacciones_fts (transacciones_fts, rowid, descripcion)
+            VALUES ('delete', OLD.id, OLD.descripcion);
+            INSERT INTO transacciones_fts (rowid, descripcion) VALUES (NEW.id, NEW.descripcion);
+        END
+    """)
+
+
+def _migracion_reabrir_cierres(cursor):
+    """
+    Agrega disparadores que descartan los cierres mensuales afectados cuando
+    se modifica o borra un movimiento directamente en la base de datos: se
+    borran los cierres del mes del movimiento y de los meses posteriores,
+    igual que hace logica al registrar un asiento con fecha en un mes cerrado.
+    El cambio de fecha de una transacción llega a sus líneas por el
+    disparador saldos_fecha_transaccion, así que también queda cubierto.
+    """
+    cursor.execute("""
+        CREATE TRIGGER cierres_borrar_detalle
+        AFTER DELETE ON detalles_transacciones
+        BEGIN
+            DELETE FROM cierres_periodo WHERE periodo >= substr(OLD.fecha, 1, 7);
+            DELETE FROM periodos_cerrados WHERE periodo >= substr(OLD.fecha, 1, 7);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER cierres_actualizar_detalle
+        AFTER UPDATE OF transaccion_id, cuenta_id, monto, tipo, fecha ON detalles_transacciones
+        BEGIN
+            DELETE FROM cierres_periodo WHERE periodo >= substr(min(OLD.fecha, NEW.fecha), 1, 7);
+            DELETE FROM periodos_cerrados WHERE periodo >= substr(min(OLD.fecha, NEW.fecha), 1, 7);
+        END
+    """)
+    # Sin la transacción, sus líneas dejan de sumar en los saldos por fecha
+    cursor.execute("""
+        CREATE TRIGGER cierres_borrar_transaccion
+        AFTER DELETE ON transacciones
+        BEGIN
+            DELETE FROM cierres_periodo WHERE periodo >= substr(OLD.fecha, 1, 7);
+            DELETE FROM periodos_cerrados WHERE periodo >= substr(OLD.fecha, 1, 7);
+        END
+    """)
+
+
+def _migracion_reabrir_cierres_al_insertar(cursor):
+    """
+    Completa los disparadores de _migracion_reabrir_cierres con las líneas
+    insertadas directamente en un mes ya cerrado (por SQL o al restaurar
+    filas). La fecha que cuenta para los saldos es la de la transacción.
+    La condición evita el borrado cuando no hay cierres afectados, así que
+    en un lote solo la primera línea con fecha en un mes cerrado borra algo.
+    """
+    cursor.execute("""
+        CREATE TRIGGER cierres_insertar_detalle
+        AFTER INSERT ON detalles_transacciones
+        WHEN EXISTS (
+            SELECT 1 FROM periodos_cerrados
+            WHERE periodo >= substr((SELECT fecha FROM transacciones WHERE id = NEW.transaccion_id), 1, 7)
+        )
+        BEGIN
+            DELETE FROM cierres_periodo
+            WHERE periodo >= substr((SELECT fecha FROM transacciones WHERE id = NEW.transaccion_id), 1, 7);
+            DELETE FROM periodos_cerrados
+            WHERE periodo >= substr((SELECT fecha FROM transacciones WHERE id = NEW.transaccion_id), 1, 7);
+        END
+    """)
+
+
+# Lista ordenada de migraciones; la posición + 1 es la versión que deja el esquema.
+# Nunca se modifica una migración ya publicada: los cambios nuevos van al final.
+MIGRACIONES = [
+    _migracion_esquema_inicial,
+    _migracion_indices,
+    _migracion_secuencia_referencias,
+    _migracion_montos_en_centimos,
+    _migracion_cierres_periodo,
+    _migracion_importaciones,
+    _migracion_totales_cuentas,
+    _migracion_saldos_movimientos,
+    _migracion_cuentas,
+    _migracion_busqueda,
+    _migracion_reabrir_cierres,
+    _migracion_reabrir_cierres_al_insertar,
+]
+
+VERSION_ESQUEMA = len(MIGRACIONES)
+
+
+def obtener_version(conn):
+    """
+    Retorna la versión del esquema guardada en PRAGMA user_version.
+    """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def aplicar_migraciones(conn):
+    """
+    Lleva el esquema de la base de datos a la versión actual.
+    Si ya está al día no ejecuta ninguna sentencia DDL. Cada migración corre
+    en su propia transacción junto con el cambio de versión, así que una
+    migración que falla no deja el esquema a medias.
+    """
+    if obtener_version(conn) >= VERSION_ESQUEMA:
+        return VERSION_ESQUEMA
+
+    if conn.in_transaction:
+        conn.commit()
+
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Se vuelve a leer dentro del bloqueo por si otro proceso migró primero
+            version = obtener_version(conn)
+            if version >= VERSION_ESQUEMA:
+                conn.rollback()
+                return version
+            MIGRACIONES[version](conn.cursor())
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+class Conexion(sqlite3.Connection):
+    """
+    Conexión de SQLite que recuerda el archivo que tiene abierto.
+    El atributo ruta es None para bases de datos en memoria.
+    """
+    ruta = None
+
+
+class CursorMedido(sqlite3.Cursor):
+    """
+    Cursor que registra en instrumentacion cada sentencia que ejecuta. El
+    tiempo de leer las filas se suma al de la sentencia, que se registra al
+    ejecutar la siguiente, al agotarse las filas o al cerrar el cursor.
+    """
+    _sql = None
+    _segundos = 0.0
+
+    def _medir(self, operacion, *args):
+        inicio = time.perf_counter()
+        try:
+            return operacion(*args)
+        finally:
+            self._segundos += time.perf_counter() - inicio
+
+    def _registrar(self):
+        if self._sql is not None:
+            if instrumentacion.activa():
+                instrumentacion.registrar_consulta(self._sql, self._segundos)
+            self._sql = None
+            self._segundos = 0.0
+
+    def execute(self, sql, parametros=()):
+        self._registrar()
+        self._sql = sql
+        return self._medir(super().execute, sql, parametros)
+
+    def executemany(self, sql, parametros):
+        self._registrar()
+        self._sql = sql
+        return self._medir(super().executemany, sql, parametros)
+
+    def executescript(self, script):
+        self._registrar()
+        self._sql = script
+        return self._medir(super().executescript, script)
+
+    def fetchone(self):
+        fila = self._medir(super().fetchone)
+        if fila is None:
+            self._registrar()
+        return fila
+
+    def fetchmany(self, size=None):
+        filas = self._medir(super().fetchmany, self.arraysize if size is None else size)
+        if not filas:
+            self._registrar()
+        return filas
+
+    def fetchall(self):
+        filas = self._medir(super().fetchall)
+        self._registrar()
+        return filas
+
+    def __next__(self):
+        try:
+            return self._medir(super().__next__)
+        except StopIteration:
+            self._registrar()
+            raise
+
+    def close(self):
+        self._registrar()
+        super().close()
+
+    def __del__(self):
+        self._registrar()
+
+
+class ConexionMedida(Conexion):
+    """
+    Conexión que se usa mientras la instrumentación está activa: sus
+    cursores son CursorMedido y también se mide cada COMMIT.
+    """
+
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def commit(self):
+        inicio = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            if instrumentacion.activa():
+                instrumentacion.registrar_consulta("COMMIT", time.perf_counter() - inicio)
+
+
+def configurar_ruta(ruta):
+    """
+    Cambia el archivo de base de datos usado por obtener_conexion.
+    Las conexiones abiertas hacia la ruta anterior se reemplazan la próxima
+    vez que cada hilo pida su conexión.
+    """
+    global _ruta_actual
+    _ruta_actual = ruta
+    cerrar_conexion()
+
+
+def obtener_ruta():
+    """
+    Retorna la ruta del archivo de base de datos configurado.
+    """
+    return _ruta_actual
+
+
+def abrir_conexion(ruta=None):
+    """
+    Abre una conexión nueva con los ajustes de rendimiento del sistema:
+    diario WAL, synchronous=NORMAL, caché de páginas y memoria mapeada.
+    Si la instrumentación está activa, la conexión mide sus sentencias.
+    """
+    ruta = ruta or _ruta_actual
+    clase = ConexionMedida if instrumentacion.activa() else Conexion
+    conn = sqlite3.connect(ruta, timeout=ESPERA_BLOQUEO, factory=clase)
+    if ruta != ":memory:":
+        conn.ruta = os.path.abspath(ruta)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{TAMANO_CACHE_KIB}")
+    conn.execute(f"PRAGMA mmap_size = {TAMANO_MMAP}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def obtener_conexion():
+    """
+    Retorna la conexión reutilizable del hilo actual, abriéndola la primera vez.
+    Las conexiones de SQLite no se comparten entre hilos, así que cada hilo
+    tiene la suya. Quien la usa no debe cerrarla. Si se activó la
+    instrumentación después de abrirla, se reemplaza por una conexión medida.
+    """
+    conn = getattr(_conexiones, "conn", None)
+    if (conn is not None and _conexiones.ruta == _ruta_actual
+            and (isinstance(conn, ConexionMedida) or not instrumentacion.activa())):
+        return conn
+    cerrar_conexion()
+    conn = abrir_conexion(_ruta_actual)
+    _conexiones.conn = conn
+    _conexiones.ruta = _ruta_actual
+    return conn
+
+
+def cerrar_conexion():
+    """
+    Cierra la conexión reutilizable del hilo actual, si existe.
+    """
+    conn = getattr(_conexiones, "conn", None)
+    if conn is not None:
+        conn.close()
+        _conexiones.conn = None
+
+
+def inicializar_base_datos(ruta=None):
+    """
+    Crea o actualiza el esquema de la base de datos.
+    """
+    conn = abrir_conexion(ruta)
+    try:
+        return aplicar_migraciones(conn)
+    finally:
+        conn.close()
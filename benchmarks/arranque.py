@@ -0,0 +1,125 @@
+"""
+Presupuesto de arranque en frío.
+
+Cada medición corre en un intérprete nuevo con `python -X importtime`, así
+que incluye todo lo que el módulo importa de forma transitiva. Además se
+comprueba que los módulos pesados no se carguen donde no hacen falta:
+reportlab solo al generar un PDF y PyQt5 solo en la interfaz.
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/arranque.py
+    python benchmarks/arranque.py --repeticiones 10
+
+Termina con código 1 si alguna medición supera su presupuesto.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (módulo, presupuesto en ms para importarlo, prefijos que no debe cargar)
+PRESUPUESTOS = [
+    ("logica", 60, ("reportlab", "PyQt5", "concurrent.futures.process", "pypdf")),
+    ("contabilidad", 80, ("reportlab", "PyQt5", "concurrent.futures.process", "pypdf")),
+    ("interfaz", 150, ("reportlab", "pypdf")),
+]
+
+# Tiempo hasta que la ventana principal queda construida y visible
+PRESUPUESTO_VENTANA_MS = 300
+
+_SCRIPT_VENTANA = """
+import time
+inicio = time.perf_counter()
+from PyQt5.QtWidgets import QApplication
+import interfaz
+app = QApplication([])
+ventana = interfaz.VentanaPrincipal()
+ventana.show()
+app.processEvents()
+print((time.perf_counter() - inicio) * 1000)
+"""
+
+
+def _ejecutar(argumentos, entorno=None):
+    return subprocess.run([sys.executable, *argumentos], cwd=RAIZ, env=entorno,
+                          capture_output=True, text=True, check=True)
+
+
+def medir_importacion(modulo):
+    """
+    Retorna el tiempo acumulado, en ms, que reporta -X importtime para el módulo.
+    """
+    resultado = _ejecutar(["-X", "importtime", "-c", f"import {modulo}"])
+    for linea in resultado.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        partes = linea.split("|")
+        if len(partes) == 3 and partes[2].strip() == modulo:
+            return int(partes[1]) / 1000
+    raise RuntimeError(f"importtime no reportó el módulo {modulo}")
+
+
+def modulos_cargados(modulo, prohibidos):
+    """
+    Retorna los módulos prohibidos que quedan cargados al importar el módulo.
+    """
+    codigo = (f"import sys, {modulo}\n"
+              f"print('\\n'.join(m for m in sys.modules if m.startswith({prohibidos!r})))")
+    return [m for m in _ejecutar(["-c", codigo]).stdout.split() if m]
+
+
+def medir_ventana():
+    """
+    Retorna el tiempo, en ms, hasta mostrar la ventana principal, o None si
+    PyQt5 no está disponible. Usa la plataforma offscreen si no hay pantalla.
+    """
+    entorno = dict(os.environ)
+    if not entorno.get("DISPLAY") and not entorno.get("WAYLAND_DISPLAY"):
+        entorno.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        resultado = _ejecutar(["-c", _SCRIPT_VENTANA], entorno)
+    except subprocess.CalledProcessError:
+        return None
+    return float(resultado.stdout.split()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica el presupuesto de arranque en frío.")
+    parser.add_argument("--repeticiones", type=int, default=5,
+                        help="mediciones por módulo; se usa la mediana")
+    args = parser.parse_args()
+
+    excedidos = []
+    for modulo, presupuesto, prohibidos in PRESUPUESTOS:
+        try:
+            tiempos = [medir_importacion(modulo) for _ in range(args.repeticiones)]
+        except subprocess.CalledProcessError as e:
+            print(f"{modulo:<14} no se pudo importar: {e.stderr.strip().splitlines()[-1]}")
+            excedidos.append(modulo)
+            continue
+        mediana = statistics.median(tiempos)
+        cargados = modulos_cargados(modulo, prohibidos)
+        estado = "ok" if mediana <= presupuesto and not cargados else "EXCEDIDO"
+        print(f"{modulo:<14} {mediana:8.1f} ms  (presupuesto {presupuesto} ms)  {estado}")
+        if cargados:
+            print(f"{'':<14} carga módulos que no debería: {', '.join(sorted(cargados)[:5])}")
+        if estado != "ok":
+            excedidos.append(modulo)
+
+    tiempos = [medir_ventana() for _ in range(args.repeticiones)]
+    if None in tiempos:
+        print("ventana        no se pudo medir (PyQt5 no disponible)")
+    else:
+        mediana = statistics.median(tiempos)
+        estado = "ok" if mediana <= PRESUPUESTO_VENTANA_MS else "EXCEDIDO"
+        print(f"{'ventana':<14} {mediana:8.1f} ms  (presupuesto {PRESUPUESTO_VENTANA_MS} ms)  {estado}")
+        if estado != "ok":
+            excedidos.append("ventana")
+
+    return 1 if excedidos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
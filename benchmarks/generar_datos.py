@@ -0,0 +1,116 @@
+"""
+Generador de datos de prueba reproducibles.
+
+Con la misma semilla y los mismos parámetros siempre se generan los mismos
+asientos, así que dos versiones del programa se pueden medir sobre datos
+idénticos.
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/generar_datos.py prueba.db --asientos 100000 --cuentas 200
+    python benchmarks/generar_datos.py grande.db --asientos 500000 --lineas-min 2 --lineas-max 6 --dias 1825
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from base_datos import abrir_conexion, aplicar_migraciones  # noqa: E402
+from logica import registrar_transacciones_lote  # noqa: E402
+
+ASIENTOS_POR_LOTE = 5000
+
+
+def generar_asientos(asientos, cuentas=100, lineas_min=2, lineas_max=4, fecha_inicio="2024-01-01", dias=365,
+                     semilla=1):
+    """
+    Produce `asientos` asientos cuadrados, con entre lineas_min y lineas_max
+    líneas cada uno (al menos una en Debe y una en Haber), repartidos al azar
+    entre `cuentas` cuentas y `dias` días desde fecha_inicio.
+    """
+    if lineas_min < 2 or lineas_max < lineas_min:
+        raise ValueError("Se necesitan al menos 2 líneas por asiento y lineas_max >= lineas_min.")
+    azar = random.Random(semilla)
+    nombres = [f"Cuenta {i:05d}" for i in range(1, cuentas + 1)]
+    inicio = date.fromisoformat(fecha_inicio)
+    for numero in range(1, asientos + 1):
+        lineas = azar.randint(lineas_min, lineas_max)
+        en_debe = azar.randint(1, lineas - 1)
+        montos_debe = [azar.randint(100, 10_000_00) for _ in range(en_debe)]
+
+        # El Haber reparte el total del Debe en el resto de las líneas
+        en_haber = lineas - en_debe
+        total = sum(montos_debe)
+        cortes = sorted(azar.sample(range(1, total), en_haber - 1)) if en_haber > 1 else []
+        montos_haber = [b - a for a, b in zip([0] + cortes, cortes + [total])]
+
+        yield {
+            "fecha": (inicio + timedelta(days=azar.randrange(dias))).isoformat(),
+            "descripcion": f"Asiento de prueba {numero} " + "texto " * azar.randint(0, 12),
+            "cuentas_debe": azar.sample(nombres, en_debe) if en_debe <= cuentas else azar.choices(nombres, k=en_debe),
+            "montos_debe": [f"{monto / 100:.2f}" for monto in montos_debe],
+            "cuentas_haber": azar.choices(nombres, k=en_haber),
+            "montos_haber": [f"{monto / 100:.2f}" for monto in montos_haber],
+        }
+
+
+def generar_base_datos(ruta, asientos, cuentas=100, lineas_min=2, lineas_max=4, fecha_inicio="2024-01-01", dias=365,
+                       semilla=1, progreso=None):
+    """
+    Crea la base de datos en ruta (que no debe existir) con los asientos
+    generados. Retorna la cantidad de líneas registradas.
+    """
+    if os.path.exists(ruta):
+        raise FileExistsError(f"{ruta} ya existe")
+    conn = abrir_conexion(ruta)
+    try:
+        aplicar_migraciones(conn)
+        lote = []
+        registrados = 0
+        for asiento in generar_asientos(asientos, cuentas, lineas_min, lineas_max, fecha_inicio, dias, semilla):
+            lote.append(asiento)
+            if len(lote) == ASIENTOS_POR_LOTE:
+                registrados += _registrar(lote, conn)
+                lote = []
+                if progreso:
+                    progreso(registrados, asientos)
+        if lote:
+            registrados += _registrar(lote, conn)
+        return conn.execute("SELECT COUNT(*) FROM detalles_transacciones").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _registrar(lote, conn):
+    resultado = registrar_transacciones_lote(lote, conn)
+    if not resultado["exito"]:
+        raise RuntimeError(f"No se pudo registrar el lote: {resultado['errores'][:3]}")
+    return resultado["registradas"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera una base de datos contable de prueba.")
+    parser.add_argument("ruta", help="archivo de base de datos a crear")
+    parser.add_argument("--asientos", type=int, default=10000)
+    parser.add_argument("--cuentas", type=int, default=100)
+    parser.add_argument("--lineas-min", type=int, default=2, help="líneas mínimas por asiento")
+    parser.add_argument("--lineas-max", type=int, default=4, help="líneas máximas por asiento")
+    parser.add_argument("--desde", default="2024-01-01", help="fecha del primer día")
+    parser.add_argument("--dias", type=int, default=365, help="días que abarcan los asientos")
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    lineas = generar_base_datos(
+        args.ruta, args.asientos, args.cuentas, args.lineas_min, args.lineas_max, args.desde, args.dias,
+        args.semilla, progreso=lambda hechos, total: print(f"  {hechos}/{total} asientos", file=sys.stderr),
+    )
+    print(f"{args.asientos} asientos, {lineas} líneas en {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
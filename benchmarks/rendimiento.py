@@ -0,0 +1,253 @@
+"""
+Mediciones de rendimiento de las funciones principales de logica.
+
+Para cada tamaño de datos se genera (una sola vez, en benchmarks/datos/) una
+base de datos reproducible con generar_datos.py y se mide el tiempo y el
+pico de memoria de Python (tracemalloc) de cada operación. Los resultados se
+guardan en JSON para comparar dos versiones del programa.
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/rendimiento.py --tamanos 1000,10000,100000
+    python benchmarks/rendimiento.py --tamanos 10000 --salida nueva.json --comparar anterior.json
+    python benchmarks/rendimiento.py --tamanos 1000000 --max-pdf 100000 --solo verificar_balance,obtener_libro_mayor
+
+Los tamaños son cantidades de asientos; cada asiento tiene entre
+--lineas-min y --lineas-max líneas. Antes de medir se cierran todos los meses
+de los datos, como quedan en uso normal al registrar asientos, así que el
+balance de un período parte del cierre del mes anterior.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import logica  # noqa: E402
+from base_datos import VERSION_ESQUEMA, cerrar_conexion, configurar_ruta, inicializar_base_datos, obtener_conexion  # noqa: E402
+from generar_datos import generar_base_datos  # noqa: E402
+
+CARPETA_DATOS = os.path.join(RAIZ, "benchmarks", "datos")
+
+# Asientos que se registran, uno por uno, al medir registrar_transaccion
+REGISTROS_POR_MEDICION = 200
+
+
+def _operaciones(carpeta_pdf, fecha_inicio, fecha_fin):
+    """
+    Retorna [(nombre, función sin argumentos, es_pdf)] con las operaciones a medir.
+    """
+    def pdf(nombre):
+        return os.path.join(carpeta_pdf, nombre)
+
+    return [
+        ("obtener_libro_diario", lambda: logica.obtener_libro_diario(), False),
+        ("obtener_libro_mayor", lambda: logica.obtener_libro_mayor(), False),
+        ("verificar_balance", lambda: logica.verificar_balance(), False),
+        ("obtener_balance_sumasy_saldos", lambda: logica.obtener_balance_sumasy_saldos(), False),
+        ("obtener_balance_sumasy_saldos_periodo_con_cierres",
+         lambda: logica.obtener_balance_sumasy_saldos(fecha_inicio, fecha_fin, saldos_iniciales=True), False),
+        ("generar_pdf_libro_diario",
+         lambda: logica.generar_pdf_libro_diario("Empresa", None, 36.5, None, None,
+                                                 ruta_salida=pdf("libro_diario.pdf")), True),
+        ("generar_pdf_libro_mayor",
+         lambda: logica.generar_pdf_libro_mayor("Empresa", None, 36.5, None,
+                                                ruta_salida=pdf("libro_mayor.pdf")), True),
+        ("generar_pdf_balance_sumasy_saldos",
+         lambda: logica.generar_pdf_balance_sumasy_saldos("Empresa", 36.5, fecha_inicio, fecha_fin,
+                                                          ruta_salida=pdf("balance.pdf")), True),
+    ]
+
+
+def _medir(funcion, repeticiones, con_memoria):
+    """
+    Ejecuta la función `repeticiones` veces y retorna (segundos mínimos,
+    mediana, pico de memoria en KiB o None). La memoria se mide en una
+    ejecución aparte porque tracemalloc hace más lento el código.
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+
+    pico = None
+    if con_memoria:
+        tracemalloc.start()
+        try:
+            funcion()
+            pico = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+    return min(tiempos), statistics.median(tiempos), pico
+
+
+def _medir_registro(ruta_bd, carpeta, con_memoria):
+    """
+    Mide registrar_transaccion sobre una copia de la base de datos, para no
+    alterar los datos compartidos entre ejecuciones. Retorna lo mismo que
+    _medir, con el tiempo por asiento.
+    """
+    copia = os.path.join(carpeta, "registro.db")
+    origen = sqlite3.connect(ruta_bd)
+    destino = sqlite3.connect(copia)
+    origen.backup(destino)
+    origen.close()
+    destino.close()
+    configurar_ruta(copia)
+
+    def registrar(cantidad):
+        for i in range(cantidad):
+            logica.registrar_transaccion("2024-06-15", ["Cuenta 00001", "Cuenta 00002"], [10.5, 4.5],
+                                         ["Cuenta 00003"], [15], f"Registro de medición {i}")
+
+    inicio = time.perf_counter()
+    registrar(REGISTROS_POR_MEDICION)
+    segundos = (time.perf_counter() - inicio) / REGISTROS_POR_MEDICION
+
+    pico = None
+    if con_memoria:
+        tracemalloc.start()
+        try:
+            registrar(REGISTROS_POR_MEDICION // 10)
+            pico = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+    cerrar_conexion()
+    return segundos, segundos, pico
+
+
+def _base_datos(asientos, args):
+    """
+    Retorna la ruta de la base de datos para el tamaño pedido, generándola si no existe.
+    La versión del esquema va en el nombre, así que los datos generados con un
+    esquema anterior no se reutilizan.
+    """
+    os.makedirs(CARPETA_DATOS, exist_ok=True)
+    nombre = (f"a{asientos}_c{args.cuentas}_l{args.lineas_min}-{args.lineas_max}_d{args.dias}"
+              f"_s{args.semilla}_v{VERSION_ESQUEMA}.db")
+    ruta = os.path.join(CARPETA_DATOS, nombre)
+    if not os.path.exists(ruta):
+        print(f"Generando {nombre}...", file=sys.stderr)
+        temporal = ruta + ".generando"
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(temporal + sufijo):
+                os.remove(temporal + sufijo)
+        generar_base_datos(temporal, asientos, args.cuentas, args.lineas_min, args.lineas_max,
+                           args.desde, args.dias, args.semilla)
+        os.replace(temporal, ruta)
+    else:
+        inicializar_base_datos(ruta)
+    return ruta
+
+
+def _metadatos():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def comparar(resultados, anteriores):
+    """
+    Imprime la relación entre los tiempos actuales y los de otra ejecución.
+    """
+    previos = {(r["asientos"], r["operacion"]): r for r in anteriores["resultados"]}
+    print(f"\nComparación con {anteriores['metadatos'].get('commit') or 'la ejecución anterior'}:")
+    for resultado in resultados:
+        previo = previos.get((resultado["asientos"], resultado["operacion"]))
+        if not previo or not previo["segundos"]:
+            continue
+        relacion = resultado["segundos"] / previo["segundos"]
+        print(f"  {resultado['asientos']:>9} {resultado['operacion']:<50} "
+              f"{previo['segundos']:9.4f} s -> {resultado['segundos']:9.4f} s  (x{relacion:.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide el rendimiento de las operaciones contables.")
+    parser.add_argument("--tamanos", default="1000,10000",
+                        help="cantidades de asientos separadas por coma (por defecto 1000,10000)")
+    parser.add_argument("--cuentas", type=int, default=100)
+    parser.add_argument("--lineas-min", type=int, default=2)
+    parser.add_argument("--lineas-max", type=int, default=4)
+    parser.add_argument("--desde", default="2024-01-01")
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--repeticiones", type=int, default=3, help="ejecuciones por operación (no PDF)")
+    parser.add_argument("--max-pdf", type=int, default=20000,
+                        help="no genera PDF para tamaños con más asientos que este (0 = sin límite)")
+    parser.add_argument("--solo", help="operaciones a medir, separadas por coma")
+    parser.add_argument("--sin-memoria", action="store_true", help="no mide el pico de memoria")
+    parser.add_argument("--salida", help="archivo JSON de resultados (por defecto benchmarks/resultados-<commit>.json)")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior para comparar")
+    args = parser.parse_args()
+
+    tamanos = [int(t) for t in args.tamanos.split(",") if t.strip()]
+    solo = set(args.solo.split(",")) if args.solo else None
+    metadatos = _metadatos()
+    metadatos["parametros"] = {k: v for k, v in vars(args).items() if k not in ("salida", "comparar")}
+    resultados = []
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        for asientos in tamanos:
+            ruta_bd = _base_datos(asientos, args)
+            configurar_ruta(ruta_bd)
+            lineas = obtener_conexion().execute("SELECT COUNT(*) FROM detalles_transacciones").fetchone()[0]
+            # Las consultas no cierran meses: se cierran aquí, hasta el último
+            # mes de los datos, para que todas las mediciones partan del mismo estado
+            fin_datos = date.fromisoformat(args.desde) + timedelta(days=args.dias - 1)
+            logica.cerrar_periodo(fin_datos.strftime("%Y-%m"))
+
+            # Período de 30 días a mitad del rango, para el balance con saldos iniciales
+            mitad = date.fromisoformat(args.desde) + timedelta(days=args.dias // 2)
+            fecha_inicio, fecha_fin = mitad.isoformat(), (mitad + timedelta(days=29)).isoformat()
+
+            medir_pdf = not args.max_pdf or asientos <= args.max_pdf
+            for nombre, funcion, es_pdf in _operaciones(carpeta, fecha_inicio, fecha_fin):
+                if (solo and nombre not in solo) or (es_pdf and not medir_pdf):
+                    continue
+                logica.invalidar_cache_referencias()
+                minimo, mediana, pico = _medir(funcion, 1 if es_pdf else args.repeticiones, not args.sin_memoria)
+                resultados.append({"asientos": asientos, "lineas": lineas, "operacion": nombre,
+                                   "segundos": minimo, "mediana": mediana, "pico_memoria_kib": pico})
+                memoria = f"{pico:10.0f} KiB" if pico is not None else ""
+                print(f"{asientos:>9} {nombre:<50} {minimo:9.4f} s {memoria}")
+
+            if not solo or "registrar_transaccion" in solo:
+                segundos, mediana, pico = _medir_registro(ruta_bd, carpeta, not args.sin_memoria)
+                resultados.append({"asientos": asientos, "lineas": lineas, "operacion": "registrar_transaccion",
+                                   "segundos": segundos, "mediana": mediana, "pico_memoria_kib": pico})
+                memoria = f"{pico:10.0f} KiB" if pico is not None else ""
+                print(f"{asientos:>9} {'registrar_transaccion (por asiento)':<50} {segundos:9.4f} s {memoria}")
+        cerrar_conexion()
+
+    salida = args.salida or os.path.join(RAIZ, "benchmarks", f"resultados-{metadatos['commit'] or 'local'}.json")
+    with open(salida, "w", encoding="utf-8") as archivo:
+        json.dump({"metadatos": metadatos, "resultados": resultados}, archivo, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as archivo:
+            comparar(resultados, json.load(archivo))
+
+
+if __name__ == "__main__":
+    main()
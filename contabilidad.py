@@ -0,0 +1,386 @@
+"""
+Línea de comandos del sistema contable, sin interfaz gráfica.
+
+Ejemplos:
+    python -m contabilidad report diario --desde 2024-01-01 --hasta 2024-01-31 --tasa 36.5 --out diario.pdf
+    python -m contabilidad --db empresa.db report balance --empresa "Mi Empresa" --tasa 36.5
+    python -m contabilidad import asientos.jsonl
+    python -m contabilidad import diario_2024-06-01.csv --rechazados rechazados.csv
+    python -m contabilidad export --desde 2024-01-01 --out asientos.jsonl
+    python -m contabilidad export mayor --out mayor.csv.gz
+    python -m contabilidad verify
+    python -m contabilidad search alquiler oficina --desde 2024-01-01 --cuenta Caja
+    python -m contabilidad rebuild-totals
+    python -m contabilidad close 2024-06
+    python -m contabilidad batch reportes.jsonl
+    python -m contabilidad --perfil perfil.json report mayor --out mayor.pdf
+
+Este módulo no importa PyQt5, así que puede correr en un servidor sin pantalla.
+"""
+import argparse
+import json
+import sys
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+
+import instrumentacion
+from base_datos import DB_PATH, configurar_ruta
+from logica import (
+    RESULTADOS_POR_PAGINA, buscar_transacciones, cerrar_meses_terminados, cerrar_periodo, inicializar_base_datos,
+    iterar_libro_diario, reconstruir_busqueda,
+    reconstruir_saldos_movimientos, reconstruir_totales_cuentas, registrar_transacciones_lote, verificar_balance,
+    generar_pdf_libro_diario, generar_pdf_libro_mayor, generar_pdf_balance_sumasy_saldos
+)
+
+REPORTES = ("diario", "mayor", "balance")
+ASIENTOS_POR_LOTE = 1000
+
+
+def _fecha(texto):
+    """
+    Valida una fecha AAAA-MM-DD recibida como argumento.
+    """
+    try:
+        return date.fromisoformat(texto).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"fecha no válida: {texto} (use AAAA-MM-DD)")
+
+
+def _periodo(texto):
+    """
+    Valida un mes AAAA-MM recibido como argumento.
+    """
+    try:
+        return date.fromisoformat(f"{texto}-01").strftime("%Y-%m")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"período no válido: {texto} (use AAAA-MM)")
+
+
+def _tasa(texto):
+    """
+    Valida el tipo de cambio recibido como argumento.
+    """
+    try:
+        tasa = Decimal(texto)
+    except ArithmeticError:
+        raise argparse.ArgumentTypeError(f"tasa no válida: {texto}")
+    if not tasa.is_finite() or tasa <= 0:
+        raise argparse.ArgumentTypeError(f"tasa no válida: {texto}")
+    return tasa
+
+
+def _abrir_base_datos(ruta):
+    """
+    Selecciona el archivo de base de datos y aplica las migraciones pendientes.
+    """
+    configurar_ruta(ruta)
+    inicializar_base_datos()
+
+
+def generar_reporte(reporte, empresa, tasa, desde=None, hasta=None, salida=None, procesos=1,
+                    saldos_iniciales=False):
+    """
+    Genera uno de los reportes en PDF sobre la base de datos configurada.
+    Retorna la ruta del archivo generado.
+    """
+    if reporte == "diario":
+        return generar_pdf_libro_diario(empresa, None, tasa, desde, hasta, ruta_salida=salida)
+    if reporte == "mayor":
+        return generar_pdf_libro_mayor(empresa, None, tasa, None, procesos=procesos, ruta_salida=salida)
+    if reporte == "balance":
+        return generar_pdf_balance_sumasy_saldos(empresa, tasa, desde, hasta, saldos_iniciales,
+                                                 ruta_salida=salida)
+    raise ValueError(f"Reporte desconocido: {reporte}")
+
+
+def _leer_jsonl(archivo):
+    """
+    Recorre un archivo JSON Lines y entrega (número de línea, objeto),
+    omitiendo las líneas vacías.
+    """
+    for numero, linea in enumerate(archivo, start=1):
+        if linea.strip():
+            yield numero, json.loads(linea)
+
+
+def _abrir_entrada(ruta):
+    return sys.stdin if ruta == "-" else open(ruta, encoding="utf-8")
+
+
+def _abrir_salida(ruta):
+    return sys.stdout if ruta in (None, "-") else open(ruta, "w", encoding="utf-8")
+
+
+def comando_report(args):
+    ruta = generar_reporte(args.reporte, args.empresa, args.tasa, args.desde, args.hasta, args.out,
+                           args.procesos, args.saldos_iniciales)
+    print(ruta)
+    return 0
+
+
+def comando_import(args):
+    """
+    Registra asientos desde un archivo. Los .csv se importan por lotes con
+    importacion.importar_csv, que rechaza los asientos inválidos sin
+    detenerse y puede retomar una importación interrumpida.
+
+    Los demás archivos se leen como JSON Lines, un asiento por línea con las
+    claves fecha, descripcion, cuentas_debe, montos_debe, cuentas_haber y
+    montos_haber. Se registran en lotes; un lote con errores no se registra y
+    detiene la importación.
+    """
+    if args.archivo.lower().endswith(".csv"):
+        return _importar_csv(args)
+
+    registradas = 0
+    with _abrir_entrada(args.archivo) as archivo:
+        lineas = _leer_jsonl(archivo)
+        while True:
+            bloque = list(islice(lineas, args.lote or ASIENTOS_POR_LOTE))
+            if not bloque:
+                break
+            resultado = registrar_transacciones_lote([asiento for _, asiento in bloque])
+            if not resultado["exito"]:
+                for error in resultado["errores"]:
+                    indice = error["indice"]
+                    linea = bloque[indice][0] if indice is not None else "-"
+                    print(f"Línea {linea}: {error['error']}", file=sys.stderr)
+                print(f"Importación detenida; asientos registrados: {registradas}", file=sys.stderr)
+                return 1
+            registradas += resultado["registradas"]
+    cerrar_meses_terminados()
+    print(f"Asientos registrados: {registradas}")
+    return 0
+
+
+def _importar_csv(args):
+    from importacion import LINEAS_POR_LOTE, importar_csv
+
+    def informar(estadisticas):
+        print(f"  {estadisticas['lineas']} filas, {estadisticas['asientos']} asientos, "
+              f"{estadisticas['rechazadas']} filas rechazadas "
+              f"({estadisticas['lineas_por_segundo']:.0f} filas/s)", file=sys.stderr)
+
+    resultado = importar_csv(args.archivo, lineas_por_lote=args.lote or LINEAS_POR_LOTE,
+                             ruta_rechazados=args.rechazados, reiniciar=args.reiniciar, progreso=informar)
+    if resultado["ya_importada"]:
+        print("El archivo ya estaba importado (use --reiniciar para importarlo de nuevo).")
+        return 0
+    if resultado["retomada_desde"]:
+        print(f"Importación retomada desde la fila {resultado['retomada_desde'] + 1}.")
+    print(f"Filas procesadas: {resultado['lineas']}")
+    print(f"Asientos registrados: {resultado['asientos']}")
+    print(f"Filas rechazadas: {resultado['rechazadas']}")
+    print(f"Tiempo: {resultado['segundos']:.1f} s ({resultado['lineas_por_segundo']:.0f} filas/s)")
+    return 0
+
+
+def comando_export(args):
+    """
+    Exporta los datos. "asientos" escribe el libro diario en JSON Lines, un
+    asiento por línea, con los montos como texto para no perder precisión;
+    ese archivo se puede volver a importar. "diario", "mayor" y "balance"
+    usan los exportadores de exportacion (CSV o JSON Lines, con gzip si la
+    salida termina en .gz).
+    """
+    if args.datos != "asientos":
+        return _exportar_tabla(args)
+
+    salida = _abrir_salida(args.out)
+    try:
+        for transaccion in iterar_libro_diario(args.desde, args.hasta):
+            salida.write(json.dumps(transaccion, ensure_ascii=False, default=str) + "\n")
+    finally:
+        if salida is not sys.stdout:
+            salida.close()
+    return 0
+
+
+def _exportar_tabla(args):
+    from exportacion import exportar_balance_sumasy_saldos, exportar_libro_diario, exportar_libro_mayor
+
+    if args.datos == "diario":
+        filas = exportar_libro_diario(args.out, args.desde, args.hasta, args.formato, args.gzip)
+    elif args.datos == "mayor":
+        filas = exportar_libro_mayor(args.out, args.formato, args.gzip)
+    else:
+        filas = exportar_balance_sumasy_saldos(args.out, args.desde, args.hasta, args.saldos_iniciales,
+                                               args.formato, args.gzip)
+    if args.out not in (None, "-"):
+        print(f"{filas} filas escritas en {args.out}")
+    return 0
+
+
+def comando_verify(args):
+    resultado = verificar_balance()
+    print(f"Total Debe:  Bs {resultado['total_debe']:.2f}")
+    print(f"Total Haber: Bs {resultado['total_haber']:.2f}")
+    print("Equilibrado" if resultado["equilibrado"] else "No equilibrado")
+    return 0 if resultado["equilibrado"] else 1
+
+
+def comando_rebuild_totals(args):
+    cuentas = reconstruir_totales_cuentas()
+    print(f"Totales recalculados para {cuentas} cuentas")
+    cuentas = reconstruir_saldos_movimientos()
+    print(f"Saldos acumulados recalculados para {cuentas} cuentas")
+    reconstruir_busqueda()
+    print("Índice de búsqueda reconstruido")
+    return 0
+
+
+def comando_close(args):
+    """
+    Cierra el mes indicado y los meses anteriores que falten, guardando el
+    saldo de cada cuenta al final de cada uno.
+    """
+    cerrados = cerrar_periodo(args.periodo)
+    if cerrados:
+        print(f"Períodos cerrados: {cerrados[0]} a {cerrados[-1]} ({len(cerrados)})")
+    else:
+        print(f"El período {args.periodo} ya estaba cerrado")
+    return 0
+
+
+def comando_search(args):
+    """
+    Busca transacciones por las palabras de su descripción y muestra cada
+    una, de la más a la menos relevante, con sus líneas.
+    """
+    resultados = buscar_transacciones(" ".join(args.texto), args.desde, args.hasta, args.cuenta, limite=args.limite)
+    for resultado in resultados:
+        print(f"{resultado['fecha']}  #{resultado['id']}  {resultado['descripcion']}")
+        for cuenta, monto in zip(resultado["cuentas_debe"], resultado["montos_debe"]):
+            print(f"    Debe   Bs {monto:>15.2f}  {cuenta}")
+        for cuenta, monto in zip(resultado["cuentas_haber"], resultado["montos_haber"]):
+            print(f"    Haber  Bs {monto:>15.2f}  {cuenta}")
+    if not resultados:
+        print("No se encontraron transacciones")
+    return 0
+
+
+def comando_batch(args):
+    """
+    Genera muchos reportes en un solo proceso. Cada línea del archivo JSON
+    Lines describe un reporte con las claves reporte, out y opcionalmente db,
+    empresa, tasa, desde, hasta, procesos y saldos_iniciales; las que faltan
+    toman los valores de la línea de comandos. Un reporte que falla no detiene
+    los demás.
+    """
+    fallidos = 0
+    with _abrir_entrada(args.archivo) as archivo:
+        for numero, trabajo in _leer_jsonl(archivo):
+            try:
+                _abrir_base_datos(trabajo.get("db", args.db))
+                ruta = generar_reporte(
+                    trabajo["reporte"],
+                    trabajo.get("empresa", args.empresa),
+                    _tasa(str(trabajo.get("tasa", args.tasa))),
+                    trabajo.get("desde"),
+                    trabajo.get("hasta"),
+                    trabajo.get("out"),
+                    int(trabajo.get("procesos", args.procesos)),
+                    bool(trabajo.get("saldos_iniciales", False)),
+                )
+                print(ruta)
+            except Exception as e:
+                fallidos += 1
+                print(f"Línea {numero}: {e}", file=sys.stderr)
+    return 1 if fallidos else 0
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(prog="contabilidad", description="Sistema contable sin interfaz gráfica.")
+    parser.add_argument("--db", default=DB_PATH, help=f"archivo de base de datos (por defecto {DB_PATH})")
+    parser.add_argument("--perfil", metavar="ARCHIVO",
+                        help="mide las consultas SQL y las fases de los reportes y guarda el resultado "
+                             "en ARCHIVO (JSON, o líneas de texto si ARCHIVO es -)")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    opciones_reporte = argparse.ArgumentParser(add_help=False)
+    opciones_reporte.add_argument("--empresa", default="", help="nombre de la empresa para el encabezado")
+    opciones_reporte.add_argument("--tasa", type=_tasa, default=Decimal(1), help="Bs por USD")
+    opciones_reporte.add_argument("--procesos", type=int, default=1,
+                                  help="procesos para dibujar el libro mayor (requiere pypdf si es > 1)")
+
+    report = subparsers.add_parser("report", parents=[opciones_reporte], help="genera un reporte en PDF")
+    report.add_argument("reporte", choices=REPORTES)
+    report.add_argument("--desde", type=_fecha, help="fecha inicial AAAA-MM-DD (diario y balance)")
+    report.add_argument("--hasta", type=_fecha, help="fecha final AAAA-MM-DD (diario y balance)")
+    report.add_argument("--out", help="ruta del PDF a generar")
+    report.add_argument("--saldos-iniciales", action="store_true",
+                        help="agrega al balance el saldo de cada cuenta antes de --desde")
+    report.set_defaults(funcion=comando_report)
+
+    importar = subparsers.add_parser("import", help="registra asientos desde un archivo .csv o JSON Lines")
+    importar.add_argument("archivo", help="archivo .csv o .jsonl, o - para JSON Lines por la entrada estándar")
+    importar.add_argument("--lote", type=int,
+                          help=f"asientos (JSON Lines, por defecto {ASIENTOS_POR_LOTE}) o filas (CSV) por transacción")
+    importar.add_argument("--rechazados", help="CSV donde guardar las filas rechazadas (solo CSV)")
+    importar.add_argument("--reiniciar", action="store_true",
+                          help="importa de nuevo un CSV ya importado, desde el principio")
+    importar.set_defaults(funcion=comando_import)
+
+    exportar = subparsers.add_parser("export", help="exporta asientos, libro diario, libro mayor o balance")
+    exportar.add_argument("datos", nargs="?", default="asientos", choices=("asientos", "diario", "mayor", "balance"),
+                          help="asientos (JSON Lines reimportable, por defecto) o una tabla en CSV/JSON Lines")
+    exportar.add_argument("--desde", type=_fecha)
+    exportar.add_argument("--hasta", type=_fecha)
+    exportar.add_argument("--out", help="archivo de salida (por defecto la salida estándar)")
+    exportar.add_argument("--formato", choices=("csv", "jsonl"),
+                          help="formato de las tablas (por defecto según la extensión de --out, o csv)")
+    exportar.add_argument("--gzip", action="store_true", default=None,
+                          help="comprime la salida (automático si --out termina en .gz)")
+    exportar.add_argument("--saldos-iniciales", action="store_true",
+                          help="agrega al balance el saldo de cada cuenta antes de --desde")
+    exportar.set_defaults(funcion=comando_export)
+
+    verify = subparsers.add_parser("verify", help="comprueba que el Debe y el Haber estén equilibrados")
+    verify.set_defaults(funcion=comando_verify)
+
+    search = subparsers.add_parser("search", help="busca transacciones por las palabras de su descripción")
+    search.add_argument("texto", nargs="+", help="palabras a buscar (cada una como prefijo)")
+    search.add_argument("--desde", type=_fecha)
+    search.add_argument("--hasta", type=_fecha)
+    search.add_argument("--cuenta", help="solo transacciones que mueven esta cuenta")
+    search.add_argument("--limite", type=int, default=RESULTADOS_POR_PAGINA,
+                        help=f"cantidad máxima de resultados (por defecto {RESULTADOS_POR_PAGINA})")
+    search.set_defaults(funcion=comando_search)
+
+    rebuild = subparsers.add_parser("rebuild-totals",
+                                    help="recalcula los totales por cuenta, los saldos acumulados de cada "
+                                         "línea y el índice de búsqueda")
+    rebuild.set_defaults(funcion=comando_rebuild_totals)
+
+    close = subparsers.add_parser("close", help="cierra un mes guardando el saldo de cada cuenta a su final")
+    close.add_argument("periodo", type=_periodo, help="mes a cerrar (AAAA-MM); también cierra los anteriores")
+    close.set_defaults(funcion=comando_close)
+
+    batch = subparsers.add_parser("batch", parents=[opciones_reporte],
+                                  help="genera varios reportes descritos en un archivo JSON Lines")
+    batch.add_argument("archivo", help="archivo .jsonl, o - para la entrada estándar")
+    batch.set_defaults(funcion=comando_batch)
+
+    return parser
+
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    if args.perfil:
+        instrumentacion.activar()
+    try:
+        _abrir_base_datos(args.db)
+        return args.funcion(args)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.perfil == "-":
+            instrumentacion.volcar_log()
+        elif args.perfil:
+            instrumentacion.volcar_json(args.perfil)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+Exportación de los datos contables a CSV o JSON Lines, opcionalmente con gzip.
+
+Las filas se leen del cursor por lotes con fetchmany y se escriben al
+archivo a medida que llegan, así que la memoria usada no depende del tamaño
+de las tablas. Los montos se escriben como texto decimal en Bs ("1234.50")
+para no perder precisión.
+
+El formato se toma de la extensión del archivo (.csv o .jsonl, con .gz
+opcional al final) o se indica con formato= y comprimir=.
+"""
+import csv
+import gzip
+import json
+import sys
+
+from base_datos import obtener_conexion
+from logica import a_bolivares, actualizar_saldos_pendientes, obtener_balance_sumasy_saldos
+
+# Filas que se piden al cursor en cada fetchmany
+FILAS_POR_LECTURA = 5000
+
+FORMATOS = ("csv", "jsonl")
+
+
+def _formato_de(ruta, formato=None, comprimir=None):
+    """
+    Deduce (formato, comprimir) de la extensión de la ruta, si no se indican.
+    """
+    nombre = (ruta or "").lower()
+    if comprimir is None:
+        comprimir = nombre.endswith(".gz")
+    if nombre.endswith(".gz"):
+        nombre = nombre[:-3]
+    if formato is None:
+        formato = "jsonl" if nombre.endswith((".jsonl", ".json")) else "csv"
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no válido: {formato} (use {' o '.join(FORMATOS)})")
+    return formato, comprimir
+
+
+def _abrir(ruta, comprimir):
+    if ruta in (None, "-"):
+        return sys.stdout, False
+    if comprimir:
+        return gzip.open(ruta, "wt", encoding="utf-8", newline=""), True
+    return open(ruta, "w", encoding="utf-8", newline=""), True
+
+
+def _escribir(ruta, columnas, lotes, formato=None, comprimir=None):
+    """
+    Escribe en ruta los lotes de filas (listas de tuplas en el orden de
+    columnas). Retorna la cantidad de filas escritas.
+    """
+    formato, comprimir = _formato_de(ruta, formato, comprimir)
+    archivo, cerrar = _abrir(ruta, comprimir)
+    total = 0
+    try:
+        if formato == "csv":
+            escritor = csv.writer(archivo)
+            escritor.writerow(columnas)
+            for lote in lotes:
+                escritor.writerows(lote)
+                total += len(lote)
+        else:
+            for lote in lotes:
+                archivo.writelines(json.dumps(dict(zip(columnas, fila)), ensure_ascii=False) + "\n"
+                                   for fila in lote)
+                total += len(lote)
+    finally:
+        if cerrar:
+            archivo.close()
+        else:
+            archivo.flush()
+    return total
+
+
+def _lotes(cursor, tamano=FILAS_POR_LECTURA):
+    """
+    Entrega las filas del cursor en listas de hasta `tamano` filas.
+    """
+    while True:
+        lote = cursor.fetchmany(tamano)
+        if not lote:
+            return
+        yield lote
+
+
+def _filtro_fechas(fecha_inicio, fecha_fin, columna="t.fecha"):
+    condiciones = []
+    params = []
+    if fecha_inicio:
+        condiciones.append(f"{columna} >= ?")
+        params.append(fecha_inicio)
+    if fecha_fin:
+        condiciones.append(f"{columna} <= ?")
+        params.append(fecha_fin)
+    return (" WHERE " + " AND ".join(condiciones) if condiciones else ""), params
+
+
+def exportar_libro_diario(ruta, fecha_inicio=None, fecha_fin=None, formato=None, comprimir=None, conn=None):
+    """
+    Exporta las transacciones con sus líneas, una fila por línea, en el
+    orden del libro diario. Columnas: transaccion_id, fecha, descripcion,
+    linea_id, cuenta, tipo, monto. Retorna la cantidad de filas escritas.
+    """
+    cursor = (conn or obtener_conexion()).cursor()
+    filtro, params = _filtro_fechas(fecha_inicio, fecha_fin)
+    cursor.execute(f"""
+        SELECT t.id, t.fecha, t.descripcion, dt.id, c.nombre, dt.tipo, dt.monto
+        FROM transacciones t
+        JOIN detalles_transacciones dt ON dt.transaccion_id = t.id
+        JOIN cuentas c ON c.id = dt.cuenta_id
+        {filtro}
+        ORDER BY t.fecha, t.id, dt.tipo, dt.id
+    """, params)
+
+    columnas = ["transaccion_id", "fecha", "descripcion", "linea_id", "cuenta", "tipo", "monto"]
+    lotes = ([fila[:6] + (str(a_bolivares(fila[6])),) for fila in lote] for lote in _lotes(cursor))
+    try:
+        return _escribir(ruta, columnas, lotes, formato, comprimir)
+    finally:
+        cursor.close()
+
+
+def exportar_libro_mayor(ruta, formato=None, comprimir=None, conn=None):
+    """
+    Exporta los movimientos de cada cuenta en orden cronológico con el saldo
+    acumulado de la cuenta, igual que el PDF del Libro Mayor. Columnas:
+    cuenta, fecha, transaccion_id, descripcion, debe, haber, saldo.
+    Retorna la cantidad de filas escritas.
+    """
+    conn = conn or obtener_conexion()
+    actualizar_saldos_pendientes(conn)
+    cursor = conn.cursor()
+    # Cuentas por nombre y sus líneas por índice, sin ordenar todo en memoria
+    cursor.execute("""
+        SELECT c.nombre, dt.fecha, t.id, t.descripcion, dt.tipo, dt.monto, dt.saldo
+        FROM cuentas c
+        CROSS JOIN detalles_transacciones dt ON dt.cuenta_id = c.id
+        JOIN transacciones t ON dt.transaccion_id = t.id
+        ORDER BY c.nombre, dt.fecha, dt.id
+    """)
+
+    def filas_con_saldo():
+        for lote in _lotes(cursor):
+            filas = []
+            for cuenta, fecha, transaccion_id, descripcion, tipo, monto, saldo in lote:
+                if tipo == "Debe":
+                    debe, haber = str(a_bolivares(monto)), ""
+                else:
+                    debe, haber = "", str(a_bolivares(monto))
+                filas.append((cuenta, fecha, transaccion_id, descripcion, debe, haber, str(a_bolivares(saldo))))
+            yield filas
+
+    columnas = ["cuenta", "fecha", "transaccion_id", "descripcion", "debe", "haber", "saldo"]
+    try:
+        return _escribir(ruta, columnas, filas_con_saldo(), formato, comprimir)
+    finally:
+        cursor.close()
+
+
+def exportar_balance_sumasy_saldos(ruta, fecha_inicio=None, fecha_fin=None, saldos_iniciales=False, formato=None,
+                                   comprimir=None, conn=None):
+    """
+    Exporta el balance de sumas y saldos del período, una fila por cuenta.
+    Columnas: cuenta, saldo_inicial, debe, haber, saldo_deudor, saldo_acreedor.
+    El balance tiene una fila por cuenta, así que se arma con
+    obtener_balance_sumasy_saldos. Retorna la cantidad de filas escritas.
+    """
+    columnas = ["cuenta", "saldo_inicial", "debe", "haber", "saldo_deudor", "saldo_acreedor"]
+    balances = obtener_balance_sumasy_saldos(fecha_inicio, fecha_fin, saldos_iniciales, conn=conn)
+    filas = [tuple(registro[columna] if columna == "cuenta" else str(registro[columna]) for columna in columnas)
+             for registro in balances]
+    return _escribir(ruta, columnas, [filas], formato, comprimir)
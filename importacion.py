@@ -0,0 +1,278 @@
+"""
+Importación de asientos desde archivos CSV grandes.
+
+El archivo se lee como flujo, sin cargarlo completo en memoria. Cada fila es
+una línea de un asiento; las filas de un mismo asiento van seguidas y
+comparten el valor de la columna "asiento". Se aceptan dos formatos de
+columnas (los nombres no distinguen mayúsculas):
+
+    asiento,fecha,descripcion,cuenta,tipo,monto      (tipo = Debe o Haber)
+    asiento,fecha,descripcion,cuenta,debe,haber      (uno de los dos montos)
+
+Los asientos se registran en lotes grandes con registrar_transacciones_lote.
+Junto con cada lote se guarda en la tabla importaciones cuántas filas del
+archivo ya se procesaron, así que si la importación se interrumpe, volver a
+importar el mismo archivo la retoma desde el último lote confirmado.
+"""
+import csv
+import hashlib
+import os
+import time
+from datetime import datetime
+
+from base_datos import obtener_conexion
+from logica import (actualizar_saldos_pendientes, cerrar_meses_terminados, invalidar_cache_referencias,
+                    registrar_transacciones_lote)
+
+# Filas del CSV por cada transacción de SQLite (los asientos no se parten)
+LINEAS_POR_LOTE = 20000
+
+# Bytes del inicio del archivo que se usan para reconocerlo al retomar
+_BYTES_HUELLA = 1024 * 1024
+
+
+def huella_archivo(ruta):
+    """
+    Identifica un archivo por su tamaño y el hash de su primer MiB, de modo
+    que un archivo nuevo con el mismo nombre no se confunda con uno anterior.
+    """
+    with open(ruta, "rb") as archivo:
+        inicio = archivo.read(_BYTES_HUELLA)
+    return f"{os.path.getsize(ruta)}:{hashlib.sha256(inicio).hexdigest()}"
+
+
+def _columnas(encabezado):
+    """
+    Retorna {nombre: posición} para las columnas del encabezado y valida
+    que esté alguno de los dos formatos aceptados.
+    """
+    columnas = {nombre.strip().lower(): i for i, nombre in enumerate(encabezado)}
+    faltantes = {"asiento", "fecha", "cuenta"} - columnas.keys()
+    if not ({"tipo", "monto"} <= columnas.keys() or {"debe", "haber"} <= columnas.keys()):
+        faltantes.add("tipo/monto o debe/haber")
+    if faltantes:
+        raise ValueError(f"Faltan columnas en el CSV: {', '.join(sorted(faltantes))}")
+    return columnas
+
+
+def _agrupar_asientos(filas, columnas):
+    """
+    Agrupa filas consecutivas con el mismo valor de "asiento". Recibe y
+    entrega tuplas (número de fila de datos, fila); por cada asiento produce
+    (número de su última fila, filas del asiento).
+    """
+    posicion = columnas["asiento"]
+    clave_actual = None
+    grupo = []
+    for numero, fila in filas:
+        clave = fila[posicion].strip() if len(fila) > posicion else ""
+        if grupo and clave != clave_actual:
+            yield grupo[-1][0], grupo
+            grupo = []
+        clave_actual = clave
+        grupo.append((numero, fila))
+    if grupo:
+        yield grupo[-1][0], grupo
+
+
+def _convertir_asiento(grupo, columnas):
+    """
+    Convierte las filas de un asiento al diccionario que recibe
+    registrar_transacciones_lote. Lanza ValueError si alguna fila no se
+    puede interpretar; el cuadre de Debe y Haber lo valida logica.
+    """
+    def valor(fila, nombre):
+        posicion = columnas.get(nombre)
+        return fila[posicion].strip() if posicion is not None and posicion < len(fila) else ""
+
+    asiento = {
+        "fecha": valor(grupo[0][1], "fecha"),
+        "descripcion": valor(grupo[0][1], "descripcion"),
+        "cuentas_debe": [],
+        "montos_debe": [],
+        "cuentas_haber": [],
+        "montos_haber": [],
+    }
+    for _, fila in grupo:
+        cuenta = valor(fila, "cuenta")
+        if not cuenta:
+            raise ValueError("Fila sin cuenta.")
+        if "tipo" in columnas:
+            tipo = valor(fila, "tipo").capitalize()
+            monto = valor(fila, "monto")
+        else:
+            debe, haber = valor(fila, "debe"), valor(fila, "haber")
+            if bool(debe) == bool(haber):
+                raise ValueError("Cada fila debe tener un monto solo en Debe o solo en Haber.")
+            tipo, monto = ("Debe", debe) if debe else ("Haber", haber)
+        if tipo == "Debe":
+            asiento["cuentas_debe"].append(cuenta)
+            asiento["montos_debe"].append(monto)
+        elif tipo == "Haber":
+            asiento["cuentas_haber"].append(cuenta)
+            asiento["montos_haber"].append(monto)
+        else:
+            raise ValueError(f"Tipo no válido: {valor(fila, 'tipo')!r} (use Debe o Haber).")
+    return asiento
+
+
+def _leer_punto_control(cursor, huella):
+    cursor.execute("""
+        SELECT lineas, asientos, rechazadas, completa FROM importaciones WHERE huella = ?
+    """, (huella,))
+    return cursor.fetchone()
+
+
+def _guardar_punto_control(cursor, huella, ruta, estadisticas, completa=False):
+    cursor.execute("""
+        INSERT INTO importaciones (huella, archivo, lineas, asientos, rechazadas, completa, actualizada)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(huella) DO UPDATE SET
+            archivo = excluded.archivo,
+            lineas = excluded.lineas,
+            asientos = excluded.asientos,
+            rechazadas = excluded.rechazadas,
+            completa = excluded.completa,
+            actualizada = excluded.actualizada
+    """, (huella, os.path.abspath(ruta), estadisticas["lineas"], estadisticas["asientos"],
+          estadisticas["rechazadas"], int(completa), datetime.now().isoformat(timespec="seconds")))
+
+
+def _actualizar_ritmo(estadisticas, inicio):
+    estadisticas["segundos"] = time.perf_counter() - inicio
+    procesadas = estadisticas["lineas"] - estadisticas["retomada_desde"]
+    estadisticas["lineas_por_segundo"] = procesadas / estadisticas["segundos"] if estadisticas["segundos"] else 0.0
+
+
+def importar_csv(ruta, conn=None, lineas_por_lote=LINEAS_POR_LOTE, ruta_rechazados=None, reiniciar=False,
+                 delimitador=",", progreso=None):
+    """
+    Importa los asientos de un archivo CSV (ver el formato al inicio del módulo).
+
+    Los asientos que no cuadran o tienen filas mal formadas se rechazan sin
+    detener la importación; si se indica ruta_rechazados, sus filas se
+    agregan a ese CSV con una columna "error". Si el archivo ya se importó
+    por completo no se vuelve a registrar, salvo con reiniciar=True (que lo
+    importa otra vez desde el principio).
+
+    progreso, si se indica, recibe las estadísticas después de cada lote.
+    Retorna un diccionario con:
+      - lineas: filas de datos procesadas (incluidas las de antes de retomar)
+      - asientos: asientos registrados
+      - rechazadas: filas rechazadas
+      - retomada_desde: filas que ya estaban procesadas al empezar
+      - ya_importada: True si el archivo ya estaba importado y no se hizo nada
+      - segundos y lineas_por_segundo de esta ejecución
+    """
+    conn = conn or obtener_conexion()
+    cursor = conn.cursor()
+    huella = huella_archivo(ruta)
+
+    punto = _leer_punto_control(cursor, huella)
+    if punto and reiniciar:
+        cursor.execute("DELETE FROM importaciones WHERE huella = ?", (huella,))
+        conn.commit()
+        punto = None
+    lineas, asientos, rechazadas, completa = punto or (0, 0, 0, 0)
+    estadisticas = {
+        "lineas": lineas,
+        "asientos": asientos,
+        "rechazadas": rechazadas,
+        "retomada_desde": lineas,
+        "ya_importada": bool(completa),
+        "segundos": 0.0,
+        "lineas_por_segundo": 0.0,
+    }
+    if completa:
+        return estadisticas
+
+    inicio = time.perf_counter()
+    archivo_rechazos = None
+    rechazos = None
+
+    def confirmar_lote(lote, grupos, rechazados, ultima_fila):
+        """
+        Registra un lote y guarda el punto de control en la misma transacción.
+        """
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            resultado = registrar_transacciones_lote(lote, conn, omitir_invalidos=True)
+            errores = resultado["errores"]
+            if errores and errores[0]["indice"] is None:
+                raise Exception(errores[0]["error"])
+            rechazados = rechazados + [(grupos[error["indice"]], error["error"]) for error in errores]
+
+            estadisticas["lineas"] = ultima_fila
+            estadisticas["asientos"] += resultado["registradas"]
+            estadisticas["rechazadas"] += sum(len(grupo) for grupo, _ in rechazados)
+            # Los rechazos se escriben antes de confirmar: si se corta aquí,
+            # al retomar se repiten en el archivo, pero no se pierden
+            if rechazos is not None:
+                for grupo, error in rechazados:
+                    for _, fila in grupo:
+                        rechazos.writerow(fila + [error])
+                archivo_rechazos.flush()
+            _guardar_punto_control(cursor, huella, ruta, estadisticas)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            # Las cuentas creadas en el lote revertido ya no existen
+            invalidar_cache_referencias(conn)
+            raise
+
+        _actualizar_ritmo(estadisticas, inicio)
+        if progreso:
+            progreso(dict(estadisticas))
+
+    try:
+        with open(ruta, newline="", encoding="utf-8-sig") as archivo:
+            lector = csv.reader(archivo, delimiter=delimitador)
+            encabezado = next(lector, None)
+            if encabezado is None:
+                raise ValueError("El archivo CSV está vacío.")
+            columnas = _columnas(encabezado)
+
+            if ruta_rechazados:
+                nuevo = not os.path.exists(ruta_rechazados) or os.path.getsize(ruta_rechazados) == 0
+                archivo_rechazos = open(ruta_rechazados, "a", newline="", encoding="utf-8")
+                rechazos = csv.writer(archivo_rechazos)
+                if nuevo:
+                    rechazos.writerow(encabezado + ["error"])
+
+            # Las filas ya procesadas se saltan sin interpretarlas; las vacías se ignoran
+            filas = ((numero, fila) for numero, fila in enumerate(lector, start=1)
+                     if numero > estadisticas["retomada_desde"] and any(fila))
+
+            lote, grupos, rechazados = [], [], []
+            lineas_en_lote = 0
+            for ultima_fila, grupo in _agrupar_asientos(filas, columnas):
+                try:
+                    lote.append(_convertir_asiento(grupo, columnas))
+                    grupos.append(grupo)
+                except ValueError as e:
+                    rechazados.append((grupo, str(e)))
+                lineas_en_lote += len(grupo)
+                if lineas_en_lote >= lineas_por_lote:
+                    confirmar_lote(lote, grupos, rechazados, ultima_fila)
+                    lote, grupos, rechazados = [], [], []
+                    lineas_en_lote = 0
+            if lineas_en_lote:
+                confirmar_lote(lote, grupos, rechazados, ultima_fila)
+    finally:
+        if archivo_rechazos is not None:
+            archivo_rechazos.close()
+
+    # Los saldos acumulados de las líneas y los cierres de los meses
+    # terminados se calculan una sola vez al final, no en cada lote
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        actualizar_saldos_pendientes(conn)
+        cerrar_meses_terminados(conn)
+        _guardar_punto_control(cursor, huella, ruta, estadisticas, completa=True)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    _actualizar_ritmo(estadisticas, inicio)
+    return estadisticas
@@ -0,0 +1,267 @@
+"""
+Instrumentación opcional para saber en qué se va el tiempo de un reporte.
+
+Mientras está activa se registran:
+  - las sentencias SQL de las conexiones de base_datos, agrupadas por forma
+    (la sentencia con los literales reemplazados por ?): cantidad de
+    ejecuciones, tiempo total y máximo. El tiempo de una sentencia incluye
+    el de leer sus filas, que en SQLite es cuando se hace la mayor parte
+    del trabajo.
+  - las fases de los generadores de PDF (consulta, armado de tablas,
+    doc.build...), con su tiempo total y el tiempo propio, sin contar el
+    de las fases anidadas.
+
+Desactivada (el estado inicial) no se registra nada: las funciones de este
+módulo retornan de inmediato y las conexiones no se envuelven.
+
+Uso:
+    import instrumentacion
+    instrumentacion.activar()
+    generar_pdf_libro_diario(...)
+    instrumentacion.volcar_json("perfil.json")
+
+También se activa con la variable de entorno CONTABILIDAD_PERFIL=archivo.json
+(las estadísticas se escriben en ese archivo al salir) o, desde la línea de
+comandos, con la opción --perfil.
+"""
+import atexit
+import json
+import os
+import re
+import sys
+import threading
+import time
+from functools import lru_cache, wraps
+
+_activa = False
+_bloqueo = threading.Lock()
+_hilo = threading.local()
+
+# {forma: [cantidad, segundos, máximo]}
+_consultas = {}
+# {ruta de la fase: [llamadas, segundos, segundos propios]}
+_fases = {}
+
+
+def activa():
+    return _activa
+
+
+def activar():
+    """
+    Empieza a registrar. Las conexiones que ya estaban abiertas se reemplazan
+    por conexiones medidas la próxima vez que cada hilo pida la suya.
+    """
+    global _activa
+    _activa = True
+
+
+def desactivar():
+    global _activa
+    _activa = False
+
+
+def reiniciar():
+    """
+    Descarta las estadísticas acumuladas.
+    """
+    with _bloqueo:
+        _consultas.clear()
+        _fases.clear()
+
+
+_COMENTARIOS = re.compile(r"--[^\n]*")
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTAS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ESPACIOS = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def forma_consulta(sql):
+    """
+    Normaliza una sentencia para agrupar las que solo difieren en sus
+    valores: quita los comentarios, une los espacios y reemplaza literales
+    por ? y listas de ? por (...).
+    """
+    forma = _LITERALES.sub("?", _ESPACIOS.sub(" ", _COMENTARIOS.sub("", sql)).strip())
+    return _LISTAS.sub("(...)", forma)
+
+
+def registrar_consulta(sql, segundos):
+    """
+    Suma una ejecución de la sentencia a las estadísticas.
+    """
+    forma = forma_consulta(sql)
+    with _bloqueo:
+        datos = _consultas.get(forma)
+        if datos is None:
+            _consultas[forma] = [1, segundos, segundos]
+        else:
+            datos[0] += 1
+            datos[1] += segundos
+            if segundos > datos[2]:
+                datos[2] = segundos
+
+
+class _FaseNula:
+    """
+    Contexto que no hace nada; es lo que retorna fase() si no está activa.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        return False
+
+
+_NULA = _FaseNula()
+
+
+class _Fase:
+    """
+    Mide una fase anidada dentro de las fases abiertas del mismo hilo.
+    """
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        pila = getattr(_hilo, "pila", None)
+        if pila is None:
+            pila = _hilo.pila = []
+        self.ruta = f"{pila[-1].ruta}/{self.nombre}" if pila else self.nombre
+        self.anidado = 0.0
+        pila.append(self)
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excepcion):
+        segundos = time.perf_counter() - self.inicio
+        pila = _hilo.pila
+        pila.pop()
+        if pila:
+            pila[-1].anidado += segundos
+        with _bloqueo:
+            datos = _fases.get(self.ruta)
+            if datos is None:
+                _fases[self.ruta] = [1, segundos, segundos - self.anidado]
+            else:
+                datos[0] += 1
+                datos[1] += segundos
+                datos[2] += segundos - self.anidado
+        return False
+
+
+def fase(nombre):
+    """
+    Retorna un contexto (with) que mide el tiempo de la fase. Las fases
+    abiertas dentro de otra se registran como "externa/interna".
+    """
+    if not _activa:
+        return _NULA
+    return _Fase(nombre)
+
+
+def medida(nombre):
+    """
+    Decorador que mide cada llamada de la función como una fase.
+    """
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not _activa:
+                return funcion(*args, **kwargs)
+            with _Fase(nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def medir_iterador(iterable, nombre):
+    """
+    Retorna el iterable con el tiempo de cada paso contado en la fase
+    indicada. Sirve para los generadores que reportlab consume dentro de
+    doc.build, cuyo trabajo ocurre intercalado con el dibujo de las páginas.
+    Si la instrumentación no está activa retorna el mismo iterable.
+    """
+    if not _activa:
+        return iterable
+    return _iterar_midiendo(iter(iterable), nombre)
+
+
+def _iterar_midiendo(iterador, nombre):
+    while True:
+        with _Fase(nombre):
+            try:
+                elemento = next(iterador)
+            except StopIteration:
+                return
+        yield elemento
+
+
+def estadisticas():
+    """
+    Retorna las estadísticas acumuladas:
+      - consultas: [{forma, cantidad, total_ms, promedio_ms, maximo_ms}], de mayor a menor total
+      - fases: [{fase, llamadas, total_ms, propio_ms}], en orden de ruta
+    """
+    with _bloqueo:
+        consultas = [
+            {
+                "forma": forma,
+                "cantidad": cantidad,
+                "total_ms": round(segundos * 1000, 3),
+                "promedio_ms": round(segundos * 1000 / cantidad, 4),
+                "maximo_ms": round(maximo * 1000, 3),
+            }
+            for forma, (cantidad, segundos, maximo) in _consultas.items()
+        ]
+        fases = [
+            {
+                "fase": ruta,
+                "llamadas": llamadas,
+                "total_ms": round(segundos * 1000, 3),
+                "propio_ms": round(propio * 1000, 3),
+            }
+            for ruta, (llamadas, segundos, propio) in _fases.items()
+        ]
+    consultas.sort(key=lambda c: c["total_ms"], reverse=True)
+    fases.sort(key=lambda f: f["fase"])
+    return {"consultas": consultas, "fases": fases}
+
+
+def volcar_json(ruta):
+    """
+    Escribe las estadísticas en un archivo JSON.
+    """
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        json.dump(estadisticas(), archivo, indent=2, ensure_ascii=False)
+
+
+def volcar_log(destino=None):
+    """
+    Escribe las estadísticas como líneas de texto, una por fase o consulta,
+    en destino (por defecto la salida de errores).
+    """
+    destino = destino or sys.stderr
+    datos = estadisticas()
+    for f in datos["fases"]:
+        print(f"fase {f['fase']} llamadas={f['llamadas']} total_ms={f['total_ms']:.1f} "
+              f"propio_ms={f['propio_ms']:.1f}", file=destino)
+    for c in datos["consultas"]:
+        print(f"sql cantidad={c['cantidad']} total_ms={c['total_ms']:.1f} promedio_ms={c['promedio_ms']:.3f} "
+              f"maximo_ms={c['maximo_ms']:.1f} {c['forma']}", file=destino)
+
+
+def activar_con_volcado(ruta):
+    """
+    Activa la instrumentación y escribe las estadísticas en ruta (JSON) al
+    terminar el programa.
+    """
+    activar()
+    atexit.register(volcar_json, ruta)
+
+
+if os.environ.get("CONTABILIDAD_PERFIL"):
+    activar_con_volcado(os.environ["CONTABILIDAD_PERFIL"])
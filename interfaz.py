@@ -1,14 +1,256 @@
+import os
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QPushButton, QVBoxLayout, QWidget,
     QLineEdit, QDialog, QMessageBox, QLabel, QHBoxLayout, QDateEdit, 
-    QInputDialog, QStackedWidget, QTableWidget, QTableWidgetItem, QHeaderView
+    QInputDialog, QStackedWidget, QTableWidget, QTableWidgetItem, QHeaderView, QTableView,
+    QProgressBar, QCheckBox, QCompleter, QFileDialog
 )
-from PyQt5.QtCore import QDate, Qt
+from PyQt5.QtCore import QAbstractTableModel, QDate, QModelIndex, QStringListModel, Qt
 from PyQt5.QtGui import QFont, QIcon, QPixmap
 from logica import (
-    registrar_transaccion, obtener_libro_diario, verificar_balance,
+    registrar_transaccion, contar_transacciones, obtener_lineas_libro_diario, LINEAS_POR_PAGINA, verificar_balance,
+    buscar_transacciones, RESULTADOS_POR_PAGINA, IndiceCuentas, obtener_nombres_cuentas, validar_transaccion,
     inicializar_base_datos, obtener_libro_mayor, generar_pdf_libro_diario, generar_pdf_libro_mayor, generar_pdf_balance_sumasy_saldos
 )
+from tareas import AdministradorTareas
+
+
+def _leer_pagina_libro_diario(despues_de):
+    """
+    Lee una página del libro diario y la deja lista para la tabla.
+    Corre en un hilo de trabajo. Retorna (filas, última clave, cantidad de líneas).
+    """
+    lineas = obtener_lineas_libro_diario(despues_de)
+    filas = []
+    for linea in lineas:
+        monto = f"{linea['monto']:.2f}"
+        debe, haber = (monto, "") if linea["tipo"] == "Debe" else ("", monto)
+        filas.append((linea["fecha"], linea["cuenta"], debe, haber, linea["descripcion"]))
+    return filas, (lineas[-1]["clave"] if lineas else despues_de), len(lineas)
+
+
+def conectar_autocompletado(campo, indice):
+    """
+    Agrega al campo un desplegable con las cuentas que sugiere el índice para
+    lo que se va escribiendo. Las sugerencias se calculan en memoria en cada
+    tecla; el completador no vuelve a filtrarlas para no perder las que
+    vienen de corregir errores de tipeo.
+    """
+    modelo = QStringListModel(campo)
+    completador = QCompleter(modelo, campo)
+    completador.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+    completador.setCaseSensitivity(Qt.CaseInsensitive)
+    campo.setCompleter(completador)
+
+    def sugerir(texto):
+        modelo.setStringList(indice.sugerir(texto))
+        if modelo.rowCount():
+            completador.complete()
+        else:
+            completador.popup().hide()
+
+    campo.textEdited.connect(sugerir)
+    return completador
+
+
+def _buscar_pagina(texto, desde, hasta, cuenta, despues_de):
+    """
+    Busca una página de transacciones y la deja lista para la tabla.
+    Corre en un hilo de trabajo. Retorna (filas, última clave, cantidad de resultados).
+    """
+    resultados = buscar_transacciones(texto, desde, hasta, cuenta, despues_de)
+    filas = []
+    for resultado in resultados:
+        debe = "\n".join(f"{cuenta}: {monto:.2f}"
+                         for cuenta, monto in zip(resultado["cuentas_debe"], resultado["montos_debe"]))
+        haber = "\n".join(f"{cuenta}: {monto:.2f}"
+                          for cuenta, monto in zip(resultado["cuentas_haber"], resultado["montos_haber"]))
+        filas.append((resultado["fecha"], resultado["descripcion"], debe, haber))
+    return filas, (resultados[-1]["clave"] if resultados else despues_de), len(resultados)
+
+
+def _registrar_transaccion_del_formulario(fecha, cuentas_debe, montos_debe, cuentas_haber, montos_haber,
+                                         descripcion):
+    """
+    Valida y registra la transacción del formulario. Corre en un hilo de
+    trabajo; retorna None si se registró, o el mensaje con el problema.
+    """
+    error = validar_transaccion(fecha, cuentas_debe, montos_debe, cuentas_haber, montos_haber)
+    if error:
+        return error
+    registrar_transaccion(fecha, cuentas_debe, montos_debe, cuentas_haber, montos_haber, descripcion)
+    return None
+
+
+def _pdf_libro_diario_del_periodo(nombre_empresa, tasa_dolar, fecha_inicio, fecha_fin, progreso=None,
+                                  ruta_salida=None):
+    """
+    Genera el PDF del libro diario si el período tiene transacciones.
+    Corre en un hilo de trabajo; retorna None si no hay nada que imprimir.
+    """
+    if not contar_transacciones(fecha_inicio, fecha_fin):
+        return None
+    return generar_pdf_libro_diario(nombre_empresa, None, tasa_dolar, fecha_inicio, fecha_fin, progreso=progreso,
+                                    ruta_salida=ruta_salida)
+
+
+class ModeloLibroDiario(QAbstractTableModel):
+    """
+    Modelo del libro diario para un QTableView. Las líneas se piden a la base
+    de datos por páginas (obtener_lineas_libro_diario) solo cuando la vista
+    llega al final de lo ya cargado, y cada celda se arma en data() cuando la
+    vista la dibuja, así que abrir el libro no depende de su tamaño.
+    Las páginas se leen en un hilo de trabajo y se agregan al llegar.
+    """
+    COLUMNAS = ["Fecha", "Concepto", "Debe", "Haber", "Descripción"]
+
+    def __init__(self, tareas, parent=None):
+        super().__init__(parent)
+        self._tareas = tareas
+        self._filas = []  # (fecha, cuenta, debe, haber, descripcion) ya formateadas
+        self._ultima_clave = None
+        self._hay_mas = True
+        self._cargando = False
+        self.fetchMore()  # Primera página, para que la tabla se llene al abrirse
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._filas)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNAS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return self._filas[index.row()][index.column()]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNAS[section]
+        return super().headerData(section, orientation, role)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._hay_mas
+
+    def fetchMore(self, parent=QModelIndex()):
+        # La vista puede volver a pedir mientras la página anterior aún se lee
+        if parent.isValid() or self._cargando:
+            return
+        self._cargando = True
+        self._tareas.iniciar(_leer_pagina_libro_diario, self._ultima_clave,
+                             al_terminar=self._agregar_pagina, al_fallar=self._fallo_pagina)
+
+    def _agregar_pagina(self, pagina):
+        filas, self._ultima_clave, cantidad = pagina
+        self._cargando = False
+        if cantidad < LINEAS_POR_PAGINA:
+            self._hay_mas = False
+        if not filas:
+            return
+        inicio = len(self._filas)
+        self.beginInsertRows(QModelIndex(), inicio, inicio + len(filas) - 1)
+        self._filas.extend(filas)
+        self.endInsertRows()
+
+    def _fallo_pagina(self, mensaje):
+        self._cargando = False
+        self._hay_mas = False
+        QMessageBox.critical(None, "Error", f"No se pudo leer el libro diario: {mensaje}")
+
+
+class PanelBusqueda(QWidget):
+    """
+    Búsqueda de transacciones por las palabras de su descripción, con filtro
+    opcional por cuenta y por rango de fechas. Los resultados llegan de a una
+    página, de la más a la menos relevante; "Más resultados" pide la siguiente.
+    """
+    COLUMNAS = ["Fecha", "Descripción", "Debe", "Haber"]
+
+    def __init__(self, tareas, indice_cuentas=None, parent=None):
+        super().__init__(parent)
+        self._tareas = tareas
+        self._filtros = None
+        self._ultima_clave = None
+        layout = QVBoxLayout(self)
+
+        fila_texto = QHBoxLayout()
+        self.input_texto = QLineEdit()
+        self.input_texto.setPlaceholderText("Buscar en las descripciones")
+        self.input_texto.returnPressed.connect(self.buscar)
+        fila_texto.addWidget(self.input_texto, 3)
+        self.input_cuenta = QLineEdit()
+        self.input_cuenta.setPlaceholderText("Cuenta (opcional)")
+        self.input_cuenta.returnPressed.connect(self.buscar)
+        if indice_cuentas is not None:
+            conectar_autocompletado(self.input_cuenta, indice_cuentas)
+        fila_texto.addWidget(self.input_cuenta, 2)
+        self.btn_buscar = QPushButton("Buscar")
+        self.btn_buscar.clicked.connect(self.buscar)
+        fila_texto.addWidget(self.btn_buscar)
+        layout.addLayout(fila_texto)
+
+        fila_fechas = QHBoxLayout()
+        self.check_fechas = QCheckBox("Entre fechas")
+        fila_fechas.addWidget(self.check_fechas)
+        self.input_desde = QDateEdit(QDate.currentDate().addYears(-1))
+        self.input_hasta = QDateEdit(QDate.currentDate())
+        for campo in (self.input_desde, self.input_hasta):
+            campo.setCalendarPopup(True)
+            campo.setDisplayFormat("yyyy-MM-dd")
+            campo.setEnabled(False)
+            self.check_fechas.toggled.connect(campo.setEnabled)
+            fila_fechas.addWidget(campo)
+        fila_fechas.addStretch()
+        layout.addLayout(fila_fechas)
+
+        self.tabla = QTableWidget(0, len(self.COLUMNAS))
+        self.tabla.setHorizontalHeaderLabels(self.COLUMNAS)
+        self.tabla.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.tabla.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.tabla)
+
+        self.btn_mas = QPushButton("Más resultados")
+        self.btn_mas.clicked.connect(self._pedir_pagina)
+        self.btn_mas.setVisible(False)
+        layout.addWidget(self.btn_mas)
+
+    def buscar(self):
+        texto = self.input_texto.text().strip()
+        if not texto:
+            return
+        desde = hasta = None
+        if self.check_fechas.isChecked():
+            desde = self.input_desde.date().toString("yyyy-MM-dd")
+            hasta = self.input_hasta.date().toString("yyyy-MM-dd")
+        self._filtros = (texto, desde, hasta, self.input_cuenta.text().strip() or None)
+        self._ultima_clave = None
+        self.tabla.setRowCount(0)
+        self._pedir_pagina()
+
+    def _pedir_pagina(self):
+        self.btn_buscar.setEnabled(False)
+        self.btn_mas.setEnabled(False)
+        self._tareas.iniciar(_buscar_pagina, *self._filtros, self._ultima_clave,
+                             al_terminar=self._agregar_pagina, al_fallar=self._fallo_busqueda)
+
+    def _agregar_pagina(self, pagina):
+        filas, self._ultima_clave, cantidad = pagina
+        self.btn_buscar.setEnabled(True)
+        self.btn_mas.setEnabled(True)
+        self.btn_mas.setVisible(cantidad == RESULTADOS_POR_PAGINA)
+        inicio = self.tabla.rowCount()
+        self.tabla.setRowCount(inicio + len(filas))
+        for i, fila in enumerate(filas, start=inicio):
+            for columna, valor in enumerate(fila):
+                self.tabla.setItem(i, columna, QTableWidgetItem(valor))
+        self.tabla.resizeRowsToContents()
+        if not inicio and not filas:
+            QMessageBox.information(self, "Búsqueda", "No se encontraron transacciones.")
+
+    def _fallo_busqueda(self, mensaje):
+        self.btn_buscar.setEnabled(True)
+        self.btn_mas.setEnabled(True)
+        QMessageBox.critical(self, "Error", f"No se pudo hacer la búsqueda: {mensaje}")
 
 
 class VentanaPrincipal(QMainWindow):
@@ -18,6 +260,15 @@ class VentanaPrincipal(QMainWindow):
         self.setGeometry(100, 100, 800, 600)
         self.setWindowIcon(QIcon('imagen/icono.png'))
 
+        # Los reportes y escrituras corren en hilos de trabajo para no congelar la ventana
+        self.tareas = AdministradorTareas(self)
+
+        # Archivos que están escribiendo los reportes en curso
+        self.reportes_en_curso = set()
+
+        # Cuentas conocidas para autocompletar; se cargan con cargar_indice_cuentas
+        self.indice_cuentas = IndiceCuentas()
+
         # Estilos CSS para la interfaz
         self.setStyleSheet("""
             QMainWindow {
@@ -84,6 +335,10 @@ class VentanaPrincipal(QMainWindow):
         btn_ver_libro_mayor.clicked.connect(self.ver_libro_mayor)
         barra_lateral.addWidget(btn_ver_libro_mayor)
 
+        btn_buscar = QPushButton("Buscar Transacciones", self)
+        btn_buscar.clicked.connect(self.ver_busqueda)
+        barra_lateral.addWidget(btn_buscar)
+
         btn_generar_pdf = QPushButton("Generar PDF", self)
         btn_generar_pdf.clicked.connect(self.abrir_ventana_generar_pdf)
         barra_lateral.addWidget(btn_generar_pdf)
@@ -107,6 +362,78 @@ class VentanaPrincipal(QMainWindow):
         contenedor_principal.setLayout(layout_principal)
         self.setCentralWidget(contenedor_principal)
 
+    def closeEvent(self, event):
+        """Cancela los reportes en curso y espera a que terminen antes de cerrar."""
+        self.tareas.cancelar_todas()
+        self.tareas.esperar()
+        super().closeEvent(event)
+
+    def iniciar_reporte(self, titulo, nombre_sugerido, funcion, *args, **kwargs):
+        """
+        Genera un reporte en segundo plano. Mientras corre, la barra de estado
+        muestra su avance y un botón para cancelarlo; al terminar se informa
+        la ruta del PDF. Se puede seguir usando la ventana mientras tanto.
+
+        Antes de empezar se pide dónde guardar el PDF. Como pueden correr
+        varios reportes a la vez, no se permite que dos escriban el mismo archivo.
+        """
+        ruta, _ = QFileDialog.getSaveFileName(self, f"Guardar {titulo}", nombre_sugerido, "PDF (*.pdf)")
+        if not ruta:
+            return None
+        ruta = os.path.abspath(ruta)
+        if ruta in self.reportes_en_curso:
+            QMessageBox.warning(self, "Error", f"Ya se está generando un reporte en {ruta}.")
+            return None
+        self.reportes_en_curso.add(ruta)
+
+        indicador = QWidget()
+        layout = QHBoxLayout(indicador)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(QLabel(titulo))
+        barra = QProgressBar()
+        barra.setRange(0, 0)  # Indeterminada hasta el primer aviso de progreso
+        barra.setMaximumWidth(200)
+        layout.addWidget(barra)
+        btn_cancelar = QPushButton("Cancelar")
+        btn_cancelar.setStyleSheet("font-size: 12px; padding: 2px 8px;")
+        layout.addWidget(btn_cancelar)
+        self.statusBar().addPermanentWidget(indicador)
+
+        def al_progresar(avance, total):
+            if total:
+                barra.setRange(0, total)
+                barra.setValue(min(avance, total))
+
+        def al_terminar(pdf_path):
+            if pdf_path is None:
+                QMessageBox.warning(self, "Error", "No hay transacciones registradas en el rango de fechas seleccionado.")
+            else:
+                QMessageBox.information(self, "Éxito", f"PDF generado correctamente: {pdf_path}")
+
+        def al_fallar(mensaje):
+            QMessageBox.critical(self, "Error", f"No se pudo generar el PDF: {mensaje}")
+
+        tarea = self.tareas.iniciar(funcion, *args, al_terminar=al_terminar, al_fallar=al_fallar,
+                                    con_progreso=True, ruta_salida=ruta, **kwargs)
+        tarea.senales.progreso.connect(al_progresar)
+        tarea.senales.cancelada.connect(lambda: self.statusBar().showMessage(f"{titulo}: cancelado", 5000))
+        tarea.senales.terminada.connect(lambda: (self.statusBar().removeWidget(indicador), indicador.deleteLater(),
+                                                 self.reportes_en_curso.discard(ruta)))
+        btn_cancelar.clicked.connect(tarea.cancelar)
+        btn_cancelar.clicked.connect(lambda: btn_cancelar.setEnabled(False))
+        return tarea
+
+    def cargar_indice_cuentas(self):
+        """
+        Carga en segundo plano los nombres de las cuentas existentes en el
+        índice de autocompletado. Se llama una vez al iniciar; después el
+        índice se mantiene al día con las cuentas de cada asiento registrado.
+        """
+        self.tareas.iniciar(obtener_nombres_cuentas,
+                            al_terminar=lambda nombres: self.indice_cuentas.agregar(*nombres),
+                            al_fallar=lambda mensaje: self.statusBar().showMessage(
+                                f"No se pudieron cargar las cuentas para autocompletar: {mensaje}", 10000))
+
     def abrir_formulario_transaccion(self):
         # Limpiar el área principal eliminando widgets existentes
         while self.area_principal.count():
@@ -163,6 +490,7 @@ class VentanaPrincipal(QMainWindow):
         layout = QHBoxLayout()
         cuenta = QLineEdit()
         cuenta.setPlaceholderText("Cuenta (Debe)")
+        conectar_autocompletado(cuenta, self.indice_cuentas)
         monto = QLineEdit()
         monto.setPlaceholderText("Monto (Debe)")
         self.campos_debe.append((cuenta, monto))
@@ -175,6 +503,7 @@ class VentanaPrincipal(QMainWindow):
         layout = QHBoxLayout()
         cuenta = QLineEdit()
         cuenta.setPlaceholderText("Cuenta (Haber)")
+        conectar_autocompletado(cuenta, self.indice_cuentas)
         monto = QLineEdit()
         monto.setPlaceholderText("Monto (Haber)")
         self.campos_haber.append((cuenta, monto))
@@ -186,19 +515,60 @@ class VentanaPrincipal(QMainWindow):
         """Guarda la transacción en la base de datos."""
         try:
             fecha = self.input_fecha.date().toString("yyyy-MM-dd")
-            cuentas_debe = [campo[0].text() for campo in self.campos_debe if campo[0].text()]
+            cuentas_debe = [campo[0].text().strip() for campo in self.campos_debe if campo[0].text().strip()]
             montos_debe = [float(campo[1].text()) for campo in self.campos_debe if campo[1].text()]
-            cuentas_haber = [campo[0].text() for campo in self.campos_haber if campo[0].text()]
+            cuentas_haber = [campo[0].text().strip() for campo in self.campos_haber if campo[0].text().strip()]
             montos_haber = [float(campo[1].text()) for campo in self.campos_haber if campo[1].text()]
             descripcion = self.input_descripcion.text()
+        except ValueError:
+            QMessageBox.warning(self, "Error", "Debe ingresar valores numéricos válidos.")
+            return
+
+        # Una cuenta nueva parecida a una existente suele ser un error de tipeo:
+        # se pide confirmación antes de crearla
+        if len(self.indice_cuentas):
+            avisos = []
+            for cuenta in dict.fromkeys(cuentas_debe + cuentas_haber):
+                if cuenta not in self.indice_cuentas:
+                    parecidas = self.indice_cuentas.parecidas(cuenta)
+                    if parecidas:
+                        avisos.append(f"«{cuenta}» (¿quiso decir {', '.join(f'«{p}»' for p in parecidas)}?)")
+            if avisos and QMessageBox.question(
+                    self, "Cuentas nuevas",
+                    "Se crearán estas cuentas nuevas, parecidas a cuentas existentes:\n\n"
+                    + "\n".join(avisos) + "\n\n¿Desea continuar?") != QMessageBox.Yes:
+                return
+
+        # Se registra en un hilo de trabajo; el botón queda desactivado para no guardar dos veces
+        boton = self.sender()
+        if boton is not None:
+            boton.setEnabled(False)
+
+        # Mientras tanto se puede cambiar de vista, y el formulario se destruye:
+        # al terminar solo se toca si sigue a la vista
+        formulario = self.area_principal.currentWidget()
 
-            if registrar_transaccion(fecha, cuentas_debe, montos_debe, cuentas_haber, montos_haber, descripcion):
+        def formulario_abierto():
+            return self.area_principal.currentWidget() is formulario
+
+        def al_terminar(error):
+            if error is None:
+                self.indice_cuentas.agregar(*cuentas_debe, *cuentas_haber)
                 QMessageBox.information(self, "Éxito", "Transacción registrada con éxito.")
-                self.abrir_formulario_transaccion()  # Limpiar el formulario
+                if formulario_abierto():
+                    self.abrir_formulario_transaccion()  # Limpiar el formulario
             else:
-                QMessageBox.warning(self, "Error", "Los montos de Debe y Haber no coinciden.")
-        except ValueError:
-            QMessageBox.warning(self, "Error", "Debe ingresar valores numéricos válidos.")
+                if boton is not None and formulario_abierto():
+                    boton.setEnabled(True)
+                QMessageBox.warning(self, "Error", error)
+
+        def al_fallar(mensaje):
+            if boton is not None and formulario_abierto():
+                boton.setEnabled(True)
+            QMessageBox.critical(self, "Error", f"No se pudo registrar la transacción: {mensaje}")
+
+        self.tareas.iniciar(_registrar_transaccion_del_formulario, fecha, cuentas_debe, montos_debe, cuentas_haber,
+                            montos_haber, descripcion, al_terminar=al_terminar, al_fallar=al_fallar)
 
     def ver_libro_diario(self):
         # Limpiar el área principal eliminando widgets existentes
@@ -207,18 +577,18 @@ class VentanaPrincipal(QMainWindow):
             self.area_principal.removeWidget(widget)
             widget.deleteLater()
 
-        # Obtener el libro diario
-        libro_diario = obtener_libro_diario()
-
-        # Crear la tabla para mostrar el libro diario
-        tabla = QTableWidget()
-        tabla.setColumnCount(5)  # Fecha, Concepto, Debe, Haber, Descripción
-        tabla.setHorizontalHeaderLabels(["Fecha", "Concepto", "Debe", "Haber", "Descripción"])
+        # La tabla lee el libro diario por páginas a medida que se desplaza
+        tabla = QTableView()
+        tabla.setModel(ModeloLibroDiario(self.tareas, tabla))
         tabla.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        # Alto fijo de fila: ajustarlo al contenido obligaría a medir todas las filas
+        tabla.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        tabla.verticalHeader().setDefaultSectionSize(36)
+        tabla.setWordWrap(False)
 
         # Estilos para la tabla (manteniendo el estilo anterior)
         tabla.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 font-size: 14px;
                 border: 1px solid #ddd;
             }
@@ -228,48 +598,27 @@ class VentanaPrincipal(QMainWindow):
                 padding: 8px;
                 font-weight: bold;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 8px;
             }
         """)
 
-        # Llenar la tabla con los datos del libro diario
-        for transaccion in libro_diario:
-            fecha = transaccion["fecha"]
-            descripcion = transaccion["descripcion"]
-            cuentas_debe = transaccion["cuentas_debe"]
-            montos_debe = transaccion["montos_debe"]
-            cuentas_haber = transaccion["cuentas_haber"]
-            montos_haber = transaccion["montos_haber"]
-
-            # Agregar filas para las cuentas Debe
-            for cuenta, monto in zip(cuentas_debe, montos_debe):
-                fila = tabla.rowCount()
-                tabla.insertRow(fila)
-                tabla.setItem(fila, 0, QTableWidgetItem(fecha))
-                tabla.setItem(fila, 1, QTableWidgetItem(cuenta))
-                tabla.setItem(fila, 2, QTableWidgetItem(f"{monto:.2f}"))
-                tabla.setItem(fila, 3, QTableWidgetItem(""))  # Haber en blanco
-                tabla.setItem(fila, 4, QTableWidgetItem(descripcion))
-
-            # Agregar filas para las cuentas Haber
-            for cuenta, monto in zip(cuentas_haber, montos_haber):
-                fila = tabla.rowCount()
-                tabla.insertRow(fila)
-                tabla.setItem(fila, 0, QTableWidgetItem(fecha))
-                tabla.setItem(fila, 1, QTableWidgetItem(cuenta))
-                tabla.setItem(fila, 2, QTableWidgetItem(""))  # Debe en blanco
-                tabla.setItem(fila, 3, QTableWidgetItem(f"{monto:.2f}"))
-                tabla.setItem(fila, 4, QTableWidgetItem(descripcion))
-
-        # Ajustar el tamaño de las filas y columnas
-        tabla.resizeRowsToContents()
-        tabla.resizeColumnsToContents()
-
         # Agregar la tabla al área principal
         self.area_principal.addWidget(tabla)
         self.area_principal.setCurrentWidget(tabla)
 
+    def ver_busqueda(self):
+        # Limpiar el área principal eliminando widgets existentes
+        while self.area_principal.count():
+            widget = self.area_principal.widget(0)
+            self.area_principal.removeWidget(widget)
+            widget.deleteLater()
+
+        panel = PanelBusqueda(self.tareas, self.indice_cuentas)
+        self.area_principal.addWidget(panel)
+        self.area_principal.setCurrentWidget(panel)
+        panel.input_texto.setFocus()
+
     def ver_libro_mayor(self):
         # Limpiar el área principal eliminando widgets existentes
         while self.area_principal.count():
@@ -361,14 +710,9 @@ class VentanaPrincipal(QMainWindow):
         # Obtener la fecha de emisión
         fecha_emision = QDate.currentDate().toString("yyyy-MM-dd")
 
-        # Obtener el libro mayor
-        libro_mayor = obtener_libro_mayor()
-
-        try:
-            pdf_path = generar_pdf_libro_mayor(nombre_empresa, libro_mayor, tasa_dolar, fecha_emision)
-            QMessageBox.information(self, "Éxito", f"PDF generado correctamente: {pdf_path}")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"No se pudo generar el PDF: {str(e)}")
+        # El generador lee los movimientos por su cuenta, no necesita el libro mayor
+        self.iniciar_reporte("Libro Mayor", f"libro_mayor_{fecha_emision}.pdf", generar_pdf_libro_mayor,
+                             nombre_empresa, None, tasa_dolar, fecha_emision)
 
     def generar_pdf_libro_diario(self, ventana_opciones):
         """
@@ -425,16 +769,9 @@ class VentanaPrincipal(QMainWindow):
                 QMessageBox.warning(self, "Error", "La fecha de inicio debe ser menor o igual a la fecha de fin.")
                 return
 
-            libro_diario = obtener_libro_diario(fecha_inicio, fecha_fin)
-            if not libro_diario:
-                QMessageBox.warning(self, "Error", "No hay transacciones registradas en el rango de fechas seleccionado.")
-                return
-
-            try:
-                pdf_path = generar_pdf_libro_diario(nombre_empresa, libro_diario, tasa_dolar, fecha_inicio, fecha_fin)
-                QMessageBox.information(self, "Éxito", f"PDF generado correctamente: {pdf_path}")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"No se pudo generar el PDF: {str(e)}")
+            self.iniciar_reporte("Libro Diario", f"libro_diario_{fecha_inicio}_{fecha_fin}.pdf",
+                                 _pdf_libro_diario_del_periodo,
+                                 nombre_empresa, tasa_dolar, fecha_inicio, fecha_fin)
     
     def generar_pdf_balance_sumasy_saldos(self):
         """Genera un PDF con el balance de saldos."""
@@ -487,11 +824,9 @@ class VentanaPrincipal(QMainWindow):
                 QMessageBox.warning(self, "Error", "La fecha de inicio debe ser menor o igual a la fecha de fin.")
                 return
 
-            try:
-                pdf_path = generar_pdf_balance_sumasy_saldos(nombre_empresa, tasa_dolar, fecha_inicio, fecha_fin)
-                QMessageBox.information(self, "Éxito", f"PDF generado correctamente: {pdf_path}")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"No se pudo generar el PDF: {str(e)}")
+            self.iniciar_reporte("Balance de Saldos", f"balance_sumasy_saldos_{fecha_inicio}_{fecha_fin}.pdf",
+                                 generar_pdf_balance_sumasy_saldos,
+                                 nombre_empresa, tasa_dolar, fecha_inicio, fecha_fin)
 
        
 
@@ -503,4 +838,5 @@ def iniciar_interfaz():
     app = QApplication([])
     ventana = VentanaPrincipal()
     ventana.show()
+    ventana.cargar_indice_cuentas()
     return app.exec_()
\ No newline at end of file
@@ -1,122 +1,320 @@
+import bisect
+import difflib
+import os
 import sqlite3
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle  # Se añade ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.enums import TA_CENTER, TA_LEFT  # Se importan ambas constantes de alineación
-from datetime import datetime
+import unicodedata
+from datetime import date, datetime, timedelta
+from itertools import chain
+from decimal import Decimal, ROUND_HALF_UP
+import instrumentacion
+from base_datos import aplicar_migraciones, configurar_ruta, obtener_conexion
+
+# reportlab, pypdf y el pool de procesos solo se importan dentro de las
+# funciones que generan PDF: registrar asientos o consultar saldos no debe
+# pagar el costo de cargarlos (ver benchmarks/arranque.py).
+
+def a_centimos(monto):
+    """
+    Convierte un monto en Bs (int, float, str o Decimal) a céntimos enteros,
+    redondeando al céntimo más cercano. Los float se toman por su representación
+    decimal, de modo que 0.1 equivale exactamente a 10 céntimos.
+    """
+    if isinstance(monto, bool):
+        raise TypeError("Monto no válido.")
+    if isinstance(monto, float):
+        monto = repr(monto)
+    valor = monto if isinstance(monto, Decimal) else Decimal(monto)
+    if not valor.is_finite():
+        raise ValueError("Monto no válido.")
+    return int((valor * 100).to_integral_value(rounding=ROUND_HALF_UP))
 
-DB_PATH = "contabilidad.db"
 
-def inicializar_base_datos():
+def a_bolivares(centimos):
     """
-    Crea las tablas necesarias si no existen.
+    Convierte céntimos enteros a un Decimal en Bs con dos decimales.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    return Decimal(centimos).scaleb(-2)
 
-    # Crear tabla transacciones
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS transacciones (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            fecha TEXT NOT NULL,
-            descripcion TEXT
-        )
-    """)
 
-    # Crear tabla detalles_transacciones
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS detalles_transacciones (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            transaccion_id INTEGER NOT NULL,
-            cuenta TEXT NOT NULL,
-            monto REAL NOT NULL,
-            tipo TEXT CHECK(tipo IN ('Debe', 'Haber')) NOT NULL,
-            FOREIGN KEY (transaccion_id) REFERENCES transacciones(id)
-        )
-    """)
+def _a_dolares(monto_bs, tasa_dolar):
+    """
+    Convierte un monto en Bs (Decimal) a USD con la tasa indicada.
+    """
+    tasa = Decimal(str(tasa_dolar))
+    return monto_bs / tasa if tasa != 0 else Decimal(0)
 
-    # Crear tabla referencias_cuentas
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS referencias_cuentas (
-            cuenta TEXT PRIMARY KEY,
-            numero_referencia INTEGER NOT NULL
-        )
-    """)
 
-    # Crear tabla para el libro mayor
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS libro_mayor (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cuenta TEXT UNIQUE NOT NULL,
-            saldo REAL NOT NULL DEFAULT 0,
-            fecha TEXT NOT NULL
-        )
-    """)
+class OperacionCancelada(Exception):
+    """
+    La lanza una función de progreso para detener un reporte en curso.
+    Los generadores de PDF la dejan pasar sin envolverla en otro error.
+    """
 
-    conn.commit()
-    conn.close()
 
+def inicializar_base_datos(conn=None):
+    """
+    Crea las tablas necesarias si no existen y aplica las migraciones pendientes.
+    Si el esquema ya está al día solo se consulta su versión.
+    """
+    aplicar_migraciones(conn or obtener_conexion())
 
-def obtener_numero_referencia(cuenta, conn=None):
+
+# Ids de las cuentas ya conocidas, por archivo de base de datos: {ruta: {nombre: id}}.
+# El id de una cuenta es también su número de referencia y nunca cambia, así
+# que solo se agregan entradas; si una escritura se revierte se descarta la
+# caché de ese archivo, porque los ids creados en ella ya no existen.
+_cache_referencias = {}
+
+# Nombres de cuenta por consulta al buscar los ids de las cuentas nuevas
+CUENTAS_POR_CONSULTA = 500
+
+# Parámetros por INSERT de varias filas en registrar_transacciones_lote,
+# dentro del límite de 999 variables de las versiones viejas de SQLite
+PARAMETROS_POR_INSERT = 999
+
+
+def _referencias_en_cache(conn):
     """
-    Obtiene el número de referencia único para una cuenta.
-    Si la cuenta no existe, se le asigna un nuevo número de referencia.
+    Retorna el diccionario de referencias del archivo de la conexión,
+    cargándolo completo la primera vez. Retorna None si la conexión no
+    tiene un archivo identificable (por ejemplo, en memoria).
+    """
+    ruta = getattr(conn, "ruta", None)
+    if ruta is None:
+        return None
+    cache = _cache_referencias.get(ruta)
+    if cache is None:
+        cache = dict(conn.execute("SELECT nombre, id FROM cuentas"))
+        cache = _cache_referencias.setdefault(ruta, cache)
+    return cache
+
+
+def invalidar_cache_referencias(conn=None):
+    """
+    Descarta las referencias en caché del archivo de la conexión,
+    o de todos los archivos si no se indica una conexión.
     """
-    cerrar_conexion = False
     if conn is None:
-        conn = sqlite3.connect(DB_PATH)
-        cerrar_conexion = True
+        _cache_referencias.clear()
+    else:
+        _cache_referencias.pop(getattr(conn, "ruta", None), None)
+
+
+def obtener_numero_referencia(cuenta, conn=None):
+    """
+    Obtiene el número de referencia único para una cuenta, que es su id en
+    la tabla cuentas. Si la cuenta no existe, se crea con un número nuevo.
+    Las cuentas conocidas se resuelven desde la caché sin consultar la base de datos.
+    """
+    confirmar = conn is None
+    conn = conn or obtener_conexion()
+
+    cache = _referencias_en_cache(conn)
+    if cache is not None:
+        numero_referencia = cache.get(cuenta)
+        if numero_referencia is not None:
+            return numero_referencia
 
     cursor = conn.cursor()
+    creadas = conn.total_changes
+    numero_referencia = _ids_cuentas(cursor, [cuenta])[cuenta]
+    if confirmar and conn.total_changes != creadas:
+        conn.commit()
+    return numero_referencia
 
-    # Verificar si la cuenta ya tiene un número de referencia
-    cursor.execute("""
-        SELECT numero_referencia FROM referencias_cuentas WHERE cuenta = ?
-    """, (cuenta,))
-    resultado = cursor.fetchone()
 
-    if resultado:
-        numero_referencia = resultado[0]
-    else:
-        # Obtener el último número de referencia asignado
-        cursor.execute("""
-            SELECT MAX(numero_referencia) FROM referencias_cuentas
-        """)
-        ultimo_numero = cursor.fetchone()[0] or 0
-        numero_referencia = ultimo_numero + 1
+def _ids_cuentas(cursor, nombres):
+    """
+    Retorna {nombre: id} de las cuentas indicadas, creando las que no
+    existen dentro de la transacción abierta en la conexión del cursor.
+    Todas las cuentas de un asiento o de un lote se resuelven con una sola
+    llamada: las conocidas salen de la caché y las demás se buscan juntas.
+    """
+    conn = cursor.connection
+    cache = _referencias_en_cache(conn)
+    ids = {}
+    faltantes = []
+    for nombre in nombres:
+        if nombre in ids:
+            continue
+        cuenta_id = cache.get(nombre) if cache is not None else None
+        ids[nombre] = cuenta_id
+        if cuenta_id is None:
+            faltantes.append(nombre)
+    if not faltantes:
+        return ids
+
+    # La secuencia AUTOINCREMENT asigna el id; OR IGNORE cubre el caso de que
+    # la cuenta ya exista o de que otro proceso la haya creado antes
+    cursor.executemany("INSERT OR IGNORE INTO cuentas (nombre) VALUES (?)", [(nombre,) for nombre in faltantes])
+    for inicio in range(0, len(faltantes), CUENTAS_POR_CONSULTA):
+        tramo = faltantes[inicio:inicio + CUENTAS_POR_CONSULTA]
+        cursor.execute(f"SELECT nombre, id FROM cuentas WHERE nombre IN ({', '.join('?' * len(tramo))})", tramo)
+        for nombre, cuenta_id in cursor.fetchall():
+            ids[nombre] = cuenta_id
+            if cache is not None:
+                cache[nombre] = cuenta_id
+    return ids
+
+
+def _id_cuenta_existente(conn, nombre):
+    """
+    Retorna el id de la cuenta, o None si no existe (sin crearla).
+    """
+    cache = _referencias_en_cache(conn)
+    if cache is not None and nombre in cache:
+        return cache[nombre]
+    fila = conn.execute("SELECT id FROM cuentas WHERE nombre = ?", (nombre,)).fetchone()
+    if fila is None:
+        return None
+    if cache is not None:
+        cache[nombre] = fila[0]
+    return fila[0]
+
+
+def _nombres_cuentas(cursor):
+    """
+    Retorna {id: nombre} de todas las cuentas, para pasar a nombres los
+    resultados de un reporte calculado por id.
+    """
+    cursor.execute("SELECT id, nombre FROM cuentas")
+    return dict(cursor.fetchall())
 
-        # Asignar el nuevo número de referencia a la cuenta
-        cursor.execute("""
-            INSERT INTO referencias_cuentas (cuenta, numero_referencia)
-            VALUES (?, ?)
-        """, (cuenta, numero_referencia))
-        if cerrar_conexion:
-            conn.commit()
 
-    if cerrar_conexion:
-        conn.close()
+def obtener_nombres_cuentas(conn=None):
+    """
+    Retorna los nombres de todas las cuentas registradas.
+    """
+    conn = conn or obtener_conexion()
+    return [nombre for (nombre,) in conn.execute("SELECT nombre FROM cuentas")]
 
-    return numero_referencia
+
+def _clave_cuenta(nombre):
+    """
+    Forma de comparar nombres de cuenta: sin mayúsculas, sin acentos y con
+    los espacios normalizados, para que "Caja  chica" y "caja chica" coincidan.
+    """
+    sin_acentos = unicodedata.normalize("NFKD", nombre.casefold())
+    return " ".join("".join(c for c in sin_acentos if not unicodedata.combining(c)).split())
 
 
-def registrar_transaccion(fecha, cuentas_debe, montos_debe, cuentas_haber, montos_haber, descripcion):
+class IndiceCuentas:
     """
-    Registra una transacción en la base de datos y actualiza el libro mayor.
+    Nombres de cuenta en memoria, ordenados por su clave de comparación, para
+    sugerir cuentas mientras se escribe sin consultar la base de datos. Se
+    carga una vez con las cuentas existentes y se le agregan las nuevas a
+    medida que se registran asientos.
     """
-    if not cuentas_debe or not cuentas_haber or not montos_debe or not montos_haber:
-        return False
+    # Qué tan parecido debe ser un nombre para sugerirlo como corrección (0 a 1)
+    SIMILITUD_MINIMA = 0.75
+
+    def __init__(self, nombres=()):
+        self._claves = []
+        self._nombres = []
+        self._conocidos = set()
+        self.agregar(*nombres)
+
+    def __len__(self):
+        return len(self._nombres)
+
+    def __contains__(self, nombre):
+        return nombre in self._conocidos
+
+    def agregar(self, *nombres):
+        """
+        Agrega los nombres que aún no están, manteniendo el orden.
+        """
+        for nombre in nombres:
+            if nombre in self._conocidos:
+                continue
+            clave = _clave_cuenta(nombre)
+            posicion = bisect.bisect_right(self._claves, clave)
+            self._claves.insert(posicion, clave)
+            self._nombres.insert(posicion, nombre)
+            self._conocidos.add(nombre)
+
+    def parecidas(self, nombre, limite=3):
+        """
+        Retorna las cuentas existentes con la misma clave o un nombre muy
+        parecido al indicado, de la más a la menos parecida.
+        """
+        clave = _clave_cuenta(nombre)
+        claves = difflib.get_close_matches(clave, self._claves, n=limite, cutoff=self.SIMILITUD_MINIMA)
+        resultado = []
+        for encontrada in dict.fromkeys(claves):
+            posicion = bisect.bisect_left(self._claves, encontrada)
+            while posicion < len(self._claves) and self._claves[posicion] == encontrada:
+                if self._nombres[posicion] != nombre:
+                    resultado.append(self._nombres[posicion])
+                posicion += 1
+        return resultado[:limite]
+
+    def sugerir(self, texto, limite=10):
+        """
+        Retorna hasta `limite` cuentas para lo escrito: primero las que
+        empiezan así, buscadas por bisección en la lista ordenada, y si
+        faltan, las de nombre parecido (errores de tipeo).
+        """
+        clave = _clave_cuenta(texto)
+        if not clave:
+            return []
+        inicio = bisect.bisect_left(self._claves, clave)
+        sugerencias = []
+        for posicion in range(inicio, len(self._claves)):
+            if len(sugerencias) == limite or not self._claves[posicion].startswith(clave):
+                break
+            sugerencias.append(self._nombres[posicion])
+        if len(sugerencias) < limite:
+            for nombre in self.parecidas(texto, limite):
+                if nombre not in sugerencias and len(sugerencias) < limite:
+                    sugerencias.append(nombre)
+        return sugerencias
+
+
+def validar_transaccion(fecha, cuentas_debe, montos_debe, cuentas_haber, montos_haber):
+    """
+    Revisa una transacción con los montos en Bs, como la recibe
+    registrar_transaccion. Retorna un mensaje con el problema encontrado,
+    o None si se puede registrar.
+    """
+    try:
+        montos_debe = [a_centimos(monto) for monto in montos_debe]
+        montos_haber = [a_centimos(monto) for monto in montos_haber]
+    except (TypeError, ValueError, ArithmeticError):
+        return "Los montos no son válidos."
+    # Los totales se comparan exactos, en céntimos
+    return _validar_asiento(fecha, cuentas_debe, montos_debe, cuentas_haber, montos_haber)
 
-    total_debe = sum(montos_debe)
-    total_haber = sum(montos_haber)
 
-    # Verificar que los totales sean iguales
-    if total_debe != total_haber:
+def registrar_transaccion(fecha, cuentas_debe, montos_debe, cuentas_haber, montos_haber, descripcion, conn=None):
+    """
+    Registra una transacción en la base de datos y actualiza el libro mayor.
+    Los montos se indican en Bs y se guardan como céntimos enteros.
+    Retorna False sin registrar nada si la transacción no es válida
+    (validar_transaccion indica el motivo).
+    """
+    if validar_transaccion(fecha, cuentas_debe, montos_debe, cuentas_haber, montos_haber):
         return False
+    montos_debe = [a_centimos(monto) for monto in montos_debe]
+    montos_haber = [a_centimos(monto) for monto in montos_haber]
+
+    conn = conn or obtener_conexion()
+    try:
+        with conn:
+            _insertar_transaccion(conn.cursor(), fecha, cuentas_debe, montos_debe,
+                                  cuentas_haber, montos_haber, descripcion)
+            cerrar_meses_terminados(conn)
+    except BaseException:
+        invalidar_cache_referencias(conn)
+        raise
+    return True
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
 
+def _insertar_transaccion(cursor, fecha, cuentas_debe, montos_debe, cuentas_haber, montos_haber, descripcion):
+    """
+    Inserta una transacción ya validada y actualiza el libro mayor,
+    dentro de la transacción abierta en la conexión del cursor.
+    """
     # Insertar en transacciones
     cursor.execute("""
         INSERT INTO transacciones (fecha, descripcion)
@@ -124,165 +322,1024 @@ def registrar_transaccion(fecha, cuentas_debe, montos_debe, cuentas_haber, monto
     """, (fecha, descripcion))
     transaccion_id = cursor.lastrowid
 
-    # Insertar detalles de la transacción (Debe)
-    for cuenta, monto in zip(cuentas_debe, montos_debe):
-        numero_referencia = obtener_numero_referencia(cuenta, conn)
-        cursor.execute("""
-            INSERT INTO detalles_transacciones (transaccion_id, cuenta, monto, tipo)
-            VALUES (?, ?, ?, 'Debe')
-        """, (transaccion_id, cuenta, monto))
+    # Insertar detalles de la transacción (Debe y Haber); el saldo acumulado
+    # de cada línea lo calcula el disparador saldos_insertar
+    ids = _ids_cuentas(cursor, chain(cuentas_debe, cuentas_haber))
+    detalles = [(transaccion_id, ids[cuenta], monto, 'Debe') for cuenta, monto in zip(cuentas_debe, montos_debe)]
+    detalles += [(transaccion_id, ids[cuenta], monto, 'Haber') for cuenta, monto in zip(cuentas_haber, montos_haber)]
+    cursor.executemany("""
+        INSERT INTO detalles_transacciones (transaccion_id, cuenta_id, monto, tipo, fecha)
+        VALUES (?, ?, ?, ?, ?)
+    """, [detalle + (fecha,) for detalle in detalles])
+
+    # Saldo neto por cuenta: una cuenta repetida en el asiento se actualiza una sola vez
+    deltas = {}
+    for _, cuenta_id, monto, tipo in detalles:
+        deltas[cuenta_id] = deltas.get(cuenta_id, 0) + (monto if tipo == 'Debe' else -monto)
+
+    _actualizar_libro_mayor(cursor, deltas, dict.fromkeys(deltas, fecha))
+    _reabrir_periodos(cursor, fecha)
+
+
+def _actualizar_libro_mayor(cursor, deltas, fechas_apertura):
+    """
+    Suma a cada cuenta del libro mayor su variación neta ({cuenta_id: delta}).
+    Las cuentas que aún no existen se crean con la fecha indicada en fechas_apertura.
+    La suma ocurre dentro de SQLite, sin leer el saldo anterior, así que dos
+    procesos que registran a la vez no se pisan los saldos.
+    """
+    cursor.executemany("""
+        INSERT INTO libro_mayor (cuenta_id, saldo, fecha)
+        VALUES (?, ?, ?)
+        ON CONFLICT(cuenta_id) DO UPDATE SET saldo = saldo + excluded.saldo
+    """, [(cuenta_id, delta, fechas_apertura[cuenta_id]) for cuenta_id, delta in deltas.items()])
 
-        # Actualizar libro mayor (Cuenta Debe)
+
+def _marcar_saldos_pendientes(cursor, desde_por_cuenta):
+    """
+    Anota que los saldos de cada cuenta deben recalcularse desde la fecha
+    indicada ({cuenta_id: fecha}), conservando la fecha más antigua.
+    """
+    cursor.executemany("""
+        INSERT INTO saldos_pendientes (cuenta_id, desde) VALUES (?, ?)
+        ON CONFLICT(cuenta_id) DO UPDATE SET desde = MIN(desde, excluded.desde)
+    """, desde_por_cuenta.items())
+
+
+def actualizar_saldos_pendientes(conn=None):
+    """
+    Recalcula los saldos acumulados anotados en saldos_pendientes. Si no hay
+    ninguno solo hace una consulta. Las funciones que leen los saldos la
+    llaman antes; quien registra varios lotes dentro de su propia
+    transacción la llama al final. Retorna la cantidad de cuentas recalculadas.
+    """
+    conn = conn or obtener_conexion()
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM saldos_pendientes LIMIT 1")
+    if cursor.fetchone() is None:
+        return 0
+
+    transaccion_propia = not conn.in_transaction
+    try:
+        if transaccion_propia:
+            cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT cuenta_id, desde FROM saldos_pendientes")
+        pendientes = dict(cursor.fetchall())
+        _recalcular_saldos(cursor, pendientes)
+        cursor.execute("DELETE FROM saldos_pendientes")
+        if transaccion_propia:
+            conn.commit()
+    except BaseException:
+        if transaccion_propia:
+            conn.rollback()
+        raise
+    return len(pendientes)
+
+
+def _recalcular_saldos(cursor, desde_por_cuenta):
+    """
+    Recalcula el saldo acumulado de las líneas de cada cuenta con fecha igual
+    o posterior a la indicada ({cuenta_id: fecha}), partiendo del saldo de la
+    última línea anterior. Con fecha None se recalcula la cuenta completa.
+    """
+    for cuenta_id, desde in desde_por_cuenta.items():
+        desde = desde or ""
         cursor.execute("""
-            SELECT saldo FROM libro_mayor WHERE cuenta = ?
-        """, (cuenta,))
-        resultado = cursor.fetchone()
-
-        if resultado:
-            saldo_actual = resultado[0]
-            nuevo_saldo = saldo_actual + monto
-            cursor.execute("""
-                UPDATE libro_mayor SET saldo = ? WHERE cuenta = ?
-            """, (nuevo_saldo, cuenta))
-        else:
-            cursor.execute("""
-                INSERT INTO libro_mayor (cuenta, saldo, fecha)
-                VALUES (?, ?, ?)
-            """, (cuenta, monto, fecha))
-
-    # Insertar detalles de la transacción (Haber)
-    for cuenta, monto in zip(cuentas_haber, montos_haber):
-        numero_referencia = obtener_numero_referencia(cuenta, conn)
+            SELECT saldo FROM detalles_transacciones
+            WHERE cuenta_id = ? AND fecha < ?
+            ORDER BY fecha DESC, id DESC
+            LIMIT 1
+        """, (cuenta_id, desde))
+        anterior = cursor.fetchone()
         cursor.execute("""
-            INSERT INTO detalles_transacciones (transaccion_id, cuenta, monto, tipo)
-            VALUES (?, ?, ?, 'Haber')
-        """, (transaccion_id, cuenta, monto))
+            UPDATE detalles_transacciones SET saldo = acumulados.saldo
+            FROM (
+                SELECT id, ? + SUM(CASE WHEN tipo = 'Debe' THEN monto ELSE -monto END)
+                               OVER (ORDER BY fecha, id ROWS UNBOUNDED PRECEDING) AS saldo
+                FROM detalles_transacciones
+                WHERE cuenta_id = ? AND fecha >= ?
+            ) AS acumulados
+            WHERE detalles_transacciones.id = acumulados.id
+        """, (anterior[0] if anterior else 0, cuenta_id, desde))
+
+
+def _validar_asiento(fecha, cuentas_debe, montos_debe, cuentas_haber, montos_haber):
+    """
+    Revisa un asiento antes de registrarlo, con los montos ya en céntimos.
+    Retorna un mensaje con el problema encontrado, o None si el asiento es válido.
+    """
+    if not fecha:
+        return "La fecha es obligatoria."
+    if not cuentas_debe or not cuentas_haber or not montos_debe or not montos_haber:
+        return "El asiento debe tener al menos una cuenta en el Debe y una en el Haber."
+    if len(cuentas_debe) != len(montos_debe) or len(cuentas_haber) != len(montos_haber):
+        return "Cada cuenta debe tener su monto."
+    if any(not cuenta for cuenta in list(cuentas_debe) + list(cuentas_haber)):
+        return "Hay cuentas sin nombre."
+    if any(monto <= 0 for monto in list(montos_debe) + list(montos_haber)):
+        return "Los montos deben ser mayores que cero."
+    if sum(montos_debe) != sum(montos_haber):
+        return "Los montos de Debe y Haber no coinciden."
+    return None
+
+
+def _normalizar_asiento(asiento):
+    """
+    Convierte un asiento a la forma de diccionario usada por el libro diario.
+    Acepta un diccionario con las mismas claves que retorna obtener_libro_diario,
+    o una tupla con los argumentos de registrar_transaccion en el mismo orden.
+    """
+    if isinstance(asiento, dict):
+        return {
+            "fecha": asiento.get("fecha"),
+            "descripcion": asiento.get("descripcion", ""),
+            "cuentas_debe": list(asiento.get("cuentas_debe") or []),
+            "montos_debe": list(asiento.get("montos_debe") or []),
+            "cuentas_haber": list(asiento.get("cuentas_haber") or []),
+            "montos_haber": list(asiento.get("montos_haber") or []),
+        }
+    fecha, cuentas_debe, montos_debe, cuentas_haber, montos_haber, descripcion = asiento
+    return {
+        "fecha": fecha,
+        "descripcion": descripcion,
+        "cuentas_debe": list(cuentas_debe),
+        "montos_debe": list(montos_debe),
+        "cuentas_haber": list(cuentas_haber),
+        "montos_haber": list(montos_haber),
+    }
 
-        # Actualizar libro mayor (Cuenta Haber)
+
+def registrar_transacciones_lote(asientos, conn=None, omitir_invalidos=False):
+    """
+    Registra muchos asientos en una sola transacción de SQLite.
+    Los montos se indican en Bs, igual que en registrar_transaccion.
+
+    Primero se validan todos los asientos; si alguno tiene errores no se
+    registra ninguno, salvo con omitir_invalidos=True, en cuyo caso se
+    registran los válidos y los demás solo se informan. Los saldos del libro
+    mayor se acumulan en memoria y se actualizan una sola vez por cuenta.
+    Retorna un diccionario con:
+      - exito: True si se registraron los asientos
+      - registradas: cantidad de asientos registrados
+      - errores: lista de {"indice", "error"} con los asientos rechazados
+
+    Si conn ya tiene una transacción abierta, los asientos se escriben en
+    ella y quien la abrió decide cuándo confirmarla; si no, se confirma aquí.
+    En el primer caso el lote va en un SAVEPOINT: si falla, solo se deshace el
+    lote y lo que quien llama ya había escrito queda intacto. Además, los
+    saldos acumulados de las líneas quedan pendientes hasta que se llame a
+    actualizar_saldos_pendientes (o se lean).
+    Los meses terminados no se cierran aquí, para no rehacer los cierres en
+    cada lote de una importación: quien importa llama a
+    cerrar_meses_terminados al final.
+    """
+    lote = []
+    errores = []
+    for indice, asiento in enumerate(asientos):
+        try:
+            asiento = _normalizar_asiento(asiento)
+        except (TypeError, ValueError):
+            errores.append({"indice": indice, "error": "Formato de asiento no válido."})
+            continue
+        try:
+            asiento["montos_debe"] = [a_centimos(monto) for monto in asiento["montos_debe"]]
+            asiento["montos_haber"] = [a_centimos(monto) for monto in asiento["montos_haber"]]
+        except (TypeError, ValueError, ArithmeticError):
+            errores.append({"indice": indice, "error": "Los montos deben ser numéricos."})
+            continue
+        error = _validar_asiento(asiento["fecha"], asiento["cuentas_debe"], asiento["montos_debe"],
+                                 asiento["cuentas_haber"], asiento["montos_haber"])
+        if error:
+            errores.append({"indice": indice, "error": error})
+        else:
+            lote.append(asiento)
+
+    if (errores and not omitir_invalidos) or not lote:
+        return {"exito": not errores, "registradas": 0, "errores": errores}
+
+    conn = conn or obtener_conexion()
+    cursor = conn.cursor()
+    transaccion_propia = not conn.in_transaction
+    try:
+        # Se toma el bloqueo de escritura desde el inicio para reservar los ids
+        cursor.execute("BEGIN IMMEDIATE" if transaccion_propia else "SAVEPOINT lote")
         cursor.execute("""
-            SELECT saldo FROM libro_mayor WHERE cuenta = ?
-        """, (cuenta,))
-        resultado = cursor.fetchone()
-
-        if resultado:
-            saldo_actual = resultado[0]
-            nuevo_saldo = saldo_actual - monto
-            cursor.execute("""
-                UPDATE libro_mayor SET saldo = ? WHERE cuenta = ?
-            """, (nuevo_saldo, cuenta))
+            SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'transacciones'), 0),
+                       COALESCE((SELECT MAX(id) FROM transacciones), 0))
+        """)
+        ultimo_id = cursor.fetchone()[0]
+
+        # Una sola búsqueda para todas las cuentas distintas del lote
+        ids = _ids_cuentas(cursor, chain.from_iterable(
+            chain(asiento["cuentas_debe"], asiento["cuentas_haber"]) for asiento in lote))
+
+        filas_transacciones = []
+        filas_detalles = []
+        deltas = {}
+        fechas_apertura = {}
+        primeras_fechas = {}
+        for transaccion_id, asiento in enumerate(lote, start=ultimo_id + 1):
+            fecha = asiento["fecha"]
+            filas_transacciones.append((transaccion_id, fecha, asiento["descripcion"]))
+            for cuentas, montos, tipo, signo in (
+                (asiento["cuentas_debe"], asiento["montos_debe"], "Debe", 1),
+                (asiento["cuentas_haber"], asiento["montos_haber"], "Haber", -1),
+            ):
+                for cuenta, monto in zip(cuentas, montos):
+                    cuenta_id = ids[cuenta]
+                    filas_detalles.append((transaccion_id, cuenta_id, monto, tipo, fecha))
+                    deltas[cuenta_id] = deltas.get(cuenta_id, 0) + signo * monto
+                    fechas_apertura.setdefault(cuenta_id, fecha)
+                    if cuenta_id not in primeras_fechas or fecha < primeras_fechas[cuenta_id]:
+                        primeras_fechas[cuenta_id] = fecha
+
+        # El índice de búsqueda se llena al final en bloque, sin el disparador
+        cursor.execute("INSERT INTO busqueda_en_lote (activo) VALUES (1)")
+        _insertar_en_tramos(cursor, "INSERT INTO transacciones (id, fecha, descripcion) VALUES ",
+                            "(?, ?, ?)", filas_transacciones)
+        cursor.execute("DELETE FROM busqueda_en_lote")
+        # Las líneas entran con saldo 0 para no pasar por el disparador, que
+        # corregiría las líneas posteriores una vez por cada línea con fecha
+        # atrasada; los saldos se recalculan después una vez por cuenta
+        _insertar_en_tramos(cursor, """
+            INSERT INTO detalles_transacciones (transaccion_id, cuenta_id, monto, tipo, fecha, saldo) VALUES
+        """, "(?, ?, ?, ?, ?, 0)", filas_detalles)
+        _marcar_saldos_pendientes(cursor, primeras_fechas)
+
+        # Actualizar el libro mayor una vez por cuenta
+        _actualizar_libro_mayor(cursor, deltas, fechas_apertura)
+        _reabrir_periodos(cursor, min(asiento["fecha"] for asiento in lote))
+        cursor.executemany("""
+            INSERT INTO transacciones_fts (rowid, descripcion) VALUES (?, ?)
+        """, [(transaccion_id, descripcion) for transaccion_id, _, descripcion in filas_transacciones])
+
+        if transaccion_propia:
+            actualizar_saldos_pendientes(conn)
+            conn.commit()
         else:
-            cursor.execute("""
-                INSERT INTO libro_mayor (cuenta, saldo, fecha)
-                VALUES (?, ?, ?)
-            """, (cuenta, -monto, fecha))
+            cursor.execute("RELEASE lote")
+    except sqlite3.Error as e:
+        _deshacer_lote(conn, transaccion_propia)
+        return {"exito": False, "registradas": 0, "errores": [{"indice": None, "error": str(e)}]}
+    except BaseException:
+        _deshacer_lote(conn, transaccion_propia)
+        raise
 
-    conn.commit()
-    conn.close()
-    return True
+    return {"exito": True, "registradas": len(lote), "errores": errores}
 
 
-def obtener_libro_diario(fecha_inicio=None, fecha_fin=None):
+def _insertar_en_tramos(cursor, insert, fila, filas):
     """
-    Retorna todas las transacciones registradas en la base de datos dentro de un rango de fechas.
+    Inserta las filas con INSERT de varias filas cada uno en lugar de una
+    sentencia por fila. Dentro de un SAVEPOINT, cada sentencia que activa
+    disparadores vuelve a guardar en el diario del SAVEPOINT las páginas que
+    toca; con una sentencia por fila eso hacía el lote mucho más lento.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    por_insert = PARAMETROS_POR_INSERT // fila.count("?")
+    for inicio in range(0, len(filas), por_insert):
+        tramo = filas[inicio:inicio + por_insert]
+        cursor.execute(insert + ", ".join([fila] * len(tramo)), list(chain.from_iterable(tramo)))
+
+
+def _deshacer_lote(conn, transaccion_propia):
+    """
+    Deshace un lote que falló: toda la transacción si la abrió
+    registrar_transacciones_lote, o solo su SAVEPOINT si era de quien llama
+    (salvo que SQLite ya haya revertido la transacción entera).
+    """
+    if transaccion_propia:
+        conn.rollback()
+    elif conn.in_transaction:
+        conn.execute("ROLLBACK TO lote")
+        conn.execute("RELEASE lote")
+    # Las cuentas creadas en el lote revertido ya no existen
+    invalidar_cache_referencias(conn)
+
+
+def iterar_libro_diario(fecha_inicio=None, fecha_fin=None, conn=None):
+    """
+    Recorre las transacciones dentro de un rango de fechas sin cargarlas todas en memoria.
+    Usa una sola consulta con JOIN en orden cronológico (fecha y transacción,
+    primero el Debe y luego el Haber) y agrupa las líneas a medida que llegan;
+    cada transacción se entrega con el mismo formato que obtener_libro_diario,
+    con los montos como Decimal en Bs.
+    """
+    cursor = (conn or obtener_conexion()).cursor()
 
     query = """
-        SELECT id, fecha, descripcion FROM transacciones
+        SELECT t.id, t.fecha, t.descripcion, c.nombre, dt.monto, dt.tipo
+        FROM transacciones t
+        LEFT JOIN detalles_transacciones dt ON dt.transaccion_id = t.id
+        LEFT JOIN cuentas c ON c.id = dt.cuenta_id
     """
     params = []
 
     if fecha_inicio and fecha_fin:
-        query += " WHERE fecha BETWEEN ? AND ?"
+        query += " WHERE t.fecha BETWEEN ? AND ?"
         params.extend([fecha_inicio, fecha_fin])
     elif fecha_inicio:
-        query += " WHERE fecha >= ?"
+        query += " WHERE t.fecha >= ?"
         params.append(fecha_inicio)
     elif fecha_fin:
-        query += " WHERE fecha <= ?"
+        query += " WHERE t.fecha <= ?"
         params.append(fecha_fin)
 
+    query += " ORDER BY t.fecha, t.id, dt.tipo, dt.id"
+
+    try:
+        cursor.execute(query, params)
+        actual_id = None
+        transaccion = None
+        for transaccion_id, fecha, descripcion, cuenta, monto, tipo in cursor:
+            if transaccion_id != actual_id:
+                if transaccion is not None:
+                    yield transaccion
+                actual_id = transaccion_id
+                transaccion = {
+                    "fecha": fecha,
+                    "descripcion": descripcion,
+                    "cuentas_debe": [],
+                    "montos_debe": [],
+                    "cuentas_haber": [],
+                    "montos_haber": [],
+                }
+            if tipo == 'Debe':
+                transaccion["cuentas_debe"].append(cuenta)
+                transaccion["montos_debe"].append(a_bolivares(monto))
+            elif tipo == 'Haber':
+                transaccion["cuentas_haber"].append(cuenta)
+                transaccion["montos_haber"].append(a_bolivares(monto))
+        if transaccion is not None:
+            yield transaccion
+    finally:
+        cursor.close()
+
+
+def obtener_libro_diario(fecha_inicio=None, fecha_fin=None, conn=None):
+    """
+    Retorna todas las transacciones registradas en la base de datos dentro de un rango de fechas.
+    """
+    return list(iterar_libro_diario(fecha_inicio, fecha_fin, conn))
+
+
+def contar_transacciones(fecha_inicio=None, fecha_fin=None, conn=None):
+    """
+    Retorna cuántas transacciones hay en el rango de fechas (usa el índice por fecha).
+    """
+    cursor = (conn or obtener_conexion()).cursor()
+    query = "SELECT COUNT(*) FROM transacciones"
+    condiciones = []
+    params = []
+    if fecha_inicio:
+        condiciones.append("fecha >= ?")
+        params.append(fecha_inicio)
+    if fecha_fin:
+        condiciones.append("fecha <= ?")
+        params.append(fecha_fin)
+    if condiciones:
+        query += " WHERE " + " AND ".join(condiciones)
     cursor.execute(query, params)
-    transacciones = cursor.fetchall()
+    return cursor.fetchone()[0]
 
-    libro_diario = []
-    for transaccion in transacciones:
-        transaccion_id, fecha, descripcion = transaccion
 
-        cursor.execute("""
-            SELECT cuenta, monto, tipo FROM detalles_transacciones
-            WHERE transaccion_id = ?
-        """, (transaccion_id,))
-        detalles = cursor.fetchall()
+# Líneas del libro diario que se leen por cada página de obtener_lineas_libro_diario
+LINEAS_POR_PAGINA = 500
+
 
-        cuentas_debe = [d[0] for d in detalles if d[2] == 'Debe']
-        montos_debe = [d[1] for d in detalles if d[2] == 'Debe']
-        cuentas_haber = [d[0] for d in detalles if d[2] == 'Haber']
-        montos_haber = [d[1] for d in detalles if d[2] == 'Haber']
+def obtener_lineas_libro_diario(despues_de=None, limite=LINEAS_POR_PAGINA, fecha_inicio=None, fecha_fin=None, conn=None):
+    """
+    Retorna una página de líneas del libro diario, en el mismo orden que
+    iterar_libro_diario: fecha, transacción, primero el Debe y luego el Haber.
+    Cada línea es un diccionario con fecha, cuenta, tipo, monto (Decimal en
+    Bs), descripcion y clave.
+
+    La paginación es por clave (keyset): para pedir la página siguiente se
+    pasa en despues_de la clave de la última línea recibida. La consulta
+    continúa desde esa posición del índice, así que cualquier página cuesta
+    lo mismo sin importar cuántas líneas haya antes.
+    """
+    cursor = (conn or obtener_conexion()).cursor()
 
-        libro_diario.append({
+    query = """
+        SELECT t.fecha, t.id, dt.tipo, dt.id, c.nombre, dt.monto, t.descripcion
+        FROM transacciones t
+        JOIN detalles_transacciones dt ON dt.transaccion_id = t.id
+        JOIN cuentas c ON c.id = dt.cuenta_id
+    """
+    condiciones = []
+    params = []
+    if despues_de is not None:
+        fecha, transaccion_id, tipo, detalle_id = despues_de
+        # La primera condición usa el índice por fecha; la segunda descarta
+        # las líneas ya entregadas de la última transacción
+        condiciones.append("(t.fecha, t.id) >= (?, ?)")
+        condiciones.append("(t.fecha, t.id, dt.tipo, dt.id) > (?, ?, ?, ?)")
+        params.extend([fecha, transaccion_id, fecha, transaccion_id, tipo, detalle_id])
+    if fecha_inicio:
+        condiciones.append("t.fecha >= ?")
+        params.append(fecha_inicio)
+    if fecha_fin:
+        condiciones.append("t.fecha <= ?")
+        params.append(fecha_fin)
+    if condiciones:
+        query += " WHERE " + " AND ".join(condiciones)
+    query += " ORDER BY t.fecha, t.id, dt.tipo, dt.id LIMIT ?"
+    params.append(limite)
+
+    cursor.execute(query, params)
+    return [
+        {
             "fecha": fecha,
+            "cuenta": cuenta,
+            "tipo": tipo,
+            "monto": a_bolivares(monto),
             "descripcion": descripcion,
-            "cuentas_debe": cuentas_debe,
-            "montos_debe": montos_debe,
-            "cuentas_haber": cuentas_haber,
-            "montos_haber": montos_haber,
-        })
-
-    conn.close()
-    return libro_diario
+            "clave": (fecha, transaccion_id, tipo, detalle_id),
+        }
+        for fecha, transaccion_id, tipo, detalle_id, cuenta, monto, descripcion in cursor.fetchall()
+    ]
 
 
-def verificar_balance():
+def verificar_balance(conn=None):
     """
     Verifica si el libro diario está equilibrado.
+    Suma los totales por cuenta de totales_cuentas, una fila por cuenta, en
+    lugar de todas las líneas de detalle.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    cursor = (conn or obtener_conexion()).cursor()
 
     cursor.execute("""
-        SELECT SUM(monto) FROM detalles_transacciones WHERE tipo = 'Debe'
+        SELECT SUM(debe), SUM(haber) FROM totales_cuentas
     """)
-    total_debe = cursor.fetchone()[0] or 0.0
+    total_debe, total_haber = cursor.fetchone()
+    total_debe = total_debe or 0
+    total_haber = total_haber or 0
 
-    cursor.execute("""
-        SELECT SUM(monto) FROM detalles_transacciones WHERE tipo = 'Haber'
-    """)
-    total_haber = cursor.fetchone()[0] or 0.0
-
-    conn.close()
+    # Los totales son enteros en céntimos, así que la comparación es exacta
     return {
-        "total_debe": total_debe,
-        "total_haber": total_haber,
+        "total_debe": a_bolivares(total_debe),
+        "total_haber": a_bolivares(total_haber),
         "equilibrado": total_debe == total_haber,
     }
 
 
-def obtener_libro_mayor():
+def reconstruir_totales_cuentas(conn=None):
     """
-    Obtiene las cuentas y los saldos registrados en el libro mayor desde la base de datos.
+    Vuelve a calcular totales_cuentas a partir de las líneas de detalle.
+    Los disparadores la mantienen al día, así que solo hace falta si se
+    sospecha que quedó inconsistente (por ejemplo, tras restaurar una copia
+    parcial). Retorna la cantidad de cuentas.
+    Si conn ya tiene una transacción abierta, la reconstrucción se hace en un
+    SAVEPOINT dentro de ella y quien la abrió decide cuándo confirmarla; si
+    falla, solo se deshace la reconstrucción. Si no, se confirma aquí.
+    """
+    conn = conn or obtener_conexion()
+    cursor = conn.cursor()
+    transaccion_propia = not conn.in_transaction
+    cursor.execute("BEGIN IMMEDIATE" if transaccion_propia else "SAVEPOINT reconstruir_totales")
+    try:
+        cursor.execute("DELETE FROM totales_cuentas")
+        cursor.execute("""
+            INSERT INTO totales_cuentas (cuenta_id, debe, haber, lineas)
+            SELECT cuenta_id,
+                   SUM(CASE WHEN tipo = 'Debe' THEN monto ELSE 0 END),
+                   SUM(CASE WHEN tipo = 'Haber' THEN monto ELSE 0 END),
+                   COUNT(*)
+            FROM detalles_transacciones
+            GROUP BY cuenta_id
+        """)
+        cuentas = cursor.rowcount
+        if transaccion_propia:
+            conn.commit()
+        else:
+            cursor.execute("RELEASE reconstruir_totales")
+    except BaseException:
+        if transaccion_propia:
+            conn.rollback()
+        else:
+            cursor.execute("ROLLBACK TO reconstruir_totales")
+            cursor.execute("RELEASE reconstruir_totales")
+        raise
+    return cuentas
+
+
+def reconstruir_saldos_movimientos(conn=None):
+    """
+    Vuelve a calcular el saldo acumulado de todas las líneas de detalle.
+    Como reconstruir_totales_cuentas, solo hace falta si se sospecha que los
+    saldos guardados quedaron inconsistentes, y usa un SAVEPOINT si conn ya
+    tiene una transacción abierta. Retorna la cantidad de cuentas.
+    """
+    conn = conn or obtener_conexion()
+    cursor = conn.cursor()
+    transaccion_propia = not conn.in_transaction
+    cursor.execute("BEGIN IMMEDIATE" if transaccion_propia else "SAVEPOINT reconstruir_saldos")
+    try:
+        cursor.execute("SELECT DISTINCT cuenta_id FROM detalles_transacciones")
+        cuentas = [cuenta_id for cuenta_id, in cursor.fetchall()]
+        _recalcular_saldos(cursor, dict.fromkeys(cuentas))
+        cursor.execute("DELETE FROM saldos_pendientes")
+        if transaccion_propia:
+            conn.commit()
+        else:
+            cursor.execute("RELEASE reconstruir_saldos")
+    except BaseException:
+        if transaccion_propia:
+            conn.rollback()
+        else:
+            cursor.execute("ROLLBACK TO reconstruir_saldos")
+            cursor.execute("RELEASE reconstruir_saldos")
+        raise
+    return len(cuentas)
+
+
+def reconstruir_busqueda(conn=None):
+    """
+    Vuelve a generar el índice de búsqueda de las descripciones a partir de
+    transacciones. Como los demás reconstruir_*, solo hace falta si se
+    sospecha que quedó inconsistente.
+    """
+    conn = conn or obtener_conexion()
+    with conn:
+        conn.execute("INSERT INTO transacciones_fts (transacciones_fts) VALUES ('rebuild')")
+
+
+def obtener_movimientos_cuenta(cuenta, despues_de=None, limite=LINEAS_POR_PAGINA, fecha_desde=None, conn=None):
+    """
+    Retorna una página de movimientos de una cuenta en el orden del Libro
+    Mayor (fecha y línea), cada uno con el saldo de la cuenta después del
+    movimiento tal como está guardado, así que cualquier página se obtiene
+    sin recorrer las anteriores.
+
+    despues_de es la clave del último movimiento de la página anterior y
+    fecha_desde permite empezar en el primer movimiento de una fecha.
+    Cada movimiento es un diccionario con fecha, transaccion_id, descripcion,
+    tipo, monto, saldo (Decimal en Bs) y clave.
+    """
+    conn = conn or obtener_conexion()
+    cuenta_id = _id_cuenta_existente(conn, cuenta)
+    if cuenta_id is None:
+        return []
+    actualizar_saldos_pendientes(conn)
+    cursor = conn.cursor()
+    condiciones = ["dt.cuenta_id = ?"]
+    params = [cuenta_id]
+    if fecha_desde:
+        condiciones.append("dt.fecha >= ?")
+        params.append(fecha_desde)
+    if despues_de is not None:
+        condiciones.append("(dt.fecha, dt.id) > (?, ?)")
+        params.extend(despues_de)
+    cursor.execute(f"""
+        SELECT dt.fecha, dt.id, dt.transaccion_id, t.descripcion, dt.tipo, dt.monto, dt.saldo
+        FROM detalles_transacciones dt
+        JOIN transacciones t ON t.id = dt.transaccion_id
+        WHERE {" AND ".join(condiciones)}
+        ORDER BY dt.fecha, dt.id
+        LIMIT ?
+    """, params + [limite])
+    return [
+        {
+            "fecha": fecha,
+            "transaccion_id": transaccion_id,
+            "descripcion": descripcion,
+            "tipo": tipo,
+            "monto": a_bolivares(monto),
+            "saldo": a_bolivares(saldo),
+            "clave": (fecha, detalle_id),
+        }
+        for fecha, detalle_id, transaccion_id, descripcion, tipo, monto, saldo in cursor.fetchall()
+    ]
+
+
+# Transacciones por página de buscar_transacciones
+RESULTADOS_POR_PAGINA = 50
+
+
+def _consulta_fts(texto):
+    """
+    Convierte el texto escrito por el usuario en una consulta FTS5: cada
+    palabra entre comillas (así los signos no se toman como operadores) y
+    como prefijo, y todas deben aparecer. Retorna None si no hay palabras.
+    """
+    palabras = [palabra.replace('"', '""') for palabra in texto.split()]
+    if not palabras:
+        return None
+    return " ".join(f'"{palabra}"*' for palabra in palabras)
+
+
+def buscar_transacciones(texto, desde=None, hasta=None, cuenta=None, despues_de=None,
+                         limite=RESULTADOS_POR_PAGINA, conn=None):
+    """
+    Busca transacciones por las palabras de su descripción con el índice de
+    texto completo, sin recorrer la tabla. Cada palabra se busca como
+    prefijo ("alqu" encuentra "alquiler") y sin distinguir mayúsculas ni
+    acentos. Los resultados se ordenan por relevancia (bm25) y se pueden
+    limitar a un rango de fechas y a las transacciones que mueven una cuenta.
+
+    La paginación es por clave, como en obtener_lineas_libro_diario: para la
+    página siguiente se pasa en despues_de la clave del último resultado.
+    Cada resultado tiene el formato de obtener_libro_diario más id,
+    relevancia y clave.
     """
-    conn = sqlite3.connect(DB_PATH)
+    consulta = _consulta_fts(texto or "")
+    if consulta is None:
+        return []
+    conn = conn or obtener_conexion()
     cursor = conn.cursor()
 
+    condiciones = ["transacciones_fts MATCH ?"]
+    params = [consulta]
+    if desde:
+        condiciones.append("t.fecha >= ?")
+        params.append(desde)
+    if hasta:
+        condiciones.append("t.fecha <= ?")
+        params.append(hasta)
+    if cuenta:
+        cuenta_id = _id_cuenta_existente(conn, cuenta)
+        if cuenta_id is None:
+            return []
+        condiciones.append("""EXISTS (
+            SELECT 1 FROM detalles_transacciones dt WHERE dt.transaccion_id = t.id AND dt.cuenta_id = ?
+        )""")
+        params.append(cuenta_id)
+
+    # bm25 es menor cuanto más relevante; el id desempata para que la clave sea única
+    query = f"""
+        SELECT id, fecha, descripcion, relevancia FROM (
+            SELECT t.id, t.fecha, t.descripcion, bm25(transacciones_fts) AS relevancia
+            FROM transacciones_fts
+            JOIN transacciones t ON t.id = transacciones_fts.rowid
+            WHERE {" AND ".join(condiciones)}
+        )
+    """
+    if despues_de is not None:
+        query += " WHERE (relevancia, id) > (?, ?)"
+        params.extend(despues_de)
+    query += " ORDER BY relevancia, id LIMIT ?"
+    params.append(limite)
+    cursor.execute(query, params)
+
+    resultados = []
+    por_id = {}
+    for transaccion_id, fecha, descripcion, relevancia in cursor.fetchall():
+        resultado = {
+            "id": transaccion_id,
+            "fecha": fecha,
+            "descripcion": descripcion,
+            "cuentas_debe": [],
+            "montos_debe": [],
+            "cuentas_haber": [],
+            "montos_haber": [],
+            "relevancia": relevancia,
+            "clave": (relevancia, transaccion_id),
+        }
+        resultados.append(resultado)
+        por_id[transaccion_id] = resultado
+    if not resultados:
+        return resultados
+
+    # Las líneas de toda la página se leen juntas, por el índice de transacción
+    cursor.execute(f"""
+        SELECT dt.transaccion_id, c.nombre, dt.monto, dt.tipo
+        FROM detalles_transacciones dt
+        JOIN cuentas c ON c.id = dt.cuenta_id
+        WHERE dt.transaccion_id IN ({", ".join("?" * len(por_id))})
+        ORDER BY dt.transaccion_id, dt.tipo, dt.id
+    """, list(por_id))
+    for transaccion_id, nombre, monto, tipo in cursor.fetchall():
+        resultado = por_id[transaccion_id]
+        lado = "debe" if tipo == "Debe" else "haber"
+        resultado["cuentas_" + lado].append(nombre)
+        resultado["montos_" + lado].append(a_bolivares(monto))
+    return resultados
+
+
+def obtener_libro_mayor(conn=None):
+    """
+    Obtiene las cuentas y los saldos registrados en el libro mayor desde la base de datos.
+    """
+    cursor = (conn or obtener_conexion()).cursor()
+
     cursor.execute("""
-        SELECT cuenta, saldo FROM libro_mayor
+        SELECT c.nombre, lm.saldo
+        FROM libro_mayor lm
+        JOIN cuentas c ON c.id = lm.cuenta_id
     """)
     cuentas = cursor.fetchall()
 
-    conn.close()
-    return [{'cuenta': cuenta, 'saldo': saldo} for cuenta, saldo in cuentas]
+    return [{'cuenta': cuenta, 'saldo': a_bolivares(saldo)} for cuenta, saldo in cuentas]
+
+
+def _inicio_mes_siguiente(periodo):
+    """
+    Retorna la fecha 'AAAA-MM-DD' del primer día del mes posterior a un período 'AAAA-MM'.
+    """
+    anio, mes = int(periodo[:4]), int(periodo[5:7])
+    if mes == 12:
+        return f"{anio + 1:04d}-01-01"
+    return f"{anio:04d}-{mes + 1:02d}-01"
+
+
+def _reabrir_periodos(cursor, fecha):
+    """
+    Descarta los cierres del mes de la fecha indicada y de los meses posteriores.
+    Se llama al registrar movimientos con fecha en un período ya cerrado.
+    """
+    periodo = fecha[:7]
+    cursor.execute("DELETE FROM cierres_periodo WHERE periodo >= ?", (periodo,))
+    cursor.execute("DELETE FROM periodos_cerrados WHERE periodo >= ?", (periodo,))
+
+
+def _movimientos_por_cuenta(cursor, desde=None, hasta=None):
+    """
+    Retorna {cuenta_id: variación neta en céntimos} de los movimientos con
+    fecha >= desde y fecha <= hasta (cualquiera de los dos puede omitirse).
+    """
+    query = """
+        SELECT dt.cuenta_id,
+               SUM(CASE WHEN dt.tipo = 'Debe' THEN dt.monto ELSE -dt.monto END)
+        FROM transacciones t
+        JOIN detalles_transacciones dt ON dt.transaccion_id = t.id
+    """
+    condiciones = []
+    params = []
+    if desde:
+        condiciones.append("t.fecha >= ?")
+        params.append(desde)
+    if hasta:
+        condiciones.append("t.fecha <= ?")
+        params.append(hasta)
+    if condiciones:
+        query += " WHERE " + " AND ".join(condiciones)
+    query += " GROUP BY dt.cuenta_id"
+    cursor.execute(query, params)
+    return dict(cursor.fetchall())
+
+
+def cerrar_periodo(periodo, conn=None):
+    """
+    Cierra el mes indicado ('AAAA-MM') guardando el saldo de cada cuenta al
+    final del mes. Si hay meses anteriores sin cerrar, se cierran primero, en
+    orden; cada cierre parte del anterior y solo suma los movimientos de su mes.
+    Si conn ya tiene una transacción abierta, los cierres se escriben en ella y
+    quien la abrió decide cuándo confirmarla; si no, se confirma aquí.
+    Retorna la lista de períodos cerrados en esta llamada.
+    """
+    conn = conn or obtener_conexion()
+    if conn.in_transaction:
+        return _cerrar_periodos(conn.cursor(), periodo)
+    with conn:
+        return _cerrar_periodos(conn.cursor(), periodo)
+
+
+def _cerrar_periodos(cursor, periodo):
+    """
+    Cierra los meses pendientes hasta el indicado, inclusive, dentro de la
+    transacción abierta en la conexión del cursor.
+    """
+    cerrados = []
+    cursor.execute("SELECT MAX(periodo) FROM periodos_cerrados")
+    ultimo = cursor.fetchone()[0]
+    if ultimo is not None and ultimo >= periodo:
+        return cerrados
+
+    saldos = {}
+    if ultimo is not None:
+        cursor.execute("SELECT cuenta_id, saldo FROM cierres_periodo WHERE periodo = ?", (ultimo,))
+        saldos = dict(cursor.fetchall())
+        actual = _inicio_mes_siguiente(ultimo)[:7]
+    else:
+        cursor.execute("SELECT MIN(fecha) FROM transacciones")
+        primera_fecha = cursor.fetchone()[0]
+        actual = min(primera_fecha[:7], periodo) if primera_fecha else periodo
+
+    fecha_cierre = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    while actual <= periodo:
+        siguiente = _inicio_mes_siguiente(actual)
+        ultimo_dia = (date.fromisoformat(siguiente) - timedelta(days=1)).isoformat()
+        for cuenta_id, delta in _movimientos_por_cuenta(cursor, f"{actual}-01", ultimo_dia).items():
+            saldos[cuenta_id] = saldos.get(cuenta_id, 0) + delta
+
+        cursor.execute("""
+            INSERT INTO periodos_cerrados (periodo, fecha_cierre) VALUES (?, ?)
+        """, (actual, fecha_cierre))
+        cursor.executemany("""
+            INSERT INTO cierres_periodo (periodo, cuenta_id, saldo) VALUES (?, ?, ?)
+        """, [(actual, cuenta_id, saldo) for cuenta_id, saldo in saldos.items()])
+        cerrados.append(actual)
+        actual = siguiente[:7]
+    return cerrados
+
 
+def cerrar_meses_terminados(conn=None):
+    """
+    Cierra los meses ya terminados (los anteriores al mes en curso) que aún
+    no están cerrados, para que los saldos a una fecha partan de un cierre
+    reciente en lugar de recorrer toda la historia. Se llama al registrar
+    asientos, no al consultar: las consultas no escriben. Igual que
+    cerrar_periodo, usa la transacción abierta en conn si la hay.
+    Retorna la lista de períodos cerrados en esta llamada.
+    """
+    mes_anterior = (date.today().replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+    return cerrar_periodo(mes_anterior, conn)
+
+
+def obtener_saldos_al(fecha, conn=None):
+    """
+    Retorna el saldo de cada cuenta al final del día indicado ('AAAA-MM-DD'),
+    con el mismo formato que obtener_libro_mayor.
+    Parte del último mes cerrado antes de esa fecha y solo recorre los
+    movimientos posteriores a ese cierre.
+    """
+    cursor = (conn or obtener_conexion()).cursor()
+    saldos = _saldos_al(cursor, fecha)
+    nombres = _nombres_cuentas(cursor)
+    return [{'cuenta': nombres[cuenta_id], 'saldo': a_bolivares(saldo)} for cuenta_id, saldo in saldos.items()]
 
-def generar_pdf_libro_diario(nombre_empresa, libro_diario, tasa_dolar, fecha_inicio, fecha_fin):
+
+def _saldos_al(cursor, fecha):
+    """
+    Retorna {cuenta_id: saldo en céntimos} al final del día indicado.
+    """
+    # El cierre de un mes sirve si el mes termina a más tardar en la fecha pedida
+    mes_limite = (date.fromisoformat(fecha) + timedelta(days=1)).strftime("%Y-%m")
+    cursor.execute("SELECT MAX(periodo) FROM periodos_cerrados WHERE periodo < ?", (mes_limite,))
+    periodo_base = cursor.fetchone()[0]
+
+    saldos = {}
+    desde = None
+    if periodo_base is not None:
+        cursor.execute("SELECT cuenta_id, saldo FROM cierres_periodo WHERE periodo = ?", (periodo_base,))
+        saldos = dict(cursor.fetchall())
+        desde = _inicio_mes_siguiente(periodo_base)
+
+    if desde is None or desde <= fecha:
+        for cuenta_id, delta in _movimientos_por_cuenta(cursor, desde, fecha).items():
+            saldos[cuenta_id] = saldos.get(cuenta_id, 0) + delta
+
+    return saldos
+
+
+# Cantidad aproximada de filas por cada tabla del libro diario en el PDF
+FILAS_POR_BLOQUE = 200
+
+
+class _FlowablesDiferidos(list):
+    """
+    Lista de flowables que se llena desde un iterador a medida que reportlab
+    la consume. doc.build solo pregunta por el primer elemento y lo quita de
+    la lista, así que nunca hay más de un bloque construido a la vez.
+    """
+
+    def __init__(self, iterador):
+        super().__init__()
+        self._iterador = iter(iterador)
+
+    def __len__(self):
+        if not super().__len__():
+            siguiente = next(self._iterador, None)
+            if siguiente is not None:
+                self.append(siguiente)
+        return super().__len__()
+
+
+def _bloques_libro_diario(libro_diario, tasa_dolar, style_desc, conn=None, progreso=None, total=None):
+    """
+    Convierte las transacciones del libro diario en tablas (LongTable) de
+    unas FILAS_POR_BLOQUE filas, sin partir ninguna transacción entre dos
+    bloques. Cada bloque repite el encabezado de columnas en cada página.
+    Si se indica progreso, se llama con (transacciones procesadas, total)
+    cada vez que se entrega un bloque.
+    """
+    from reportlab.lib import colors
+    from reportlab.platypus import LongTable, Paragraph, TableStyle
+
+    encabezado = ["Fecha", "Operaciones", "N° Ref", "Debe", "Haber", "Descripción"]
+    estilo_base = [
+        ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
+        ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
+        ("GRID", (0, 0), (-1, -1), 1, colors.black),
+        ("ALIGN", (5, 0), (5, -1), "CENTER"),
+        ("VALIGN", (5, 1), (5, -1), "MIDDLE"),
+    ]
+
+    def crear_tabla(data, spans):
+        table = LongTable(data, colWidths=[60, 100, 60, 80, 80, 200], repeatRows=1)
+        table.setStyle(TableStyle(estilo_base + spans))
+        return table
+
+    data = [encabezado]
+    spans = []
+    procesadas = 0
+    for procesadas, transaccion in enumerate(libro_diario, start=1):
+        fecha = transaccion["fecha"]
+        descripcion = transaccion["descripcion"]
+        cuentas_debe = transaccion["cuentas_debe"]
+        montos_debe = transaccion["montos_debe"]
+        cuentas_haber = transaccion["cuentas_haber"]
+        montos_haber = transaccion["montos_haber"]
+
+        # Obtener números de referencia para las cuentas
+        referencias = {}
+        with instrumentacion.fase("referencias"):
+            for cuenta in cuentas_debe + cuentas_haber:
+                referencias[cuenta] = obtener_numero_referencia(cuenta, conn)
+
+        # La descripción ocupa una sola celda combinada para todas las filas de la transacción
+        primera_fila = len(data)
+        total_operaciones = len(cuentas_debe) + len(cuentas_haber)
+
+        # Agregar filas para las cuentas Debe
+        for i, (cuenta, monto_bs) in enumerate(zip(cuentas_debe, montos_debe)):
+            monto_usd = _a_dolares(monto_bs, tasa_dolar)
+            if i == 0:
+                data.append([
+                    fecha,
+                    cuenta,
+                    referencias[cuenta],
+                    f"Bs {monto_bs:.2f}\n(USD {monto_usd:.2f})",
+                    "",
+                    Paragraph(descripcion, style_desc)
+                ])
+            else:
+                data.append([
+                    "",
+                    cuenta,
+                    referencias[cuenta],
+                    f"Bs {monto_bs:.2f}\n(USD {monto_usd:.2f})",
+                    "",
+                    ""
+                ])
+
+        # Agregar filas para las cuentas Haber
+        for i, (cuenta, monto_bs) in enumerate(zip(cuentas_haber, montos_haber)):
+            monto_usd = _a_dolares(monto_bs, tasa_dolar)
+            if i == 0 and not cuentas_debe:
+                data.append([
+                    fecha,
+                    cuenta,
+                    referencias[cuenta],
+                    "",
+                    f"Bs {monto_bs:.2f}\n(USD {monto_usd:.2f})",
+                    Paragraph(descripcion, style_desc)
+                ])
+            else:
+                data.append([
+                    "",
+                    cuenta,
+                    referencias[cuenta],
+                    "",
+                    f"Bs {monto_bs:.2f}\n(USD {monto_usd:.2f})",
+                    ""
+                ])
+
+        if total_operaciones > 1:
+            spans.append(("SPAN", (5, primera_fila), (5, primera_fila + total_operaciones - 1)))
+
+        if len(data) > FILAS_POR_BLOQUE:
+            if progreso:
+                progreso(procesadas, total)
+            yield crear_tabla(data, spans)
+            data = [encabezado]
+            spans = []
+
+    if progreso:
+        progreso(procesadas, total)
+    if len(data) > 1:
+        yield crear_tabla(data, spans)
+
+
+@instrumentacion.medida("generar_pdf_libro_diario")
+def generar_pdf_libro_diario(nombre_empresa, libro_diario, tasa_dolar, fecha_inicio, fecha_fin, ruta_salida=None,
+                             progreso=None, conn=None):
     """
     Genera un PDF con el libro diario, mostrando montos en Bs y USD,
     e incluye en el encabezado: nombre de empresa, tipo de cambio,
     período de fechas y la fecha de emisión.
+
+    libro_diario puede ser una lista o un iterador (por ejemplo, el de
+    iterar_libro_diario); si es None se recorre el período desde la base de
+    datos. Las transacciones se consumen a medida que se dibujan las páginas,
+    así que la memoria usada no depende del largo del período.
+    El PDF se escribe en ruta_salida, o en libro_diario.pdf si no se indica.
+
+    progreso, si se indica, se llama con (transacciones procesadas, total) a
+    medida que avanza el documento; total es None si no se conoce. Puede
+    lanzar OperacionCancelada para detener el reporte sin escribir el PDF.
     """
+    from reportlab.lib.enums import TA_CENTER, TA_LEFT
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
     try:
-        pdf_path = "libro_diario.pdf"
+        pdf_path = ruta_salida or "libro_diario.pdf"
         doc = SimpleDocTemplate(pdf_path, pagesize=letter)
         elements = []
 
@@ -310,109 +1367,174 @@ def generar_pdf_libro_diario(nombre_empresa, libro_diario, tasa_dolar, fecha_ini
         style_desc.alignment = TA_CENTER
         style_desc.wordWrap = 'CJK'
 
-        # Creación de la tabla (cuadro)
-        data = [["Fecha", "Operaciones", "N° Ref", "Debe", "Haber", "Descripción"]]
-        for transaccion in libro_diario:
-            fecha = transaccion["fecha"]
-            descripcion = transaccion["descripcion"]
-            cuentas_debe = transaccion["cuentas_debe"]
-            montos_debe = transaccion["montos_debe"]
-            cuentas_haber = transaccion["cuentas_haber"]
-            montos_haber = transaccion["montos_haber"]
-
-            # Obtener números de referencia para las cuentas
-            referencias = {}
-            for cuenta in cuentas_debe + cuentas_haber:
-                referencias[cuenta] = obtener_numero_referencia(cuenta)
-
-            # Calcular total de operaciones (para uso en el estilo de la tabla)
-            total_operaciones = len(cuentas_debe) + len(cuentas_haber)
-
-            # Agregar filas para las cuentas Debe
-            for i, (cuenta, monto_bs) in enumerate(zip(cuentas_debe, montos_debe)):
-                monto_usd = monto_bs / tasa_dolar if tasa_dolar != 0 else 0
-                if i == 0:
-                    data.append([
-                        fecha,
-                        cuenta,
-                        referencias[cuenta],
-                        f"Bs {monto_bs:.2f}\n(USD {monto_usd:.2f})",
-                        "",
-                        Paragraph(descripcion, style_desc)
-                    ])
-                else:
-                    data.append([
-                        "",
-                        cuenta,
-                        referencias[cuenta],
-                        f"Bs {monto_bs:.2f}\n(USD {monto_usd:.2f})",
-                        "",
-                        ""
-                    ])
-
-            # Agregar filas para las cuentas Haber
-            for i, (cuenta, monto_bs) in enumerate(zip(cuentas_haber, montos_haber)):
-                monto_usd = monto_bs / tasa_dolar if tasa_dolar != 0 else 0
-                if i == 0 and not cuentas_debe:
-                    data.append([
-                        fecha,
-                        cuenta,
-                        referencias[cuenta],
-                        "",
-                        f"Bs {monto_bs:.2f}\n(USD {monto_usd:.2f})",
-                        Paragraph(descripcion, style_desc)
-                    ])
-                else:
-                    data.append([
-                        "",
-                        cuenta,
-                        referencias[cuenta],
-                        "",
-                        f"Bs {monto_bs:.2f}\n(USD {monto_usd:.2f})",
-                        ""
-                    ])
-
-        # Crear la tabla con anchos personalizados
-        table = Table(data, colWidths=[60, 100, 60, 80, 80, 200])
-        table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-            ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
-            ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
-            ("GRID", (0, 0), (-1, -1), 1, colors.black),
-            ("ALIGN", (5, 0), (5, -1), "CENTER"),
-            ("VALIGN", (5, 1), (5, -1), "MIDDLE"),
-            ("SPAN", (5, 1), (5, total_operaciones)),
-        ]))
-        elements.append(table)
-        doc.build(elements)
+        total = len(libro_diario) if isinstance(libro_diario, list) else None
+        if libro_diario is None:
+            if progreso:
+                total = contar_transacciones(fecha_inicio, fecha_fin, conn)
+            libro_diario = iterar_libro_diario(fecha_inicio, fecha_fin, conn)
+        libro_diario = instrumentacion.medir_iterador(libro_diario, "consulta")
+
+        # Las tablas se crean por bloques mientras se construye el documento
+        bloques = _bloques_libro_diario(libro_diario, tasa_dolar, style_desc, conn, progreso, total)
+        bloques = instrumentacion.medir_iterador(bloques, "tablas")
+        with instrumentacion.fase("doc.build"):
+            doc.build(_FlowablesDiferidos(chain(elements, bloques)))
 
         return pdf_path
+    except OperacionCancelada:
+        raise
     except Exception as e:
         raise Exception(f"No se pudo generar el PDF: {str(e)}")
     
-def generar_pdf_libro_mayor(nombre_empresa, libro_mayor, tasa_dolar, fecha_emision):
+# Anchos de columna del Libro Mayor: Fecha | Concepto | N° Ref | Debe | Haber | Saldo.
+# Las columnas de montos dejan caber en una línea hasta "Bs -999999.99" en Helvetica 10
+ANCHOS_LIBRO_MAYOR = [65, 140, 40, 78, 78, 78]
+
+
+def _celda(texto, ancho, estilo):
     """
-    Genera un PDF del Libro Mayor mostrando los movimientos de cada cuenta en una tabla con las columnas:
-      Fecha | Concepto | N° Ref | Debe | Haber | Saldo
-    Los movimientos se ordenan cronológicamente y se calcula el saldo acumulado.
+    Retorna el texto tal cual si cabe en una línea de la columna, o un
+    Paragraph que lo ajusta en varias líneas si no cabe. Las cadenas simples
+    son mucho más rápidas de medir y dibujar que los Paragraph.
     """
-    try:
-        pdf_path = "libro_mayor.pdf"
-        doc = SimpleDocTemplate(pdf_path, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
-        header_style = ParagraphStyle("header_style", parent=styles["Normal"], alignment=TA_LEFT)
-        table_header_style = ParagraphStyle("table_header_style", parent=styles["Normal"],
-                                            alignment=TA_CENTER, fontName="Helvetica-Bold")
-        # Estilo para el contenido de la columna "Concepto" con ajuste de línea
-        concept_style = ParagraphStyle("concept_style", parent=styles["Normal"],
-                                       alignment=TA_LEFT, wordWrap='CJK')
-        
-        # Fecha y encabezado principal
-        fecha_emision = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.platypus import Paragraph
+
+    # 6 puntos de relleno a cada lado de la celda
+    if stringWidth(texto, estilo.fontName, estilo.fontSize) <= ancho - 12:
+        return texto
+    return Paragraph(texto, estilo)
+
+
+def _bloques_libro_mayor(cursor, header_style, concept_style, monto_style, cuenta_desde=None, cuenta_hasta=None,
+                         conn=None, progreso=None, total=None):
+    """
+    Recorre todos los movimientos con una sola consulta ordenada por cuenta y
+    fecha, y produce el encabezado y las tablas de cada cuenta a medida que
+    cambia la cuenta. El saldo acumulado es el guardado en cada línea.
+    Con cuenta_desde/cuenta_hasta se limita a ese rango de cuentas (inclusive).
+    Si se indica progreso, se llama con (movimientos procesados, total) cada
+    vez que se entrega una tabla.
+    """
+    from reportlab.lib import colors
+    from reportlab.platypus import LongTable, Paragraph, Spacer, TableStyle
+
+    encabezado = ["Fecha", "Concepto", "N° Ref", "Debe", "Haber", "Saldo"]
+    estilo_tabla = TableStyle([
+        ("BOX", (0,0), (-1,-1), 1, colors.black),
+        ("GRID", (0,0), (-1,-1), 0.5, colors.grey),
+        ("BACKGROUND", (0,0), (-1,0), colors.lightgrey),
+        ("ALIGN", (0,0), (-1,0), "CENTER"),
+        ("ALIGN", (0,1), (-1,-1), "LEFT"),
+        ("ALIGN", (3,1), (5,-1), "RIGHT"),
+        ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
+        ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
+    ])
+
+    def crear_tabla(data):
+        table_mov = LongTable(data, colWidths=ANCHOS_LIBRO_MAYOR, repeatRows=1)
+        table_mov.setStyle(estilo_tabla)
+        return table_mov
+
+    # CROSS JOIN fija el orden: las cuentas por nombre y, dentro de cada una, sus
+    # líneas por el índice (cuenta_id, fecha), así las filas salen ya ordenadas
+    query = """
+        SELECT c.nombre, c.id, dt.fecha, t.descripcion, dt.monto, dt.tipo, dt.saldo
+        FROM cuentas c
+        CROSS JOIN detalles_transacciones dt ON dt.cuenta_id = c.id
+        JOIN transacciones t ON dt.transaccion_id = t.id
+    """
+    params = []
+    if cuenta_desde is not None and cuenta_hasta is not None:
+        query += " WHERE c.nombre BETWEEN ? AND ?"
+        params.extend([cuenta_desde, cuenta_hasta])
+    query += " ORDER BY c.nombre, dt.fecha, dt.id"
+    with instrumentacion.fase("consulta"):
+        cursor.execute(query, params)
+
+    cuenta_actual = None
+    data = None
+    procesados = 0
+    for cuenta, cuenta_id, fecha_mov, concepto, monto, tipo, saldo in instrumentacion.medir_iterador(cursor, "consulta"):
+        if cuenta != cuenta_actual:
+            # Cierre de la cuenta anterior y encabezado de la nueva
+            if data is not None:
+                if progreso:
+                    progreso(procesados, total)
+                yield crear_tabla(data)
+                yield Spacer(1, 24)
+            cuenta_actual = cuenta
+            ref = str(cuenta_id)  # Número de referencia de la cuenta
+            yield Paragraph(f"<b>Cuenta: {cuenta}</b>", header_style)
+            yield Spacer(1, 6)
+            data = [encabezado]
+
+        if tipo == "Debe":
+            debe_str = f"Bs {a_bolivares(monto):.2f}"
+            haber_str = ""
+        else:
+            debe_str = ""
+            haber_str = f"Bs {a_bolivares(monto):.2f}"
+        saldo_str = f"Bs {a_bolivares(saldo):.2f}"
+
+        data.append([
+            fecha_mov,
+            _celda(concepto or "", ANCHOS_LIBRO_MAYOR[1], concept_style),
+            ref,
+            _celda(debe_str, ANCHOS_LIBRO_MAYOR[3], monto_style),
+            _celda(haber_str, ANCHOS_LIBRO_MAYOR[4], monto_style),
+            _celda(saldo_str, ANCHOS_LIBRO_MAYOR[5], monto_style),
+        ])
+
+        procesados += 1
+
+        # Las cuentas con muchos movimientos se parten en varias tablas
+        if len(data) > FILAS_POR_BLOQUE:
+            if progreso:
+                progreso(procesados, total)
+            yield crear_tabla(data)
+            data = [encabezado]
+
+    if progreso:
+        progreso(procesados, total)
+    if data is not None:
+        yield crear_tabla(data)
+        yield Spacer(1, 24)
+
+
+def _dibujar_numero_pagina(canvas, numero):
+    """
+    Dibuja el número de página al pie, a la derecha.
+    """
+    from reportlab.lib.pagesizes import letter
+
+    canvas.saveState()
+    canvas.setFont("Helvetica", 8)
+    canvas.drawRightString(letter[0] - 72, 36, f"Página {numero}")
+    canvas.restoreState()
+
+
+def _escribir_libro_mayor(pdf_path, nombre_empresa, tasa_dolar, fecha_emision, cuenta_desde=None,
+                          cuenta_hasta=None, con_encabezado=True, numerar_paginas=True, progreso=None, conn=None):
+    """
+    Escribe en pdf_path el Libro Mayor completo o solo un rango de cuentas.
+    """
+    from reportlab.lib.enums import TA_LEFT, TA_RIGHT
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+    doc = SimpleDocTemplate(pdf_path, pagesize=letter)
+    elements = []
+    styles = getSampleStyleSheet()
+    header_style = ParagraphStyle("header_style", parent=styles["Normal"], alignment=TA_LEFT)
+    # Estilo para el contenido de la columna "Concepto" con ajuste de línea
+    concept_style = ParagraphStyle("concept_style", parent=styles["Normal"],
+                                   alignment=TA_LEFT, wordWrap='CJK')
+    # Los montos solo se pueden partir en el espacio después de "Bs", nunca entre dígitos
+    monto_style = ParagraphStyle("monto_style", parent=styles["Normal"], alignment=TA_RIGHT)
+
+    if con_encabezado:
         header_text = (
             f"<b>Nombre de la Empresa:</b> {nombre_empresa}<br/>"
             f"<b>Tipo de Cambio:</b> 1 USD = {tasa_dolar} Bs<br/>"
@@ -421,135 +1543,270 @@ def generar_pdf_libro_mayor(nombre_empresa, libro_mayor, tasa_dolar, fecha_emisi
         )
         elements.append(Paragraph(header_text, header_style))
         elements.append(Spacer(1, 12))
-        
-        # Conexión a la base de datos y obtención de las cuentas en el libro mayor
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT cuenta, saldo FROM libro_mayor")
-        cuentas = cursor.fetchall()
-        
-        # Para cada cuenta se generan los movimientos en una tabla ordenada por fecha
-        for cuenta, saldo in cuentas:
-            # Agregar un encabezado para la cuenta
-            elements.append(Paragraph(f"<b>Cuenta: {cuenta}</b>", header_style))
-            elements.append(Spacer(1, 6))
-            
-            # Cabecera de la tabla: Fecha, Concepto, N° Ref, Debe, Haber, Saldo
-            data = []
-            data.append([
-                Paragraph("<b>Fecha</b>", table_header_style),
-                Paragraph("<b>Concepto</b>", table_header_style),
-                Paragraph("<b>N° Ref</b>", table_header_style),
-                Paragraph("<b>Debe</b>", table_header_style),
-                Paragraph("<b>Haber</b>", table_header_style),
-                Paragraph("<b>Saldo</b>", table_header_style)
-            ])
-            
-            # Consultar los movimientos para la cuenta (unir con transacciones para obtener fecha y descripción)
-            cursor.execute("""
-                SELECT t.fecha, t.descripcion, dt.monto, dt.tipo
-                FROM detalles_transacciones dt
-                JOIN transacciones t ON dt.transaccion_id = t.id
-                WHERE dt.cuenta = ?
-                ORDER BY t.fecha, dt.id
-            """, (cuenta,))
-            movimientos = cursor.fetchall()
-            
-            running_balance = 0.0
-            ref = obtener_numero_referencia(cuenta)  # Número de referencia de la cuenta
-            
-            # Recorrer cada movimiento y calcular el saldo acumulado
-            for mov in movimientos:
-                fecha_mov, concepto, monto, tipo = mov
-                if tipo == "Debe":
-                    debe = monto
-                    haber = ""
-                    running_balance += monto
-                else:
-                    debe = ""
-                    haber = monto
-                    running_balance -= monto
-                
-                debe_str = f"Bs {debe:.2f}" if debe != "" else ""
-                haber_str = f"Bs {haber:.2f}" if haber != "" else ""
-                saldo_str = f"Bs {running_balance:.2f}"
-                
-                data.append([
-                    Paragraph(fecha_mov, styles["Normal"]),
-                    Paragraph(concepto, concept_style),
-                    Paragraph(str(ref), styles["Normal"]),
-                    Paragraph(debe_str, styles["Normal"]),
-                    Paragraph(haber_str, styles["Normal"]),
-                    Paragraph(saldo_str, styles["Normal"])
-                ])
-            
-            # Crear la tabla con anchos fijos para cada columna
-            table_mov = Table(data, colWidths=[70, 150, 50, 70, 70, 70])
-            table_mov.setStyle(TableStyle([
-                ("BOX", (0,0), (-1,-1), 1, colors.black),
-                ("GRID", (0,0), (-1,-1), 0.5, colors.grey),
-                ("BACKGROUND", (0,0), (-1,0), colors.lightgrey),
-                ("ALIGN", (0,0), (-1,-1), "CENTER"),
-                ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
-                ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
-            ]))
-            elements.append(table_mov)
-            elements.append(Spacer(1, 24))
-        
-        conn.close()
-        doc.build(elements)
+
+    # Para cada cuenta se generan los movimientos en tablas ordenadas por fecha
+    cursor = (conn or obtener_conexion()).cursor()
+    total = None
+    if progreso:
+        cursor.execute("SELECT COUNT(*) FROM detalles_transacciones")
+        total = cursor.fetchone()[0]
+    bloques = _bloques_libro_mayor(cursor, header_style, concept_style, monto_style, cuenta_desde, cuenta_hasta,
+                                   conn, progreso, total)
+    flowables = _FlowablesDiferidos(chain(elements, instrumentacion.medir_iterador(bloques, "tablas")))
+    with instrumentacion.fase("doc.build"):
+        if numerar_paginas:
+            numerar = lambda canvas, doc: _dibujar_numero_pagina(canvas, doc.page)
+            doc.build(flowables, onFirstPage=numerar, onLaterPages=numerar)
+        else:
+            doc.build(flowables)
+
+
+def _escribir_seccion_libro_mayor(ruta_bd, pdf_path, nombre_empresa, tasa_dolar, fecha_emision,
+                                  cuenta_desde, cuenta_hasta, con_encabezado):
+    """
+    Punto de entrada de cada proceso del modo paralelo: abre su propia
+    conexión a ruta_bd y escribe su rango de cuentas en pdf_path.
+    """
+    configurar_ruta(ruta_bd)
+    _escribir_libro_mayor(pdf_path, nombre_empresa, tasa_dolar, fecha_emision, cuenta_desde,
+                          cuenta_hasta, con_encabezado, numerar_paginas=False)
+    return pdf_path
+
+
+def _particionar_cuentas(cursor, partes):
+    """
+    Divide las cuentas, en orden alfabético, en hasta `partes` rangos contiguos
+    con una cantidad parecida de movimientos. Retorna [(cuenta_desde, cuenta_hasta), ...].
+    """
+    cursor.execute("""
+        SELECT c.nombre, tc.lineas
+        FROM totales_cuentas tc
+        JOIN cuentas c ON c.id = tc.cuenta_id
+        WHERE tc.lineas > 0
+        ORDER BY c.nombre
+    """)
+    cuentas = cursor.fetchall()
+    total = sum(cantidad for _, cantidad in cuentas)
+    rangos = []
+    desde = None
+    acumulado = 0
+    for cuenta, cantidad in cuentas:
+        if desde is None:
+            desde = cuenta
+        acumulado += cantidad
+        # Se corta el rango cuando alcanza su parte proporcional del total
+        if acumulado * partes >= total * (len(rangos) + 1) and len(rangos) < partes - 1:
+            rangos.append((desde, cuenta))
+            desde = None
+    if desde is not None:
+        rangos.append((desde, cuentas[-1][0]))
+    return rangos
+
+
+def _numerar_paginas_unidas(writer, carpeta):
+    """
+    Agrega el número de página continuo a cada página de un PDF unido con
+    pypdf. Los números se dibujan con reportlab en un PDF aparte dentro de
+    carpeta, una página por número, y cada una se superpone a la página
+    correspondiente con merge_page.
+    """
+    from pypdf import PdfReader
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen.canvas import Canvas
+
+    ruta_numeros = os.path.join(carpeta, "numeros.pdf")
+    lienzo = Canvas(ruta_numeros, pagesize=letter)
+    for numero in range(1, len(writer.pages) + 1):
+        _dibujar_numero_pagina(lienzo, numero)
+        lienzo.showPage()
+    lienzo.save()
+
+    for pagina, numero in zip(writer.pages, PdfReader(ruta_numeros).pages):
+        pagina.merge_page(numero)
+
+
+def _generar_libro_mayor_paralelo(pdf_path, ruta_bd, rangos, procesos, nombre_empresa, tasa_dolar, fecha_emision,
+                                  progreso=None):
+    """
+    Dibuja cada rango de cuentas en un proceso distinto, une las partes en
+    pdf_path y numera las páginas de forma continua. progreso se llama con
+    (partes terminadas, total de partes).
+    """
+    import multiprocessing
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        raise Exception("el modo paralelo requiere el paquete pypdf (pip install pypdf)")
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        # Con spawn cada proceso empieza de cero: con fork heredaría la conexión
+        # de SQLite abierta en este proceso, que no se puede usar ni cerrar en otro
+        contexto = multiprocessing.get_context("spawn")
+        with instrumentacion.fase("partes"), ProcessPoolExecutor(max_workers=procesos,
+                                                                 mp_context=contexto) as executor:
+            futuros = [
+                executor.submit(_escribir_seccion_libro_mayor, ruta_bd,
+                                os.path.join(carpeta, f"parte_{i:03d}.pdf"), nombre_empresa,
+                                tasa_dolar, fecha_emision, desde, hasta, i == 0)
+                for i, (desde, hasta) in enumerate(rangos)
+            ]
+            try:
+                for terminadas, futuro in enumerate(as_completed(futuros), start=1):
+                    futuro.result()
+                    if progreso:
+                        progreso(terminadas, len(futuros))
+            except BaseException:
+                # Las partes que no empezaron se descartan en lugar de esperarlas
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            partes = [futuro.result() for futuro in futuros]
+
+        with instrumentacion.fase("unir"):
+            writer = PdfWriter()
+            for parte in partes:
+                writer.append(PdfReader(parte))
+
+            _numerar_paginas_unidas(writer, carpeta)
+            with open(pdf_path, "wb") as archivo:
+                writer.write(archivo)
+
+
+@instrumentacion.medida("generar_pdf_libro_mayor")
+def generar_pdf_libro_mayor(nombre_empresa, libro_mayor, tasa_dolar, fecha_emision, procesos=1, ruta_salida=None,
+                            progreso=None, conn=None):
+    """
+    Genera un PDF del Libro Mayor mostrando los movimientos de cada cuenta en una tabla con las columnas:
+      Fecha | Concepto | N° Ref | Debe | Haber | Saldo
+    Los movimientos se ordenan cronológicamente, con el saldo acumulado guardado en cada línea.
+    Todas las cuentas salen de una sola consulta que se consume mientras se
+    dibujan las páginas; libro_mayor se conserva por compatibilidad y no se usa.
+
+    Con procesos > 1 las cuentas se reparten en ese número de procesos, cada
+    uno dibuja su parte y luego se unen en un solo PDF (requiere pypdf).
+    Los procesos se inician con spawn, así que un script que use este modo
+    debe llamarlo desde un bloque if __name__ == "__main__".
+    El PDF se escribe en ruta_salida, o en libro_mayor.pdf si no se indica.
+
+    progreso, si se indica, se llama con (avance, total) a medida que se
+    dibuja: movimientos en modo normal, partes terminadas en modo paralelo.
+    Puede lanzar OperacionCancelada para detener el reporte.
+    """
+    try:
+        pdf_path = ruta_salida or "libro_mayor.pdf"
+        fecha_emision = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        actualizar_saldos_pendientes(conn)
+
+        if procesos > 1:
+            conexion = conn or obtener_conexion()
+            ruta_bd = getattr(conexion, "ruta", None)
+            rangos = _particionar_cuentas(conexion.cursor(), procesos) if ruta_bd else []
+            # Una base de datos en memoria o con pocas cuentas se dibuja en este proceso
+            if len(rangos) > 1:
+                _generar_libro_mayor_paralelo(pdf_path, ruta_bd, rangos, procesos,
+                                              nombre_empresa, tasa_dolar, fecha_emision, progreso)
+                return pdf_path
+
+        _escribir_libro_mayor(pdf_path, nombre_empresa, tasa_dolar, fecha_emision, progreso=progreso, conn=conn)
         return pdf_path
+    except OperacionCancelada:
+        raise
     except Exception as e:
         raise Exception(f"No se pudo generar el PDF del Libro Mayor: {str(e)}")
 
-def obtener_balance_sumasy_saldos():
+def obtener_balance_sumasy_saldos(fecha_inicio=None, fecha_fin=None, saldos_iniciales=False, conn=None):
     """
     Obtiene el balance de sumas y saldos por cuenta, calculando:
       - Total en Debe
       - Total en Haber
       - Saldo Deudor (si Debe > Haber)
       - Saldo Acreedor (si Haber > Debe)
+    Si se indica un rango de fechas, solo se suman los movimientos de ese
+    período. Con saldos_iniciales=True, el saldo de cada cuenta al día anterior
+    a fecha_inicio se agrega como "saldo_inicial" y se incluye en los saldos.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT cuenta,
-               SUM(CASE WHEN tipo = 'Debe' THEN monto ELSE 0 END) AS total_debe,
-               SUM(CASE WHEN tipo = 'Haber' THEN monto ELSE 0 END) AS total_haber
-        FROM detalles_transacciones
-        GROUP BY cuenta
-    """)
-    resultados = cursor.fetchall()
-    conn.close()
+    cursor = (conn or obtener_conexion()).cursor()
+    if fecha_inicio or fecha_fin:
+        # Recorre solo las transacciones del período usando el índice por fecha
+        query = """
+            SELECT dt.cuenta_id,
+                   SUM(CASE WHEN dt.tipo = 'Debe' THEN dt.monto ELSE 0 END) AS total_debe,
+                   SUM(CASE WHEN dt.tipo = 'Haber' THEN dt.monto ELSE 0 END) AS total_haber
+            FROM transacciones t
+            JOIN detalles_transacciones dt ON dt.transaccion_id = t.id
+        """
+        condiciones = []
+        params = []
+        if fecha_inicio:
+            condiciones.append("t.fecha >= ?")
+            params.append(fecha_inicio)
+        if fecha_fin:
+            condiciones.append("t.fecha <= ?")
+            params.append(fecha_fin)
+        query += " WHERE " + " AND ".join(condiciones) + " GROUP BY dt.cuenta_id"
+        cursor.execute(query, params)
+    else:
+        # Sin fechas se leen los totales que mantienen los disparadores
+        cursor.execute("""
+            SELECT cuenta_id, debe, haber
+            FROM totales_cuentas
+            WHERE lineas > 0
+        """)
+    totales = {cuenta_id: (total_debe, total_haber) for cuenta_id, total_debe, total_haber in cursor.fetchall()}
 
+    iniciales = {}
+    if saldos_iniciales and fecha_inicio:
+        dia_anterior = (date.fromisoformat(fecha_inicio) - timedelta(days=1)).isoformat()
+        iniciales = {cuenta_id: saldo for cuenta_id, saldo in _saldos_al(cursor, dia_anterior).items() if saldo}
+
+    # Los totales se calculan por id; el nombre solo se busca para ordenar y mostrar
+    nombres = _nombres_cuentas(cursor)
     balances = []
-    for cuenta, total_debe, total_haber in resultados:
-        saldo_deudor = total_debe - total_haber if total_debe > total_haber else 0
-        saldo_acreedor = total_haber - total_debe if total_haber > total_debe else 0
+    for cuenta_id in sorted(totales.keys() | iniciales.keys(), key=nombres.__getitem__):
+        total_debe, total_haber = totales.get(cuenta_id, (0, 0))
+        saldo = iniciales.get(cuenta_id, 0) + total_debe - total_haber
+        saldo_deudor = saldo if saldo > 0 else 0
+        saldo_acreedor = -saldo if saldo < 0 else 0
         balances.append({
-            "cuenta": cuenta,
-            "debe": total_debe,
-            "haber": total_haber,
-            "saldo_deudor": saldo_deudor,
-            "saldo_acreedor": saldo_acreedor
+            "cuenta": nombres[cuenta_id],
+            "saldo_inicial": a_bolivares(iniciales.get(cuenta_id, 0)),
+            "debe": a_bolivares(total_debe),
+            "haber": a_bolivares(total_haber),
+            "saldo_deudor": a_bolivares(saldo_deudor),
+            "saldo_acreedor": a_bolivares(saldo_acreedor)
         })
     return balances
 
 
-def generar_pdf_balance_sumasy_saldos(nombre_empresa, tasa_dolar, fecha_inicio, fecha_fin):
+@instrumentacion.medida("generar_pdf_balance_sumasy_saldos")
+def generar_pdf_balance_sumasy_saldos(nombre_empresa, tasa_dolar, fecha_inicio, fecha_fin, saldos_iniciales=False,
+                                      ruta_salida=None, progreso=None, conn=None):
     """
     Genera un PDF con el balance de sumas y saldos, mostrando montos en Bs y USD.
     Incluye en el encabezado: nombre de la empresa, tipo de cambio, período y fecha de emisión.
     
+    Solo se suman los movimientos del período indicado.
     La tabla resultante contiene las siguientes columnas:
       - Cuenta
+      - Saldo Inicial (Bs), solo si saldos_iniciales es True
       - Debe (Bs)
       - Haber (Bs)
       - Saldo Deudor (Bs)
       - Saldo Acreedor (Bs)
+    El PDF se escribe en ruta_salida, o en balance_sumasy_saldos.pdf si no se indica.
+    progreso, si se indica, se llama con (pasos hechos, 2): al terminar la
+    consulta y al terminar el documento.
     """
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_LEFT
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
     try:
-        pdf_path = "balance_sumasy_saldos.pdf"
+        pdf_path = ruta_salida or "balance_sumasy_saldos.pdf"
         doc = SimpleDocTemplate(pdf_path, pagesize=letter)
         elements = []
 
@@ -571,44 +1828,64 @@ def generar_pdf_balance_sumasy_saldos(nombre_empresa, tasa_dolar, fecha_inicio,
         elements.append(Spacer(1, 12))
 
         # Obtener el balance de sumas y saldos
-        balances = obtener_balance_sumasy_saldos()
+        with instrumentacion.fase("consulta"):
+            balances = obtener_balance_sumasy_saldos(fecha_inicio, fecha_fin, saldos_iniciales, conn=conn)
+        if progreso:
+            progreso(1, 2)
+
+        with instrumentacion.fase("tablas"):
+            # Preparar los datos para la tabla
+            data = [["Cuenta", "Debe (Bs)", "Haber (Bs)", "Saldo Deudor (Bs)", "Saldo Acreedor (Bs)"]]
+            for registro in balances:
+                data.append([
+                    registro["cuenta"],
+                    f"Bs {registro['debe']:.2f}",
+                    f"Bs {registro['haber']:.2f}",
+                    f"Bs {registro['saldo_deudor']:.2f}" if registro["saldo_deudor"] > 0 else "-",
+                    f"Bs {registro['saldo_acreedor']:.2f}" if registro["saldo_acreedor"] > 0 else "-"
+                ])
+            total_saldo_inicial = sum(registro["saldo_inicial"] for registro in balances)
+            total_debe = sum(registro["debe"] for registro in balances)
+            total_haber = sum(registro["haber"] for registro in balances)
+            total_saldo_deudor = sum(registro["saldo_deudor"] for registro in balances)
+            total_saldo_acreedor = sum(registro["saldo_acreedor"] for registro in balances)
 
-        # Preparar los datos para la tabla
-        data = [["Cuenta", "Debe (Bs)", "Haber (Bs)", "Saldo Deudor (Bs)", "Saldo Acreedor (Bs)"]]
-        for registro in balances:
             data.append([
-                registro["cuenta"],
-                f"Bs {registro['debe']:.2f}",
-                f"Bs {registro['haber']:.2f}",
-                f"Bs {registro['saldo_deudor']:.2f}" if registro["saldo_deudor"] > 0 else "-",
-                f"Bs {registro['saldo_acreedor']:.2f}" if registro["saldo_acreedor"] > 0 else "-"
+                "Total",
+                f"Bs {total_debe:.2f}",
+                f"Bs {total_haber:.2f}",
+                f"Bs {total_saldo_deudor:.2f}" if total_saldo_deudor > 0 else "-",
+                f"Bs {total_saldo_acreedor:.2f}" if total_saldo_acreedor > 0 else "-"
             ])
-        total_debe = sum(registro["debe"] for registro in balances)
-        total_haber = sum(registro["haber"] for registro in balances)
-        total_saldo_deudor = sum(registro["saldo_deudor"] for registro in balances)
-        total_saldo_acreedor = sum(registro["saldo_acreedor"] for registro in balances)
+            col_widths = [200, 80, 80, 100, 100]
+
+            # Columna de saldo inicial, después de la cuenta
+            if saldos_iniciales:
+                data[0].insert(1, "Saldo Inicial (Bs)")
+                for fila, registro in zip(data[1:], balances):
+                    fila.insert(1, f"Bs {registro['saldo_inicial']:.2f}" if registro["saldo_inicial"] else "-")
+                data[-1].insert(1, f"Bs {total_saldo_inicial:.2f}")
+                col_widths = [140, 80, 75, 75, 90, 90]
+
+            # Crear la tabla con anchos personalizados
+            table = Table(data, colWidths=col_widths)
+            table.setStyle(TableStyle([
+                ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+                ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
+                ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
+                ("GRID", (0, 0), (-1, -1), 1, colors.black),
+            ]))
+            elements.append(table)
 
-        data.append([
-            "Total",
-            f"Bs {total_debe:.2f}",
-            f"Bs {total_haber:.2f}",
-            f"Bs {total_saldo_deudor:.2f}" if total_saldo_deudor > 0 else "-",
-            f"Bs {total_saldo_acreedor:.2f}" if total_saldo_acreedor > 0 else "-"
-        ])
-        # Crear la tabla con anchos personalizados
-        table = Table(data, colWidths=[200, 80, 80, 100, 100])
-        table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-            ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
-            ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
-            ("GRID", (0, 0), (-1, -1), 1, colors.black),
-        ]))
-        elements.append(table)
-
-        doc.build(elements)
+        with instrumentacion.fase("doc.build"):
+            doc.build(elements)
+        if progreso:
+            progreso(2, 2)
         return pdf_path
+    except OperacionCancelada:
+        raise
     except Exception as e:
         raise Exception(f"No se pudo generar el PDF: {str(e)}")
@@ -1,7 +1,4 @@
 from interfaz import iniciar_interfaz
-from logica import inicializar_base_datos
 
 if __name__ == "__main__":
-    inicializar_base_datos()  # Se asegura de que la base de datos esté configurada.
-    iniciar_interfaz()
-    
\ No newline at end of file
+    iniciar_interfaz()  # Se encarga también de configurar la base de datos.
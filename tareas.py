@@ -0,0 +1,104 @@
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from logica import OperacionCancelada
+
+
+class SenalesTarea(QObject):
+    """
+    Señales de una Tarea. Se crean en el hilo de la interfaz, así que Qt
+    entrega en ese hilo lo que el hilo de trabajo emite.
+      - progreso(avance, total): total es 0 si no se conoce
+      - resultado(valor): lo que retornó la función
+      - error(mensaje): la función lanzó una excepción
+      - cancelada(): la tarea se detuvo a pedido del usuario
+      - terminada(): siempre se emite al final, después de las anteriores
+    """
+    progreso = pyqtSignal(int, int)
+    resultado = pyqtSignal(object)
+    error = pyqtSignal(str)
+    cancelada = pyqtSignal()
+    terminada = pyqtSignal()
+
+
+class Tarea(QRunnable):
+    """
+    Ejecuta funcion(*args, **kwargs) en un hilo del QThreadPool.
+
+    Si con_progreso es True, la función recibe el argumento progreso: una
+    función que acepta (avance, total), emite la señal de progreso y lanza
+    OperacionCancelada si se pidió cancelar la tarea. Las funciones de logica
+    usan su propia conexión por hilo, así que no comparten la conexión de la
+    interfaz.
+    """
+
+    def __init__(self, funcion, *args, con_progreso=False, **kwargs):
+        super().__init__()
+        self.funcion = funcion
+        self.args = args
+        self.kwargs = kwargs
+        self.senales = SenalesTarea()
+        self._cancelar = False
+        if con_progreso:
+            self.kwargs["progreso"] = self._informar_progreso
+
+    def cancelar(self):
+        """
+        Pide detener la tarea; se detiene en el próximo aviso de progreso.
+        """
+        self._cancelar = True
+
+    def _informar_progreso(self, avance, total=None):
+        if self._cancelar:
+            raise OperacionCancelada()
+        self.senales.progreso.emit(avance, total or 0)
+
+    def run(self):
+        try:
+            if self._cancelar:
+                raise OperacionCancelada()
+            valor = self.funcion(*self.args, **self.kwargs)
+        except OperacionCancelada:
+            self.senales.cancelada.emit()
+        except Exception as e:
+            self.senales.error.emit(str(e))
+        else:
+            self.senales.resultado.emit(valor)
+        finally:
+            self.senales.terminada.emit()
+
+
+class AdministradorTareas(QObject):
+    """
+    Lanza tareas en el QThreadPool global y conserva una referencia a cada
+    una hasta que termina, para que Python no las libere mientras corren.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool.globalInstance()
+        self._activas = set()
+
+    def iniciar(self, funcion, *args, al_terminar=None, al_fallar=None, con_progreso=False, **kwargs):
+        """
+        Crea y lanza una Tarea. al_terminar recibe el resultado y al_fallar
+        el mensaje de error. Retorna la tarea para conectar más señales o
+        cancelarla.
+        """
+        tarea = Tarea(funcion, *args, con_progreso=con_progreso, **kwargs)
+        if al_terminar:
+            tarea.senales.resultado.connect(al_terminar)
+        if al_fallar:
+            tarea.senales.error.connect(al_fallar)
+        tarea.senales.terminada.connect(lambda: self._activas.discard(tarea))
+        self._activas.add(tarea)
+        self.pool.start(tarea)
+        return tarea
+
+    def cancelar_todas(self):
+        for tarea in list(self._activas):
+            tarea.cancelar()
+
+    def esperar(self, milisegundos=-1):
+        """
+        Espera a que terminen las tareas en curso (por ejemplo, al cerrar la ventana).
+        """
+        return self.pool.waitForDone(milisegundos)
@@ -0,0 +1,93 @@
+"""
+Pruebas de los cierres mensuales de saldos.
+
+Correr desde la raíz del proyecto con:
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logica  # noqa: E402
+from base_datos import DB_PATH, configurar_ruta, obtener_conexion  # noqa: E402
+
+
+class PruebasCierres(unittest.TestCase):
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        configurar_ruta(os.path.join(self.carpeta.name, "prueba.db"))
+        logica.inicializar_base_datos()
+        self.conn = obtener_conexion()
+        # Dos meses terminados con movimientos
+        logica.registrar_transaccion("2024-01-10", ["Caja"], [100], ["Capital"], [100], "Aporte")
+        logica.registrar_transaccion("2024-02-10", ["Gastos"], [30], ["Caja"], [30], "Pago")
+
+    def tearDown(self):
+        configurar_ruta(DB_PATH)
+        self.carpeta.cleanup()
+
+    def periodos_cerrados(self):
+        return [periodo for (periodo,) in self.conn.execute("SELECT periodo FROM periodos_cerrados ORDER BY periodo")]
+
+    def saldos_al(self, fecha):
+        return {saldo["cuenta"]: saldo["saldo"] for saldo in logica.obtener_saldos_al(fecha)}
+
+    def test_registrar_cierra_los_meses_terminados(self):
+        mes_anterior = (date.today().replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+        self.assertEqual(self.periodos_cerrados()[0], "2024-01")
+        self.assertEqual(self.periodos_cerrados()[-1], mes_anterior)
+        self.assertEqual(self.saldos_al("2024-02-29")["Caja"], 70)
+
+    def test_las_consultas_no_escriben(self):
+        self.conn.execute("DELETE FROM cierres_periodo")
+        self.conn.execute("DELETE FROM periodos_cerrados")
+        self.conn.commit()
+        self.assertEqual(self.saldos_al("2024-02-29")["Caja"], 70)
+        logica.obtener_balance_sumasy_saldos("2024-02-01", "2024-02-29", saldos_iniciales=True)
+        self.assertEqual(self.periodos_cerrados(), [])
+        self.assertFalse(self.conn.in_transaction)
+
+    def test_cerrar_periodo_no_confirma_la_transaccion_de_quien_llama(self):
+        self.conn.execute("DELETE FROM periodos_cerrados")
+        self.conn.execute("DELETE FROM cierres_periodo")
+        self.conn.commit()
+        self.conn.execute("INSERT INTO cuentas (nombre) VALUES ('Pendiente')")
+        logica.cerrar_periodo("2024-02", self.conn)
+        self.assertTrue(self.conn.in_transaction)
+        self.conn.rollback()
+        self.assertEqual(self.periodos_cerrados(), [])
+        self.assertIsNone(self.conn.execute("SELECT id FROM cuentas WHERE nombre = 'Pendiente'").fetchone())
+
+    def test_insertar_una_linea_en_un_mes_cerrado_lo_reabre(self):
+        self.assertIn("2024-01", self.periodos_cerrados())
+        transaccion_id = self.conn.execute(
+            "SELECT id FROM transacciones WHERE fecha = '2024-01-10'").fetchone()[0]
+        caja = self.conn.execute("SELECT id FROM cuentas WHERE nombre = 'Caja'").fetchone()[0]
+        self.conn.execute("""
+            INSERT INTO detalles_transacciones (transaccion_id, cuenta_id, monto, tipo, fecha)
+            VALUES (?, ?, 500, 'Debe', '2024-01-10')
+        """, (transaccion_id, caja))
+        self.conn.commit()
+        self.assertEqual(self.periodos_cerrados(), [])
+        self.assertEqual(self.saldos_al("2024-02-29")["Caja"], 75)
+
+    def test_insertar_en_un_mes_abierto_conserva_los_cierres(self):
+        cerrados = self.periodos_cerrados()
+        transaccion_id = self.conn.execute(
+            "INSERT INTO transacciones (fecha, descripcion) VALUES (?, 'Futuro')",
+            (date.today().isoformat(),)).lastrowid
+        caja = self.conn.execute("SELECT id FROM cuentas WHERE nombre = 'Caja'").fetchone()[0]
+        self.conn.execute("""
+            INSERT INTO detalles_transacciones (transaccion_id, cuenta_id, monto, tipo, fecha)
+            VALUES (?, ?, 500, 'Debe', ?)
+        """, (transaccion_id, caja, date.today().isoformat()))
+        self.conn.commit()
+        self.assertEqual(self.periodos_cerrados(), cerrados)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+"""
+Pruebas del PDF del Libro Mayor.
+
+Correr desde la raíz del proyecto con:
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logica  # noqa: E402
+from base_datos import DB_PATH, configurar_ruta  # noqa: E402
+
+try:
+    import pypdf
+    import reportlab  # noqa: F401
+except ImportError:
+    pypdf = None
+
+
+@unittest.skipIf(pypdf is None, "requiere reportlab y pypdf")
+class PruebasMontosLibroMayor(unittest.TestCase):
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        configurar_ruta(os.path.join(self.carpeta.name, "prueba.db"))
+        logica.inicializar_base_datos()
+
+    def tearDown(self):
+        configurar_ruta(DB_PATH)
+        self.carpeta.cleanup()
+
+    def lineas_del_pdf(self):
+        ruta = os.path.join(self.carpeta.name, "mayor.pdf")
+        logica.generar_pdf_libro_mayor("Empresa", None, 36.5, "2024-03-31", ruta_salida=ruta)
+        texto = "\n".join(pagina.extract_text() for pagina in pypdf.PdfReader(ruta).pages)
+        return [linea.strip() for linea in texto.splitlines()]
+
+    def test_saldo_negativo_de_cinco_cifras_en_una_linea(self):
+        logica.registrar_transaccion("2024-03-01", ["Caja"], [50015.01], ["Proveedores"], [50015.01], "Pago")
+        lineas = self.lineas_del_pdf()
+        self.assertIn("Bs -50015.01", lineas)
+        self.assertNotIn("Bs -50015.0", lineas)
+
+    def test_monto_de_seis_cifras_en_una_linea(self):
+        logica.registrar_transaccion("2024-03-02", ["Banco"], [123456.78], ["Capital"], [123456.78], "Aporte")
+        lineas = self.lineas_del_pdf()
+        self.assertIn("Bs 123456.78", lineas)
+        self.assertIn("Bs -123456.78", lineas)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Pruebas de las funciones que escriben cuando quien llama ya tiene una
+transacción abierta.
+
+Correr desde la raíz del proyecto con:
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logica  # noqa: E402
+from base_datos import DB_PATH, configurar_ruta, obtener_conexion  # noqa: E402
+
+
+class PruebasTransaccionDeQuienLlama(unittest.TestCase):
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        configurar_ruta(os.path.join(self.carpeta.name, "prueba.db"))
+        logica.inicializar_base_datos()
+        self.conn = obtener_conexion()
+        logica.registrar_transaccion("2024-01-10", ["Caja"], [100], ["Capital"], [100], "Aporte")
+
+    def tearDown(self):
+        configurar_ruta(DB_PATH)
+        self.carpeta.cleanup()
+
+    def abrir_transaccion_pendiente(self):
+        self.conn.execute("INSERT INTO cuentas (nombre) VALUES ('Pendiente')")
+        self.assertTrue(self.conn.in_transaction)
+
+    def assert_pendiente_descartada(self):
+        self.assertTrue(self.conn.in_transaction)
+        self.conn.rollback()
+        self.assertIsNone(self.conn.execute("SELECT id FROM cuentas WHERE nombre = 'Pendiente'").fetchone())
+
+    def test_reconstruir_totales_no_confirma_la_transaccion_de_quien_llama(self):
+        self.abrir_transaccion_pendiente()
+        self.conn.execute("DELETE FROM totales_cuentas")
+        self.assertEqual(logica.reconstruir_totales_cuentas(self.conn), 2)
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM totales_cuentas").fetchone()[0], 2)
+        self.assert_pendiente_descartada()
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM totales_cuentas").fetchone()[0], 2)
+
+    def test_reconstruir_saldos_no_confirma_la_transaccion_de_quien_llama(self):
+        self.abrir_transaccion_pendiente()
+        self.conn.execute("UPDATE detalles_transacciones SET saldo = 0")
+        self.assertEqual(logica.reconstruir_saldos_movimientos(self.conn), 2)
+        self.assert_pendiente_descartada()
+        saldos = [saldo for (saldo,) in self.conn.execute("SELECT saldo FROM detalles_transacciones ORDER BY id")]
+        self.assertEqual(saldos, [10000, -10000])
+
+    def test_lote_fallido_no_deshace_la_transaccion_de_quien_llama(self):
+        self.conn.execute("""
+            CREATE TEMP TRIGGER falla_lote BEFORE INSERT ON transacciones WHEN NEW.descripcion = 'Falla'
+            BEGIN SELECT RAISE(ABORT, 'falla simulada'); END
+        """)
+        self.abrir_transaccion_pendiente()
+        resultado = logica.registrar_transacciones_lote([
+            {"fecha": "2024-01-11", "cuentas_debe": ["Nueva"], "montos_debe": [5],
+             "cuentas_haber": ["Caja"], "montos_haber": [5], "descripcion": "Falla"},
+        ], self.conn)
+        self.assertFalse(resultado["exito"])
+        self.assertEqual(resultado["errores"][0]["indice"], None)
+        self.assertTrue(self.conn.in_transaction)
+        self.assertIsNone(self.conn.execute("SELECT id FROM cuentas WHERE nombre = 'Nueva'").fetchone())
+        self.assertIsNotNone(self.conn.execute("SELECT id FROM cuentas WHERE nombre = 'Pendiente'").fetchone())
+        self.conn.commit()
+        self.assertIsNotNone(self.conn.execute("SELECT id FROM cuentas WHERE nombre = 'Pendiente'").fetchone())
+
+
+if __name__ == "__main__":
+    unittest.main()